@@ -0,0 +1,105 @@
+"""
+Utilities shared by the pyGRID benchmarks. Every benchmark runs each of its cases in a
+separate python process, so that the peak memory of a case doesn't depend on the ones
+run before, and saves the results as JSON to track regressions between releases.
+"""
+
+import functools
+import json
+import os
+import platform
+import resource
+import subprocess
+import sys
+import time
+
+# the benchmarks import pyGRID from the source tree
+source_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir, 'pyGRID')
+sys.path.insert(0, source_dir)
+
+
+def peak_rss():
+    """
+    Return the peak resident set size of the process in kilobytes.
+    """
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is in bytes on Mac OS X and in kilobytes elsewhere
+    if sys.platform == 'darwin':
+        rss = rss // 1024
+    return rss
+
+
+class Timer:
+    """
+    Context manager measuring the wall time of a block in seconds.
+    """
+
+    def __enter__(self):
+        self.start = time.time()
+        self.elapsed = None
+        return self
+
+    def __exit__(self, *exc_info):
+        self.elapsed = time.time() - self.start
+        return False
+
+
+class TimedCalls(object):
+    """
+    Wrap a function recording the number of calls and the total time spent in it. The
+    wrapper can replace a method of a class.
+    """
+
+    def __init__(self, function):
+        self.function = function
+        self.calls = 0
+        self.elapsed = 0.
+
+    def __call__(self, *args, **kwargs):
+        start = time.time()
+        try:
+            return self.function(*args, **kwargs)
+        finally:
+            self.elapsed += time.time() - start
+            self.calls += 1
+
+    def __get__(self, instance, owner):
+        if instance is None:
+            return self
+        return functools.partial(self, instance)
+
+
+def run_case(script, case_args):
+    """
+    Run a case of a benchmark in a new python process and return the dictionary of
+    results it prints as JSON on its last line of output.
+
+    Arguments:
+    script -- the path of the benchmark script
+    case_args -- a list with the command line arguments selecting the case
+    """
+    p = subprocess.Popen([sys.executable, script] + case_args, stdout = subprocess.PIPE)
+    output = p.communicate()[0]
+    if p.returncode != 0:
+        raise RuntimeError('The benchmark case {0} failed'.format(' '.join(case_args)))
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def save_results(filename, benchmark, config, results):
+    """
+    Write the results of a benchmark to a JSON file.
+
+    Arguments:
+    filename -- the name of the JSON file
+    benchmark -- the name of the benchmark
+    config -- a dictionary with the configuration of the benchmark
+    results -- a list with the dictionaries of results of every case
+    """
+    document = dict(benchmark = benchmark,
+                    date = time.strftime('%Y-%m-%dT%H:%M:%S'),
+                    python = platform.python_version(),
+                    platform = platform.platform(),
+                    config = config,
+                    results = results)
+    with open(filename, 'w') as results_file:
+        json.dump(document, results_file, indent = 2, sort_keys = True)
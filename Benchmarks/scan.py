@@ -0,0 +1,275 @@
+#!/usr/bin/env python
+"""
+Benchmark of the scan of the stream files for crashed jobs. A tree of stream files
+named $JOB_NAME.o$JOB_ID.$TASK_ID, with the matching .grid file, is generated on local
+disk for every combination of a distribution of the sizes of the files and of a ratio
+of crashed tasks, then pyGRID.scan_crashed_jobs is timed on it. For every case the
+benchmark reports the wall time, the bytes read, the files opened and the peak memory.
+The file system can be slowed down with a simulated latency of its operations.
+
+Example:
+    python Benchmarks/scan.py --tasks 100000 --distributions fixed:1K,lognormal:64K:2 \\
+        --crash-ratios 0.01,0.05 --workers 1,8
+"""
+
+import argparse
+import json
+import math
+import os
+import random
+import shutil
+import sys
+import tempfile
+import time
+import xml.etree.ElementTree as ET
+
+from common import Timer, peak_rss, run_case, save_results
+
+import pyGRID as pyGRID_module
+from pyGRID import pyGRID, GridFileWriter, aux_file_kw, pyGRID_error_identifier
+
+job_name = 'scanBenchmark'
+
+sim_element_code = '<sim_element N="{0}"><code> true </code></sim_element>'.format(job_name)
+
+# the lines of the stream files and the lines printed by the error trap
+log_line = 'step {0:08d} energy=-1.234567e+00 norm=9.999999e-01 time=1.25e-02\n'
+crash_lines = pyGRID_error_identifier + '\n' + \
+              './{0}.sh: line 12: exit status of last command: 1\n'.format(job_name)
+
+size_suffixes = dict(K = 1 << 10, M = 1 << 20, G = 1 << 30)
+
+
+def parse_size(string):
+    """
+    Return the number of bytes of a size like 512, 64K, 10M or 1G.
+    """
+    if string[-1].upper() in size_suffixes:
+        return int(float(string[:-1]) * size_suffixes[string[-1].upper()])
+    return int(string)
+
+
+def size_distribution(string):
+    """
+    Return a function drawing the sizes of the stream files from a distribution given
+    as fixed:SIZE, uniform:MIN:MAX or lognormal:MEDIAN:SIGMA.
+    """
+    pieces = string.split(':')
+    if pieces[0] == 'fixed' and len(pieces) == 2:
+        size = parse_size(pieces[1])
+        return lambda: size
+    if pieces[0] == 'uniform' and len(pieces) == 3:
+        low, high = parse_size(pieces[1]), parse_size(pieces[2])
+        return lambda: random.randint(low, high)
+    if pieces[0] == 'lognormal' and len(pieces) == 3:
+        mu, sigma = math.log(parse_size(pieces[1])), float(pieces[2])
+        return lambda: int(random.lognormvariate(mu, sigma))
+    raise ValueError('Invalid size distribution {0}'.format(string))
+
+
+def write_stream_file(filename, size, crashed, sparse):
+    """
+    Write a stream file of about the given size, ending with the lines printed by the
+    error trap if the task crashed. Sparse files are written only at their end.
+    """
+    tail = crash_lines if crashed else ''
+    with open(filename, 'wb') as stream_file:
+        body_size = max(size - len(tail), 0)
+        if sparse:
+            # only the last line before the tail holds data
+            stream_file.truncate(max(body_size - len(log_line), 0))
+            stream_file.seek(0, 2)
+            stream_file.write(log_line.format(0)[:body_size])
+        else:
+            block = ''.join(log_line.format(i) for i in xrange(1024))
+            for i in xrange(body_size // len(block)):
+                stream_file.write(block)
+            stream_file.write(block[:body_size % len(block)])
+        stream_file.write(tail)
+
+
+def generate_tree(args):
+    """
+    Write the .grid file and the stream files of the jobs in the current directory and
+    return the total size of the stream files. The tasks left over by the array jobs of
+    --array-size tasks go to a last smaller one.
+    """
+    random.seed(args.seed)
+    draw_size = size_distribution(args.distribution)
+    total_size = 0
+    grid_file = GridFileWriter(job_name + '.' + pyGRID_module.auxilliary_file_extension)
+    for job, first in enumerate(xrange(0, args.tasks, args.array_size), 1):
+        array_size = min(args.array_size, args.tasks - first)
+        job_element = ET.Element(aux_file_kw['job'])
+        job_element.set(aux_file_kw['name'], job_name)
+        job_element.set(aux_file_kw['id'], str(job))
+        job_element.set(aux_file_kw['array'], '1-{0}'.format(array_size))
+        grid_file.write(job_element)
+        for task in xrange(1, array_size + 1):
+            size = draw_size()
+            total_size += size
+            write_stream_file('{0}.o{1}.{2}'.format(job_name, job, task), size,
+                              random.random() < args.crash_ratio, args.sparse)
+            # the error stream of a task is usually empty
+            open('{0}.e{1}.{2}'.format(job_name, job, task), 'wb').close()
+    grid_file.close()
+    return total_size
+
+
+class FileSystemMonitor:
+    """
+    Count the files opened and the bytes read by the scan, optionally slowing down the
+    operations on the file system by a fixed latency.
+    """
+
+    def __init__(self, open_latency = 0., read_latency = 0., stat_latency = 0.,
+                                                                    list_latency = 0.):
+        self.latencies = dict(open = open_latency, read = read_latency,
+                              stat = stat_latency, list = list_latency)
+        self.files_opened = 0
+        self.bytes_read = 0
+        self.reads = 0
+
+    def _wait(self, operation):
+        if self.latencies[operation] > 0:
+            time.sleep(self.latencies[operation])
+
+    def install(self):
+        monitor = self
+        real_open, real_stat, real_listdir = open, os.stat, os.listdir
+
+        class MonitoredFile:
+            def __init__(self, stream_file):
+                self.stream_file = stream_file
+            def read(self, *args):
+                monitor._wait('read')
+                data = self.stream_file.read(*args)
+                monitor.reads += 1
+                monitor.bytes_read += len(data)
+                return data
+            def __getattr__(self, name):
+                return getattr(self.stream_file, name)
+            def __enter__(self):
+                return self
+            def __exit__(self, *exc_info):
+                self.stream_file.close()
+                return False
+
+        def monitored_open(filename, *args):
+            monitor._wait('open')
+            stream_file = real_open(filename, *args)
+            monitor.files_opened += 1
+            return MonitoredFile(stream_file)
+
+        def monitored_stat(filename):
+            monitor._wait('stat')
+            return real_stat(filename)
+
+        def monitored_listdir(directory):
+            monitor._wait('list')
+            return real_listdir(directory)
+
+        # pyGRID opens the files with the builtin open, which a global shadows
+        pyGRID_module.open = monitored_open
+        os.stat = monitored_stat
+        os.listdir = monitored_listdir
+
+
+def run_scan(args):
+    """
+    Generate the tree of stream files of a case and time its scan. Return a dictionary
+    with the measures.
+    """
+    directory = tempfile.mkdtemp(prefix = 'pyGRID-bench-', dir = args.directory)
+    cwd = os.getcwd()
+    try:
+        os.chdir(directory)
+        with Timer() as generate_timer:
+            total_size = generate_tree(args)
+
+        gridJob = pyGRID(ET.fromstring(sim_element_code))
+        gridJob.scan_tail_size = args.scan_tail
+        incremental = args.mode == 'rescan'
+        if incremental:
+            # the scan timed finds the stream files unchanged since the previous one
+            gridJob.scan_crashed_jobs(workers = args.workers, incremental = True)
+
+        monitor = FileSystemMonitor(args.open_latency, args.read_latency,
+                                    args.stat_latency, args.list_latency)
+        monitor.install()
+        with Timer() as scan_timer:
+            gridJob.scan_crashed_jobs(workers = args.workers, incremental = incremental)
+
+        store = gridJob._open_job_store()
+        crashed = sum(len(pyGRID_module.TaskSet.parse(job.findtext(aux_file_kw['crashes'])
+                            or '')) for key, job in store.crashed_jobs())
+        store.close()
+    finally:
+        os.chdir(cwd)
+        shutil.rmtree(directory)
+
+    return dict(distribution = args.distribution,
+                crash_ratio = args.crash_ratio,
+                workers = args.workers,
+                mode = args.mode,
+                tasks = args.tasks,
+                total_size = total_size,
+                generation_time = generate_timer.elapsed,
+                wall_time = scan_timer.elapsed,
+                tasks_per_second = args.tasks / max(scan_timer.elapsed, 1e-9),
+                files_opened = monitor.files_opened,
+                bytes_read = monitor.bytes_read,
+                reads = monitor.reads,
+                crashed_tasks = crashed,
+                peak_rss_kb = peak_rss())
+
+
+def main():
+    parser = argparse.ArgumentParser(description = __doc__.split('\n\n')[0])
+    parser.add_argument("--tasks", type = int, default = 10000, help = "The number of tasks, and of output streams")
+    parser.add_argument("--array-size", type = int, default = 1000, help = "The number of tasks of every array job")
+    parser.add_argument("--distributions", default = "fixed:1K,lognormal:16K:1.5", help = "Comma separated distributions of the sizes of the stream files: fixed:SIZE, uniform:MIN:MAX or lognormal:MEDIAN:SIGMA, with sizes like 512, 64K, 10M or 1G")
+    parser.add_argument("--crash-ratios", default = "0.01,0.05", help = "Comma separated fractions of the tasks that crashed")
+    parser.add_argument("--workers", default = "1,8", help = "Comma separated numbers of threads searching the stream files")
+    parser.add_argument("--modes", default = "full,rescan", help = "Comma separated scans to time: full searches the whole files, rescan searches them again after a first incremental scan")
+    parser.add_argument("--scan-tail", type = int, metavar = "BYTES", help = "Search only the last BYTES bytes of the stream files")
+    parser.add_argument("--sparse", action = 'store_true', help = "Write sparse stream files, which is much faster for files of many megabytes")
+    parser.add_argument("--directory", help = "The directory on local disk holding the trees of stream files. The system temporary directory by default")
+    parser.add_argument("--open-latency", type = float, default = 0., metavar = "SECONDS", help = "The simulated latency of opening a file")
+    parser.add_argument("--read-latency", type = float, default = 0., metavar = "SECONDS", help = "The simulated latency of every read from a file")
+    parser.add_argument("--stat-latency", type = float, default = 0., metavar = "SECONDS", help = "The simulated latency of reading the status of a file")
+    parser.add_argument("--list-latency", type = float, default = 0., metavar = "SECONDS", help = "The simulated latency of listing a directory")
+    parser.add_argument("--seed", type = int, default = 0, help = "The seed drawing the sizes of the files and the tasks that crashed")
+    parser.add_argument("--output", default = "scan_benchmark.json", help = "The JSON file the results are saved to")
+    parser.add_argument("--case", nargs = 4, metavar = ("DISTRIBUTION", "RATIO", "WORKERS", "MODE"), help = argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.tasks < 1 or args.array_size < 1:
+        parser.error("--tasks and --array-size must be positive")
+
+    if args.case is not None:
+        # a single case run in its own process, see common.run_case
+        args.distribution, args.crash_ratio, args.workers, args.mode = args.case
+        args.crash_ratio, args.workers = float(args.crash_ratio), int(args.workers)
+        print json.dumps(run_scan(args))
+        return
+
+    config = dict((k, v) for k, v in vars(args).items() if k not in ['case', 'output'])
+    results = []
+    for distribution in args.distributions.split(','):
+        for crash_ratio in args.crash_ratios.split(','):
+            for workers in args.workers.split(','):
+                for mode in args.modes.split(','):
+                    case = [distribution, crash_ratio, workers, mode]
+                    result = run_case(os.path.abspath(__file__),
+                                                        sys.argv[1:] + ['--case'] + case)
+                    print "{0} crash ratio {1} workers {2} {3}: {4:.2f}s, {5:.0f} tasks/s,"\
+                          " {6} files opened, {7} bytes read, peak RSS {8} kB".format(
+                                *case + [result['wall_time'], result['tasks_per_second'],
+                                         result['files_opened'], result['bytes_read'],
+                                         result['peak_rss_kb']])
+                    results.append(result)
+    save_results(args.output, 'scan', config, results)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,185 @@
+#!/usr/bin/env python
+"""
+Benchmark of the submission and resubmission of the jobs of a sweep. A local stand-in
+for qsub with configurable latency, jitter and failure rate is put first in the PATH,
+then pyGRID.submit and pyGRID.resubmit_crashed are timed over synthetic sweeps with a
+growing number of combinations of the parameters. For every sweep the benchmark reports
+the combinations submitted per second, the wall time, the peak memory and the time
+spent writing the .grid file.
+
+Example:
+    python Benchmarks/submission.py --sizes 10,1000,100000,1000000 --array-sweep
+"""
+
+import argparse
+import json
+import os
+import random
+import shutil
+import sys
+import tempfile
+import xml.etree.ElementTree as ET
+
+from common import TimedCalls, Timer, peak_rss, run_case, save_results
+
+import pyGRID as pyGRID_module
+from pyGRID import pyGRID, TaskSet, aux_file_kw
+
+# The stand-in for qsub. It prints a new JOB_ID like qsub -terse, after sleeping for
+# the latency plus a uniform random jitter, or fails with the given probability.
+fake_qsub_code = """#!{python}
+import fcntl, os, random, sys, time
+latency = float(os.environ.get('PYGRID_BENCH_LATENCY', 0))
+jitter = float(os.environ.get('PYGRID_BENCH_JITTER', 0))
+failure_rate = float(os.environ.get('PYGRID_BENCH_FAILURE_RATE', 0))
+time.sleep(latency + random.uniform(0, jitter))
+if random.random() < failure_rate:
+    print 'Unable to run job: simulated failure.'
+    sys.exit(1)
+with open(os.environ['PYGRID_BENCH_COUNTER'], 'a+') as counter:
+    fcntl.flock(counter, fcntl.LOCK_EX)
+    counter.seek(0)
+    job_id = int(counter.read() or 0) + 1
+    counter.seek(0)
+    counter.truncate()
+    counter.write(str(job_id))
+print job_id
+"""
+
+# the definition of the synthetic sweeps
+sim_element_code = """
+<sim_element N="benchmark">
+    <code> true </code>
+    <S>/bin/bash</S>
+    <o>$JOB_NAME.o$JOB_ID.$TASK_ID</o>
+    <parameters>
+        <parameter name="x"> 0:{0}:1 </parameter>
+    </parameters>
+</sim_element>
+"""
+
+
+def install_fake_qsub(directory, latency, jitter, failure_rate):
+    """
+    Write the stand-in for qsub in a directory and put it first in the PATH.
+    """
+    filename = os.path.join(directory, 'qsub')
+    with open(filename, 'w') as qsub_file:
+        qsub_file.write(fake_qsub_code.format(python = sys.executable))
+    os.chmod(filename, 0755)
+    os.environ['PATH'] = directory + os.pathsep + os.environ['PATH']
+    os.environ['PYGRID_BENCH_LATENCY'] = str(latency)
+    os.environ['PYGRID_BENCH_JITTER'] = str(jitter)
+    os.environ['PYGRID_BENCH_FAILURE_RATE'] = str(failure_rate)
+    os.environ['PYGRID_BENCH_COUNTER'] = os.path.join(directory, 'counter')
+
+
+def failed_jobs(gridJob):
+    """
+    Return the number of jobs in the job store whose submission failed.
+    """
+    store = gridJob._open_job_store()
+    jobs = store.jobs()
+    store.close()
+    return sum(1 for key, job in jobs if not job.get(aux_file_kw['id']).isdigit())
+
+
+def run_sweep(args):
+    """
+    Submit a sweep, mark some of its jobs as crashed and resubmit them. Return a
+    dictionary with the measures.
+    """
+    directory = tempfile.mkdtemp(prefix = 'pyGRID-bench-')
+    cwd = os.getcwd()
+    try:
+        os.chdir(directory)
+        install_fake_qsub(directory, args.latency, args.jitter, args.failure_rate)
+
+        # time spent writing the .grid file, while submitting and after resubmitting
+        grid_writes = [TimedCalls(pyGRID_module.GridFileWriter.write.im_func),
+                       TimedCalls(pyGRID_module.GridFileWriter.close.im_func),
+                       TimedCalls(pyGRID_module.writeXMLFile)]
+        pyGRID_module.GridFileWriter.write = grid_writes[0]
+        pyGRID_module.GridFileWriter.close = grid_writes[1]
+        pyGRID_module.writeXMLFile = grid_writes[2]
+
+        gridJob = pyGRID(ET.fromstring(sim_element_code.format(args.size)))
+        gridJob.job_store = args.store
+        with Timer() as submit_timer:
+            gridJob.submit(array_sweep = args.array_sweep, workers = args.jobs)
+        submit_write_time = sum(w.elapsed for w in grid_writes)
+        submit_failures = failed_jobs(gridJob)
+
+        # a fraction of the jobs, or of the tasks of an array sweep, crashed
+        random.seed(args.seed)
+        store = gridJob._open_job_store()
+        crashed = 0
+        for key, job in store.jobs():
+            if args.array_sweep:
+                crashes = TaskSet(task for task in xrange(1, args.size + 1)
+                                                if random.random() < args.crash_ratio)
+                crashed += len(crashes)
+                store.set_crashes(key, crashes if crashes else None)
+            elif random.random() < args.crash_ratio:
+                crashed += 1
+                store.set_crashes(key, TaskSet())
+        store.close()
+
+        for timed in grid_writes:
+            timed.elapsed = 0.
+        with Timer() as resubmit_timer:
+            gridJob.resubmit_crashed(scan_first = False)
+        resubmit_write_time = sum(w.elapsed for w in grid_writes)
+    finally:
+        os.chdir(cwd)
+        shutil.rmtree(directory)
+
+    return dict(size = args.size,
+                peak_rss_kb = peak_rss(),
+                submit = dict(wall_time = submit_timer.elapsed,
+                              combinations_per_second = args.size / submit_timer.elapsed,
+                              grid_write_time = submit_write_time,
+                              failures = submit_failures),
+                resubmit = dict(crashed = crashed,
+                                wall_time = resubmit_timer.elapsed,
+                                combinations_per_second = crashed / 
+                                            max(resubmit_timer.elapsed, 1e-9),
+                                grid_write_time = resubmit_write_time))
+
+
+def main():
+    parser = argparse.ArgumentParser(description = __doc__.split('\n\n')[0])
+    parser.add_argument("--sizes", default = "10,1000", help = "Comma separated numbers of combinations of the parameters of the sweeps")
+    parser.add_argument("--latency", type = float, default = 0., metavar = "SECONDS", help = "The time qsub takes to submit a job")
+    parser.add_argument("--jitter", type = float, default = 0., metavar = "SECONDS", help = "The maximum random time added to the latency of qsub")
+    parser.add_argument("--failure-rate", type = float, default = 0., help = "The probability that qsub fails to submit a job")
+    parser.add_argument("--crash-ratio", type = float, default = 0.05, help = "The fraction of the jobs resubmitted")
+    parser.add_argument("-j", "--jobs", type = int, default = 1, help = "The number of qsub processes run at the same time")
+    parser.add_argument("--array-sweep", action = 'store_true', help = "Submit every sweep as a single array job")
+    parser.add_argument("--store", choices = sorted(pyGRID_module.job_stores.keys()), default = 'xml', help = "The job store recording the jobs")
+    parser.add_argument("--seed", type = int, default = 0, help = "The seed choosing the jobs that crashed")
+    parser.add_argument("--output", default = "submission_benchmark.json", help = "The JSON file the results are saved to")
+    parser.add_argument("--size", type = int, help = argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.size is not None:
+        # a single sweep run in its own process, see common.run_case
+        print json.dumps(run_sweep(args))
+        return
+
+    config = dict((k, v) for k, v in vars(args).items() if k not in ['size', 'output'])
+    results = []
+    for size in [int(s) for s in args.sizes.split(',')]:
+        case_args = sys.argv[1:] + ['--size', str(size)]
+        result = run_case(os.path.abspath(__file__), case_args)
+        print "{0:>8} combinations: submitted {1:.1f}/s in {2:.2f}s, resubmitted {3} in "\
+              "{4:.2f}s, peak RSS {5} kB".format(size,
+                        result['submit']['combinations_per_second'],
+                        result['submit']['wall_time'], result['resubmit']['crashed'],
+                        result['resubmit']['wall_time'], result['peak_rss_kb'])
+        results.append(result)
+    save_results(args.output, 'submission', config, results)
+
+
+if __name__ == '__main__':
+    main()
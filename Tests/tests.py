@@ -1,22 +1,22 @@
 import unittest
 import xml.etree.ElementTree as ET
 import mock
+import json
+import os
 import re
+import shutil
+import StringIO
+import tempfile
+import time
 
 from pyGRID import *
 
+# the bash script submitted, named after the hash of its content
+script_pattern = r'{0}\.[0-9a-f]{{{1}}}\.sh'
+
 class TestPyGRID(unittest.TestCase):
 
     def setUp(self):
-        def file_read_side_effect():
-            self.crash_read_index = self.crash_read_index + 1
-            if self.crash_read_index is 0:
-                return self.crashFile
-            elif self.crash_read_index < 6:
-                return pyGRID_error_identifier
-            else:
-                return "This is fine"
-                
         def job_id_side_effect():
             self.job_id = self.job_id + 1
             return str(self.job_id)
@@ -27,11 +27,36 @@ class TestPyGRID(unittest.TestCase):
         
         self.crashFile = open('tests/crashTest.grid','r').read()
         
-        self.crash_read_index = -1
-        self.file_read_side_effect = file_read_side_effect
-        
         self.job_id = 0
         self.job_id_side_effect = job_id_side_effect
+        
+        self.cwd = os.getcwd()
+        self.stream_dir = None
+    
+    def tearDown(self):
+        os.chdir(self.cwd)
+        if self.stream_dir is not None:
+            shutil.rmtree(self.stream_dir)
+    
+    def write_crash_streams(self, gridJob):
+        """
+        Move to a temporary directory holding the auxiliary file of the crashTest jobs
+        and their stream files. Only the first 5 tasks of the first job crashed.
+        """
+        self.stream_dir = tempfile.mkdtemp()
+        os.chdir(self.stream_dir)
+        open(gridJob.auxilliaryFilename, 'w').write(self.crashFile)
+        gridJob.output_filename_template = '$JOB_NAME.$JOB_ID.$PAR_omega.$PAR_Amp.$TASK_ID'
+        for job_element in ET.fromstring(self.crashFile).findall(aux_file_kw['job']):
+            attributes = dict(('$' + k, v) for k, v in job_element.items())
+            for task in range(1, 11):
+                attributes['$TASK_ID'] = str(task)
+                filename = substitute_in_templates(gridJob.output_filename_template,
+                                                                            attributes)
+                text = 'This is fine\n' * 100
+                if job_element.get(aux_file_kw['id']) == '1' and task < 6:
+                    text += pyGRID_error_identifier + '\n' + 'This is fine\n' * 10
+                open(filename, 'w').write(text)
 
     def test_find_sim_element(self):
         sim_element = find_sim_element(self.root,'basicTest')
@@ -48,15 +73,65 @@ class TestPyGRID(unittest.TestCase):
         self.assertTrue(gridJob.sim.args.cwd)
         self.assertEqual(gridJob.sim.args.j, 'y')
         
+    def test_shared_qsub_parser(self):
+        first = qsubOptions()
+        second = qsubOptions()
+        assert first.parser is second.parser
+        self.assertEqual(vars(first.args), {'command': 'echo'})
+        first.args.N = 'first'
+        assert not hasattr(second.args, 'N')
+        
+        # the direct path gives the same options as the whole parser
+        options = [('N', 'name'), ('cwd', None), ('j', 'y'), ('m', 'es'), ('m', 'b e'),
+                   ('pe', 'smp 4'), ('hold_jid', '1 2 3'), ('tc', '5'), ('ac', 'a=1'),
+                   ('ac', 'b=2'), ('S', '/bin/bash'), ('hold', 'u'), ('js', '3')]
+        for option, value in options:
+            first.add_option(option, value)
+            second.parse_and_add(' '.join(['-' + option] + (value or '').split()))
+        self.assertEqual(vars(first.args), vars(second.args))
+        
+        with self.assertRaises(SystemExit):
+            with mock.patch('sys.stderr'):
+                first.add_option('j', 'maybe')
+    
     def test_code_option(self):
         sim_element = find_sim_element(self.root,'basicTest')
         gridJob = pyGRID(sim_element, self.parent_map)
         self.assertTrue(error_handling_bash_code in gridJob.sim.args.code)
     
     def test_parse_array_notation(self):
-        self.assertEqual(parse_array_notation('5'), 5)
-        self.assertEqual(parse_array_notation('5-7'), [5, 6, 7])
-        self.assertEqual(parse_array_notation('5-9:2'), [5, 7, 9])
+        self.assertEqual(list(parse_array_notation('5')), [5])
+        self.assertEqual(list(parse_array_notation('5-7')), [5, 6, 7])
+        self.assertEqual(list(parse_array_notation('5-9:2')), [5, 7, 9])
+        self.assertEqual(list(parse_array_notation('5-10:2,20')), [5, 7, 9, 20])
+        with self.assertRaises(InvalidArrayNotationError):
+            parse_array_notation('5-3')
+    
+    def test_task_set(self):
+        # a million TASK_IDs are held by a single run
+        tasks = TaskSet.parse('1-1000000')
+        self.assertEqual(len(tasks), 1000000)
+        self.assertEqual(tasks.runs, [(1, 1000000, 1)])
+        crashes = TaskSet.parse('10-20,500000-500999:3')
+        left = tasks - crashes
+        self.assertEqual(len(left), 1000000 - 11 - 334)
+        self.assertEqual(len(left.runs), 336)
+        assert 9 in left and 10 not in left and 500002 in left and 500003 not in left
+        self.assertEqual(left | crashes, tasks)
+        self.assertEqual(tasks & crashes, crashes)
+        self.assertEqual(str(crashes), '10-20,500000-500999:3')
+        self.assertEqual(crashes[11], 500000)
+        self.assertEqual(crashes[-1], 500999)
+        
+        # the crashes recorded by older versions are lists of TASK_IDs
+        self.assertEqual(str(TaskSet.parse('1 2 3 4 5 7 9')), '1-5,7-9:2')
+        self.assertEqual(str(TaskSet([9, 3, 6, 4])), '3-4,6-9:3')
+        odd, even = TaskSet.parse('1-9:2'), TaskSet.parse('2-10:2')
+        self.assertEqual(str(odd | even), '1-10')
+        self.assertEqual(list((odd | even) - even), list(odd))
+        self.assertEqual(list(odd & even), [])
+        for task_set in [odd, even, odd | even, TaskSet()]:
+            self.assertEqual(TaskSet.parse(str(task_set)), task_set)
     
     def test_parse_parmater_values(self):
         par_parser = ParamParser()
@@ -77,20 +152,81 @@ class TestPyGRID(unittest.TestCase):
         omega_values = gridJob.parameters['omega']
         self.assertEqual(omega_values, [1.0, 5.5, 10.0])
     
+    def test_filename_template(self):
+        template = filename_template('$JOB_NAME.o$JOB_ID.$PAR_omega.$TASK_ID')
+        assert filename_template(template.template) is template
+        values = dict(JOB_NAME = 'crashTest', JOB_ID = '7', PAR_omega = '5.5')
+        self.assertEqual(template.render(values), 'crashTest.o7.5.5.$TASK_ID')
+        self.assertEqual(list(template.render_tasks(values, TaskSet.parse('1-3,9'))),
+                         ['crashTest.o7.5.5.{0}'.format(i) for i in [1, 2, 3, 9]])
+        self.assertEqual(list(filename_template('{$JOB_ID}').render_tasks(values, [1])),
+                         ['{7}'])
+        
+        # a filename is mapped back to the values of the variables
+        self.assertEqual(template.match('crashTest.o7.5.5.12'), 
+                dict(JOB_NAME = 'crashTest', JOB_ID = '7', PAR_omega = '5.5', 
+                     TASK_ID = '12'))
+        assert template.match('crashTest.e7.5.5.12') is None
+        assert template.match('crashTest.o7.5.5.x') is None
+        self.assertEqual(template.match('a.b.o7.1.0.3', dict(PAR_omega = '1.0')),
+                dict(JOB_NAME = 'a.b', JOB_ID = '7', PAR_omega = '1.0', TASK_ID = '3'))
+        self.assertEqual(filename_template('$JOB_ID.$JOB_ID').match('3.3'), 
+                         dict(JOB_ID = '3'))
+        assert filename_template('$JOB_ID.$JOB_ID').match('3.4') is None
+
+        # the variables are the longest known names, underscores after them are literal
+        template = filename_template('out_$PAR_Amp_$PAR_omega.$JOB_ID_$TASK_ID',
+                                     ['PAR_Amp', 'PAR_omega'])
+        self.assertEqual(template.names, ['PAR_Amp', 'PAR_omega', 'JOB_ID', 'TASK_ID'])
+        values = dict(PAR_Amp = '2.0', PAR_omega = '1.0', JOB_ID = '7')
+        self.assertEqual(template.render(values), 'out_2.0_1.0.7_$TASK_ID')
+        self.assertEqual(list(template.render_tasks(values, [3])), ['out_2.0_1.0.7_3'])
+        self.assertEqual(template.match('out_2.0_1.0.7_3'), dict(values, TASK_ID = '3'))
+        self.assertEqual(filename_template('$JOB_IDx').names, ['JOB_ID'])
+        self.assertEqual(filename_template('$PAR_Amp_').names, ['PAR_Amp_'])
+
+        sim_element = find_sim_element(self.root,'parSpaceTest')
+        gridJob = pyGRID(sim_element, self.parent_map)
+        self.assertEqual(gridJob.match_stream_file('parSpaceTest.12.5.5.2.0'),
+                         ('o', '12', None, dict(omega = '5.5', Amp = '2.0')))
+        self.assertEqual(gridJob.match_stream_file('parSpaceTest.e12.4'),
+                         ('e', '12', 4, dict()))
+        assert gridJob.match_stream_file('basicTest.e12.4') is None
+    
+    def test_parameter_space(self):
+        space = ParameterSpace(['Amp', 'omega'], [[2.0, 5.0, 6.0], [1.0, 5.5]])
+        self.assertEqual(len(space), 6)
+        self.assertEqual(list(space), [(2.0, 1.0), (2.0, 5.5), (5.0, 1.0), (5.0, 5.5),
+                                       (6.0, 1.0), (6.0, 5.5)])
+        self.assertEqual([space[i] for i in range(len(space))], list(space))
+        self.assertEqual(space[-1], (6.0, 5.5))
+        with self.assertRaises(IndexError):
+            space[6]
+        
+        # a large space is neither generated nor held in memory
+        space = ParameterSpace(['a', 'b', 'c'], [range(1000)] * 3)
+        self.assertEqual(len(space), 10**9)
+        self.assertEqual(space[123456789], (123, 456, 789))
+    
     @mock.patch('subprocess.Popen')
     def test_basic_submission(self,fake_popen):
         fake_popen().stdout.read.side_effect = self.job_id_side_effect
         sim_element = find_sim_element(self.root,'basicTest')
         gridJob = pyGRID(sim_element, self.parent_map)
-        with mock.patch('__builtin__.open', mock.mock_open(), create=True) as fake_file:
+        with mock.patch('__builtin__.open', mock.mock_open(), create=True) as fake_file, \
+             mock.patch('os.rename'):
             gridJob.submit()
             assert fake_popen.called
-            assert fake_popen.call_args[0][0] == 'qsub -terse basicTest.sh'
+            # the streams are passed on the command line
+            qsub_call = fake_popen.call_args[0][0]
+            assert re.match(r"qsub -terse -o '\$JOB_NAME\.\$JOB_ID' "
+                            r"-e '\$JOB_NAME\.e\$JOB_ID\.\$TASK_ID' " +
+                            script_pattern.format('basicTest', script_hash_length) + '$',
+                            qsub_call)
             assert fake_popen.call_args[1]['shell'] == True
             assert fake_popen.call_args[1]['stdout'] == subprocess.PIPE
             assert fake_popen.call_args[1]['stderr'] == subprocess.STDOUT
             
-            fake_file.assert_any_call('basicTest.sh', 'w')
             fake_file.assert_any_call('basicTest.grid', 'w')
             handle = fake_file()
             write_calls = handle.write.call_args_list
@@ -99,11 +235,11 @@ class TestPyGRID(unittest.TestCase):
             bash_code = write_calls[0][0][0]
             assert error_handling_bash_code in bash_code
             assert '#!/usr/bin/env qsub' in bash_code
-            assert '#$ -e $JOB_NAME.e$JOB_ID.$TASK_ID' in bash_code
+            assert '#$ -e' not in bash_code
             assert '#$ -m es' in bash_code
             assert '#$ -j y' in bash_code
             assert '#$ -M sabbatini@physics.uq.edu.au' in bash_code
-            assert '#$ -o $JOB_NAME.$JOB_ID.$TASK_ID' in bash_code
+            assert '#$ -o' not in bash_code
             assert '#$ -N basicTest' in bash_code
             assert '#$ -S /bin/bash' in bash_code
             assert '#$ -cwd' in bash_code
@@ -127,7 +263,9 @@ class TestPyGRID(unittest.TestCase):
             assert '<jobs>' in aux_code
             assert '</jobs>' in aux_code
             # make sure the job element appears only once in the right form            
-            job_list = re.finditer('<job JOB_ID="1" JOB_NAME="basicTest"/>', aux_code)
+            job_list = re.finditer('<job JOB_ID="1" JOB_NAME="basicTest" '
+                                   'script="[0-9a-f]{{{0}}}"/>'.format(script_hash_length),
+                                   aux_code)
             assert sum(1 for s in job_list) == 1
     
     def test_inheritance(self):
@@ -142,15 +280,107 @@ class TestPyGRID(unittest.TestCase):
         # the array and the name are the only properties we changed in the child job
         self.assertEqual(gridJob.sim.args.N, 'inheritanceTest')
         
+    def test_inheritance_resolution(self):
+        root = ET.fromstring("""<simulations>
+            <sim_element N="base"><S>/bin/bash</S><j>y</j><t>1-5</t></sim_element>
+            <sim_element N="a" inherit="base"><j>n</j></sim_element>
+            <sim_element N="b" inherit="base" post_processing="c"><cwd /></sim_element>
+            <sim_element N="c" inherit="a"><t>1-2</t></sim_element>
+            <sim_element N="loop1" inherit="loop2" />
+            <sim_element N="loop2" inherit="loop1" />
+            <sim_element N="self" post_processing="self" />
+            <sim_element N="orphan" inherit="missing" />
+        </simulations>""")
+        sim_elements = dict((e.get('N'), e) for e in root)
+        definitions = SimulationDefinitions(root)
+        
+        # every simulation is parsed once however many simulations depend on it
+        profiler.reset()
+        profiler.enable()
+        try:
+            gridJobs = dict((name, definitions.build(sim_elements[name])) 
+                                                    for name in ['a', 'b', 'c', 'base'])
+            gridJobs['b2'] = definitions.build(sim_elements['b'])
+        finally:
+            profiler.disable()
+        counts = dict((row[0], row[1]) for row in profiler.summary())
+        self.assertEqual(counts['pyGRID._parse_element'], 4)
+        
+        self.assertEqual(gridJobs['a'].sim.args.j, 'n')
+        self.assertEqual(gridJobs['a'].sim.args.S, '/bin/bash')
+        self.assertEqual(gridJobs['c'].sim.args.j, 'n')
+        self.assertEqual(gridJobs['c'].array, '1-2')
+        self.assertEqual(gridJobs['b'].post_proc.sim.args.N, 'c')
+        self.assertEqual(gridJobs['b'].sim.args.j, 'y')
+        
+        # the simulations built can be modified independently
+        gridJobs['b'].post_proc.sim.args.hold_jid = '1,2'
+        gridJobs['b'].sim.add_option('l', 'h_rt=1:00:00')
+        assert not hasattr(gridJobs['b2'].post_proc.sim.args, 'hold_jid')
+        assert not hasattr(gridJobs['b2'].sim.args, 'l')
+        assert not hasattr(definitions.resolve('c').sim.args, 'hold_jid')
+        
+        with self.assertRaises(InheritanceCycleError) as cm:
+            definitions.build(sim_elements['loop1'])
+        self.assertEqual(cm.exception.sim_names, ['loop1', 'loop2', 'loop1'])
+        with self.assertRaises(InheritanceCycleError) as cm:
+            pyGRID(sim_elements['self'], dict((c, root) for c in root))
+        self.assertEqual(str(cm.exception), 'The simulations inherit from or post '
+                         'process each other in a cycle: self -> self')
+        with self.assertRaises(InvalidSimulatioNameError):
+            definitions.build(sim_elements['orphan'])
+    
+    def test_load_sim_elements(self):
+        self.stream_dir = tempfile.mkdtemp()
+        filename = os.path.join(self.stream_dir, 'definitions.xml')
+        with open(filename, 'w') as xml_file:
+            xml_file.write("""<simulations>
+                <sim_element N="base"><S>/bin/bash</S></sim_element>
+                <sim_element N="unused"><t>1-3</t></sim_element>
+                <sim_element N="child" inherit="base" post_processing="post" />
+                <sim_element N="child"><t>1-7</t></sim_element>
+                <sim_element N="post" inherit="late" />
+                <sim_element N="late"><j>y</j></sim_element>
+                <sim_element N="last" />
+            </simulations>""")
+        names = lambda root: [e.get('N') for e in root]
+        
+        root = load_sim_elements(filename, ['child'])
+        self.assertEqual(names(root), ['base', 'child', 'post', 'late'])
+        self.assertEqual(root.tag, 'simulations')
+        # only the first element of a name is kept, as find_sim_element does
+        self.assertEqual(root[1].get('inherit'), 'base')
+        self.assertEqual(names(load_sim_elements(filename, ['late'])), ['late'])
+        self.assertEqual(names(load_sim_elements(filename, ['last', 'missing'])),
+                         ['last'])
+        self.assertEqual(len(load_sim_elements(filename, ['missing'])), 0)
+        
+        # the file isn't read past the elements needed once they have all been seen
+        with mock.patch('pyGRID.iter_sim_elements', 
+                        side_effect = iter_sim_elements) as fake_iter:
+            load_sim_elements(filename, ['base'])
+            self.assertEqual(fake_iter.call_count, 1)
+        
+        args = mock.Mock(file = filename, simulation = 'child', all = False)
+        gridJob, = parsed_simulations(args)
+        self.assertEqual(gridJob.sim.args.S, '/bin/bash')
+        self.assertEqual(gridJob.post_proc.sim.args.j, 'y')
+        args.simulation = 'missing'
+        with self.assertRaises(InvalidSimulatioNameError):
+            list(parsed_simulations(args))
+    
     @mock.patch('subprocess.Popen')
     def test_inheritance_submission(self,fake_popen):
         fake_popen().stdout.read.side_effect = self.job_id_side_effect
         sim_element = find_sim_element(self.root,'inheritanceTest')
         gridJob = pyGRID(sim_element, self.parent_map)
-        with mock.patch('__builtin__.open', mock.mock_open(), create=True) as fake_file:
+        with mock.patch('__builtin__.open', mock.mock_open(), create=True) as fake_file, \
+             mock.patch('os.rename'):
             gridJob.submit()
             assert fake_popen.called
-            assert fake_popen.call_args[0][0] == 'qsub -terse -t 1-10 inheritanceTest.sh'
+            assert re.match("qsub -terse -t 1-10 -o '.*' -e '.*' " +
+                            script_pattern.format('inheritanceTest', script_hash_length),
+                            fake_popen.call_args[0][0])
             assert fake_popen.call_args[1]['shell'] == True
             assert fake_popen.call_args[1]['stdout'] == subprocess.PIPE
             assert fake_popen.call_args[1]['stderr'] == subprocess.STDOUT
@@ -170,7 +400,8 @@ class TestPyGRID(unittest.TestCase):
         fake_popen().stdout.read.side_effect = self.job_id_side_effect
         sim_element = find_sim_element(self.root,'parSpaceTest')
         gridJob = pyGRID(sim_element, self.parent_map)
-        with mock.patch('__builtin__.open', mock.mock_open(), create=True) as fake_file:
+        with mock.patch('__builtin__.open', mock.mock_open(), create=True) as fake_file, \
+             mock.patch('os.rename'):
             gridJob.submit()
             popen_calls = fake_popen.call_args_list
             # we have 2 parameters of 3 values each so there are 9 combinations to be run
@@ -179,9 +410,13 @@ class TestPyGRID(unittest.TestCase):
             
             # let's extract the strings of the qsub calls and for file write calls
             qsub_calls = [popen_calls[i][0][0] for i in range(1,len(popen_calls))]
+            # the jobs differ only by their parameters and streams, passed on the command
+            # line, so the script is written once for the submission and once for the user
             handle = fake_file()
             bash_code = [handle.write.call_args_list[i][0][0] for i in range(0,len(handle.write.call_args_list))]
-            aux_code = bash_code.pop(9)
+            assert len(bash_code) == 3
+            aux_code = bash_code.pop(1)
+            assert len(set(s.split()[-1] for s in qsub_calls)) == 1
             
             par_names = ('Amp','omega')
             par_values = [(2.0,1.0), (2.0,5.5), (2.0,10.0), (5.0,1.0), (5.0,5.5), 
@@ -198,8 +433,8 @@ class TestPyGRID(unittest.TestCase):
                 output_string = '$JOB_NAME.$JOB_ID.$PAR_omega.$PAR_Amp'
                 output_string = output_string.replace('$PAR_Amp',str(c[0]))
                 output_string = output_string.replace('$PAR_omega',str(c[1]))
-                output_string = '#$ -o ' + output_string
-                assert any(output_string in s for s in bash_code)
+                output_string = "-o '{0}'".format(output_string)
+                assert any(output_string in s and var_string in s for s in qsub_calls)
             assert all('echo "Parameter space test"' in s for s in bash_code)
             assert all('echo $omega' in s for s in bash_code)
             assert all('echo $Amp' in s for s in bash_code)
@@ -217,52 +452,978 @@ class TestPyGRID(unittest.TestCase):
             assert sum(1 for s in re.finditer('PAR_omega="5.5"', aux_code)) == 3
             assert sum(1 for s in re.finditer('PAR_omega="10.0"', aux_code)) == 3
     
+    @mock.patch('subprocess.Popen')
+    def test_content_addressed_scripts(self,fake_popen):
+        fake_popen().stdout.read.side_effect = self.job_id_side_effect
+        sim_element = find_sim_element(self.root,'parSpaceTest')
+        self.stream_dir = tempfile.mkdtemp()
+        os.chdir(self.stream_dir)
+        gridJob = pyGRID(sim_element, self.parent_map)
+        gridJob.submit()
+        scripts = set(c[0][0].split()[-1] for c in fake_popen.call_args_list[1:])
+        self.assertEqual(len(scripts), 1)
+        self.assertEqual(sorted(os.listdir('.')), sorted(['parSpaceTest.grid',
+                                                'parSpaceTest.sh'] + list(scripts)))
+        script = scripts.pop()
+        assert '#$ -o' not in open(script).read()
+        
+        # the scripts left untouched are not written again
+        self.assertFalse(write_if_changed(script, open(script).read()))
+        self.assertFalse(write_if_changed(gridJob.bashFilename,
+                                          gridJob.sim.qsub_script()))
+        gridJob = pyGRID(sim_element, self.parent_map)
+        gridJob.submit()
+        self.assertEqual(fake_popen.call_args[0][0].split()[-1], script)
+        # the jobs submitted before are scanned for completed combinations
+        self.assertEqual(sorted(os.listdir('.')), sorted(['parSpaceTest.grid', 
+                    'parSpaceTest.sh', 'parSpaceTest.' + scan_file_extension, script]))
+        
+        # a different script gets a different name
+        gridJob.submit(workers = 2)
+        self.assertEqual(fake_popen.call_args[0][0].split()[-1], script)
+        ET.SubElement(sim_element, 'l').text = 'h_rt=1:00:00'
+        gridJob = pyGRID(sim_element, self.parent_map)
+        gridJob.submit()
+        assert fake_popen.call_args[0][0].split()[-1] != script
+        self.assertEqual(len(os.listdir('.')), 5)
+    
+    @mock.patch('subprocess.Popen')
+    def test_concurrent_submission(self,fake_popen):
+        fake_popen().stdout.read.return_value = '42'
+        sim_element = find_sim_element(self.root,'parSpaceTest')
+        gridJob = pyGRID(sim_element, self.parent_map)
+        params, combinations = gridJob._generate_param_space()
+        with mock.patch('__builtin__.open', mock.mock_open(), create=True) as fake_file, \
+             mock.patch('os.rename'):
+            gridJob.submit(workers = 4)
+            qsub_calls = [c[0][0] for c in fake_popen.call_args_list[1:]]
+            assert len(qsub_calls) == 9
+            
+            # the streams are passed on the command line so the script is written once
+            # for the submission and once for the user
+            handle = fake_file()
+            write_calls = handle.write.call_args_list
+            assert len(write_calls) == 3
+            assert '#$ -o' not in write_calls[0][0][0]
+            
+            # the jobs are recorded in the same order as the combinations
+            root = ET.fromstring(write_calls[1][0][0])
+            job_elements = root.findall(aux_file_kw['job'])
+            self.assertEqual(len(job_elements), 9)
+            for job, c in zip(job_elements, combinations):
+                for name, value in zip(params, c):
+                    self.assertEqual(job.get('PAR_' + name), str(value))
+                self.assertEqual(job.get(aux_file_kw['id']), '42')
+            for c in combinations:
+                values = dict(zip(params, c))
+                output = '$JOB_NAME.$JOB_ID.{0}.{1}'.format(values['omega'], values['Amp'])
+                assert any("-o '{0}'".format(output) in s for s in qsub_calls)
+    
     def test_crash_detection(self):    
         sim_element = find_sim_element(self.root,'crashTest')
         gridJob = pyGRID(sim_element, self.parent_map)        
-        with mock.patch('__builtin__.open', mock.mock_open(read_data=self.crashFile), 
-                                                               create=True) as fake_file:
-                                                               
-            fake_file.return_value.__enter__.return_value.read.side_effect = self.file_read_side_effect 
+        self.write_crash_streams(gridJob)
+        gridJob.scan_crashed_jobs()
+        
+        root = ET.parse(gridJob.auxilliaryFilename).getroot()
+        first_job = root[0]
+        job_children = list(first_job)
+        assert len(job_children) == 1
+        assert job_children[0].tag == aux_file_kw['crashes']
+        self.assertEqual(job_children[0].text, '1-5')
+        assert all(len(list(job_element)) == 0 for job_element in root[1:])
+    
+    def test_parallel_crash_detection(self):
+        sim_element = find_sim_element(self.root,'crashTest')
+        gridJob = pyGRID(sim_element, self.parent_map)
+        self.write_crash_streams(gridJob)
+        # remove the stream files of the last job
+        missing = [f for f in os.listdir('.') if f.startswith('crashTest.9.')]
+        for filename in missing:
+            os.remove(filename)
+        
+        real_open = open
+        with mock.patch('__builtin__.open', side_effect = real_open) as fake_open:
+            gridJob.scan_crashed_jobs(workers = 4)
+            # the stream files missing from the directory listing are never opened
+            opened = [c[0][0] for c in fake_open.call_args_list]
+            self.assertEqual(len(opened), 3 + 80)
+            assert not any(f in opened for f in missing)
+        
+        root = ET.parse(gridJob.auxilliaryFilename).getroot()
+        self.assertEqual(root[0].find(aux_file_kw['crashes']).text, '1-5')
+        assert all(len(list(job_element)) == 0 for job_element in root[1:])
+    
+    def test_incremental_crash_detection(self):
+        sim_element = find_sim_element(self.root,'crashTest')
+        gridJob = pyGRID(sim_element, self.parent_map)
+        self.write_crash_streams(gridJob)
+        gridJob.scan_crashed_jobs()
+        assert os.path.exists('crashTest.' + scan_file_extension)
+        
+        real_open = open
+        with mock.patch('__builtin__.open', side_effect = real_open) as fake_open:
             gridJob.scan_crashed_jobs()
-            open_calls = fake_file.call_args_list
-            assert len(open_calls) == 92
-            
-            handle = fake_file()
-            aux_code = handle.write.call_args_list[0][0][0]
-            root = ET.fromstring(aux_code)
-            first_job = root[0]
-            job_children = list(first_job)
-            assert len(job_children) == 1
-            assert job_children[0].tag == aux_file_kw['crashes']
-            assert all(str(i) in job_children[0].text for i in range(1,5))
+            # the stream files didn't change so none of them is read again
+            opened = [c[0][0] for c in fake_open.call_args_list]
+            assert not any(f.startswith('crashTest.') and not f.endswith('.grid') and 
+                           not f.endswith('.' + scan_file_extension) and 
+                           not f.endswith('.' + completion_file_extension) for f in opened)
+        
+        root = ET.parse(gridJob.auxilliaryFilename).getroot()
+        self.assertEqual(len(root[0].findall(aux_file_kw['crashes'])), 1)
+        self.assertEqual(root[0].find(aux_file_kw['crashes']).text, '1-5')
+        
+        # a task of the second job crashes after the first scan
+        filename = 'crashTest.2.5.5.2.0.3'
+        with open(filename, 'a') as stream_file:
+            stream_file.write(pyGRID_error_identifier[:5])
+        gridJob.scan_crashed_jobs()
+        with open(filename, 'a') as stream_file:
+            stream_file.write(pyGRID_error_identifier[5:] + '\n')
+        with mock.patch('__builtin__.open', side_effect = real_open) as fake_open:
+            gridJob.scan_crashed_jobs()
+            opened = [c[0][0] for c in fake_open.call_args_list]
+            assert filename in opened
+            self.assertEqual(len(opened), 5)
+        
+        root = ET.parse(gridJob.auxilliaryFilename).getroot()
+        self.assertEqual(root[0].find(aux_file_kw['crashes']).text, '1-5')
+        self.assertEqual(root[1].find(aux_file_kw['crashes']).text, '3')
+        
+        # a full scan gives the same result
+        gridJob.scan_crashed_jobs(incremental = False)
+        root = ET.parse(gridJob.auxilliaryFilename).getroot()
+        self.assertEqual(root[1].find(aux_file_kw['crashes']).text, '3')
+
+        # the stream files of a job no longer in the auxiliary file are forgotten
+        def checkpointed():
+            root = ET.parse('crashTest.' + scan_file_extension).getroot()
+            return set(e.get(scan_file_kw['name'])
+                                        for e in root.findall(scan_file_kw['stream']))
+        removed = set(output for index, output, error in gridJob._stream_files(
+                                                                        root[1].attrib))
+        assert removed <= checkpointed()
+        root.remove(root[1])
+        ET.ElementTree(root).write(gridJob.auxilliaryFilename)
+        gridJob.scan_crashed_jobs()
+        assert checkpointed() and not removed & checkpointed()
+
+    def test_search_file_for_error(self):
+        self.stream_dir = tempfile.mkdtemp()
+        filename = os.path.join(self.stream_dir, 'stream')
+        text = 'x' * 1000 + pyGRID_error_identifier + 'y' * 1000
+        open(filename, 'w').write(text)
+        # the identifier is found whatever the position of the block boundaries
+        for chunk_size in [1, 2, 5, 7, 13, 64, 1000, 1005, 4096]:
+            assert search_file_for_error(filename, chunk_size = chunk_size)
+        assert search_file_for_error(filename, chunk_size = 7, tail_size = 1013)
+        assert not search_file_for_error(filename, chunk_size = 7, tail_size = 1012)
+        
+        open(filename, 'w').write('This is fine\n' * 1000)
+        assert not search_file_for_error(filename, chunk_size = 100)
+        open(filename, 'w').write('')
+        assert not search_file_for_error(filename)
+        with self.assertRaises(IOError):
+            search_file_for_error(filename + '.missing')
     
     @mock.patch('subprocess.Popen')        
     def test_crash_resubmission(self, fake_popen):
         fake_popen().stdout.read.side_effect = self.job_id_side_effect
         sim_element = find_sim_element(self.root,'crashTest')
         gridJob = pyGRID(sim_element, self.parent_map)
-        aux_code = None        
-        with mock.patch('__builtin__.open', mock.mock_open(read_data=self.crashFile), 
-                                                               create=True) as fake_file:
-                                                               
-            fake_file.return_value.__enter__.return_value.read.side_effect = self.file_read_side_effect 
-            gridJob.scan_crashed_jobs()
+        self.write_crash_streams(gridJob)
+        gridJob.scan_crashed_jobs()
+        
+        gridJob.resubmit_crashed(scan_first = False)
+        popen_calls = fake_popen.call_args_list            
+        # let's extract the strings of the qsub calls and for file write calls
+        qsub_calls = [popen_calls[i][0][0] for i in range(1,len(popen_calls))]
+        # the crashed tasks are resubmitted as a single array job
+        assert len(qsub_calls) == 1
+        assert '-v ' in qsub_calls[0]
+        assert 'Amp=2.0' in qsub_calls[0] and 'omega=1.0' in qsub_calls[0]
+        assert 'PAR_' not in qsub_calls[0]
+        assert '-t 1-5 ' in qsub_calls[0]
+        
+        root = ET.parse(gridJob.auxilliaryFilename).getroot()
+        new_job = root.findall(aux_file_kw['job'])[-1]
+        self.assertEqual(new_job.get('PAR_Amp'), '2.0')
+        self.assertEqual(new_job.get(aux_file_kw['array']), '1-5')
+    
+    @mock.patch('subprocess.Popen')        
+    def test_remapped_resubmission(self, fake_popen):
+        fake_popen().stdout.read.side_effect = self.job_id_side_effect
+        sim_element = find_sim_element(self.root,'crashTest')
+        gridJob = pyGRID(sim_element, self.parent_map)
+        self.write_crash_streams(gridJob)
+        root = ET.fromstring(self.crashFile)
+        ET.SubElement(root[0], aux_file_kw['crashes']).text = '2 5 6'
+        ET.SubElement(root[1], aux_file_kw['crashes']).text = '3 6 9'
+        writeXMLFile(root, gridJob.auxilliaryFilename)
+        
+        gridJob.resubmit_crashed(scan_first = False)
+        qsub_calls = [c[0][0] for c in fake_popen.call_args_list[1:]]
+        self.assertEqual(len(qsub_calls), 2)
+        assert '-t 1-3 ' in qsub_calls[0]
+        assert '-t 3-9:3 ' in qsub_calls[1]
+        
+        root = ET.parse(gridJob.auxilliaryFilename).getroot()
+        remapped, evenly_spaced = root.findall(aux_file_kw['job'])[-2:]
+        self.assertEqual(remapped.get(aux_file_kw['remap']), '2-5:3,6')
+        self.assertEqual(remapped.get(aux_file_kw['array']), '1-3')
+        assert evenly_spaced.get(aux_file_kw['remap']) is None
+        bash_code = open(gridJob.bashFilename).read()
+        assert 'pyGRID_run in 2:2:3 6:1:1;' not in bash_code
+        
+        # a crash of the remapped job is mapped back to the original TASK_ID
+        ET.SubElement(remapped, aux_file_kw['crashes']).text = '2'
+        writeXMLFile(root, gridJob.auxilliaryFilename)
+        gridJob.resubmit_crashed(scan_first = False)
+        assert '-t 5 ' in fake_popen.call_args_list[-1][0][0]
+    
+    @mock.patch('subprocess.Popen')        
+    def test_array_sweep_resubmission(self, fake_popen):
+        fake_popen().stdout.read.side_effect = self.job_id_side_effect
+        sim_element = find_sim_element(self.root,'arraySweepTest')
+        gridJob = pyGRID(sim_element, self.parent_map)
+        self.stream_dir = tempfile.mkdtemp()
+        os.chdir(self.stream_dir)
+        gridJob.submit(array_sweep = True)
+        
+        root = ET.parse(gridJob.auxilliaryFilename).getroot()
+        ET.SubElement(root[0], aux_file_kw['crashes']).text = '4 5 6 50'
+        writeXMLFile(root, gridJob.auxilliaryFilename)
+        gridJob.resubmit_crashed(scan_first = False)
+        assert '-t 1-4 ' in fake_popen.call_args_list[-1][0][0]
+        
+        # the new job is still an array sweep mapping its tasks to the original ones
+        bash_code = open(fake_popen.call_args_list[-1][0][0].split()[-1]).read()
+        assert 'pyGRID_run in 4:3:1 50:1:1;' in bash_code
+        assert 'export omega=' in bash_code
+        root = ET.parse(gridJob.auxilliaryFilename).getroot()
+        self.assertEqual(len(root), 1)
+        self.assertEqual(root[0].get(aux_file_kw['remap']), '4-6,50')
+        self.assertEqual(root[0].get(aux_file_kw['tasks']), '1-10')
+        self.assertEqual(len(root[0].findall(aux_file_kw['parameter'])), 2)
+    
+    def write_fake_scheduler(self, qstat_xml, qacct_text):
+        """
+        Write fake qstat and qacct commands printing the given outputs and logging
+        their calls in the file scheduler.log of the current directory. Return a
+        SchedulerState using them.
+        """
+        log = os.path.abspath('scheduler.log')
+        open(log, 'w').close()
+        commands = []
+        for name, text in [('qstat', qstat_xml), ('qacct', qacct_text)]:
+            command = os.path.abspath('fake_' + name)
+            open(name + '.out', 'w').write(text)
+            open(command, 'w').write('#!/bin/sh\necho {0} "$@" >> {1}\ncat {2}\n'.format(
+                                    name, log, os.path.abspath(name + '.out')))
+            os.chmod(command, 0755)
+            commands.append(command)
+        return SchedulerState(ttl = 60, qstat = commands[0], qacct = commands[1], 
+                                                                        user = 'me')
+    
+    def scheduler_calls(self):
+        return open('scheduler.log').read().splitlines()
+    
+    def test_scheduler_state(self):
+        sim_element = find_sim_element(self.root,'crashTest')
+        gridJob = pyGRID(sim_element, self.parent_map)
+        self.write_crash_streams(gridJob)
+        # the tasks of the third job are still in the queue, the stream files of the
+        # first tasks of the second job are being written
+        for filename in [f for f in os.listdir('.') if f.startswith('crashTest.3.')]:
+            os.remove(filename)
+        qstat_xml = """<?xml version='1.0'?>
+<job_info>
+  <queue_info>
+    <job_list state="running"><JB_job_number>2</JB_job_number><state>r</state>
+      <tasks>1</tasks></job_list>
+    <job_list state="running"><JB_job_number>2</JB_job_number><state>r</state>
+      <tasks>2</tasks></job_list>
+  </queue_info>
+  <job_info>
+    <job_list state="pending"><JB_job_number>3</JB_job_number><state>qw</state>
+      <tasks>1-10:1</tasks></job_list>
+  </job_info>
+</job_info>
+"""
+        # the seventh task of the fourth job was killed before the error trap ran
+        qacct_text = ''.join("""==============================================================
+qname        all.q
+jobname      crashTest
+jobnumber    {0}
+taskid       {1}
+failed       {2}
+exit_status  {3}
+""".format(job, task, 100 if (job, task) == (4, 7) else 0, 
+                                137 if (job, task) == (4, 7) else 0)
+                            for job in [1, 4] for task in range(1, 11))
+        gridJob.scheduler = self.write_fake_scheduler(qstat_xml, qacct_text)
+        
+        gridJob.scan_crashed_jobs(workers = 4)
+        # the scheduler is asked once whatever the number of jobs and tasks
+        self.assertEqual(self.scheduler_calls(), ['qstat -xml -u me', 'qacct -j crashTest'])
+        root = ET.parse(gridJob.auxilliaryFilename).getroot()
+        self.assertEqual(root[0].find(aux_file_kw['crashes']).text, '1-5')
+        self.assertEqual(root[3].find(aux_file_kw['crashes']).text, '7')
+        self.assertEqual(sum(1 for job in root if job.find(aux_file_kw['crashes']) 
+                                                                    is not None), 2)
+        
+        report = dict((job.get(aux_file_kw['id']), states) 
+                                                for job, states in gridJob.status())
+        # the error trap doesn't change the exit status of the tasks
+        self.assertEqual(report['1'], {task_states['finished']: TaskSet.parse('1-10')})
+        self.assertEqual(str(report['2'][task_states['running']]), '1-2')
+        self.assertEqual(str(report['2'][task_states['unknown']]), '3-10')
+        self.assertEqual(report['3'].keys(), [task_states['pending']])
+        self.assertEqual(str(report['4'][task_states['failed']]), '7')
+        self.assertEqual(len(self.scheduler_calls()), 2)
+        
+        # the state is read again once it expires
+        now = time.time()
+        with mock.patch('time.time', return_value = now + 60):
+            gridJob.status()
+        self.assertEqual(len(self.scheduler_calls()), 4)
+    
+    def test_supervise(self):
+        sim_element = find_sim_element(self.root,'crashTest')
+        gridJob = pyGRID(sim_element, self.parent_map)
+        self.write_crash_streams(gridJob)
+        gridJob.scheduler = self.write_fake_scheduler('<job_info/>', '')
+        running = "<job_info><job_list><JB_job_number>{0}</JB_job_number><state>r"\
+                  "</state></job_list></job_info>"
+        
+        def write_streams(job_id, tasks, crashed):
+            for task in tasks:
+                text = pyGRID_error_identifier if task in crashed else 'This is fine'
+                open('crashTest.{0}.1.0.2.0.{1}'.format(job_id, task), 'w').write(text)
+        
+        # the state of the cluster after every poll
+        clock = [1000.0]
+        polls = [lambda: open('qstat.out', 'w').write(running.format(100)),
+                 lambda: (open('qstat.out', 'w').write('<job_info/>'), 
+                          write_streams(100, range(1, 6), [2])),
+                 lambda: None,
+                 lambda: None,
+                 lambda: write_streams(101, [2], [2])]
+        def sleep(seconds):
+            clock[0] += seconds
+            polls.pop(0)()
+        
+        job_ids = iter(['100', '101'])
+        with mock.patch('time.time', side_effect = lambda: clock[0]), \
+             mock.patch('time.sleep', side_effect = sleep) as fake_sleep, \
+             mock.patch.object(pyGRID, '_qsub', side_effect = lambda e: next(job_ids)):
+            given_up = gridJob.supervise(poll_interval = 60, max_retries = 2, 
+                                                                        backoff = 100)
+            self.assertEqual(fake_sleep.call_count, 5)
+        
+        # the second resubmission waits for the backoff, then the job is given up
+        self.assertEqual([job.get(aux_file_kw['id']) for job in given_up], ['101'])
+        calls = self.scheduler_calls()
+        self.assertEqual(calls.count('qstat -xml -u me'), 6)
+        self.assertEqual(calls.count('qacct -j crashTest'), 6)
+        root = ET.parse(gridJob.auxilliaryFilename).getroot()
+        self.assertEqual(len(root), 9)
+        self.assertEqual(root[-1].get(aux_file_kw['id']), '101')
+        self.assertEqual(root[-1].get(aux_file_kw['retries']), '2')
+        self.assertEqual(root[-1].find(aux_file_kw['crashes']).text, '2')
+    
+    def test_supervise_error_state(self):
+        sim_element = find_sim_element(self.root,'crashTest')
+        gridJob = pyGRID(sim_element, self.parent_map)
+        self.write_crash_streams(gridJob)
+        # the third task of the second job is in error and never leaves the queue
+        error = "<job_list><JB_job_number>{0}</JB_job_number><state>Eqw</state>"\
+                "<tasks>3</tasks></job_list>"
+        gridJob.scheduler = self.write_fake_scheduler(
+                                        '<job_info>' + error.format(2) + '</job_info>', '')
+        
+        def sleep(seconds):
+            # the task resubmitted goes in error too, the other tasks completed
+            open('qstat.out', 'w').write('<job_info>' + error.format(2) + 
+                                         error.format(101) + '</job_info>')
+            for task in range(1, 6):
+                open('crashTest.100.1.0.2.0.{0}'.format(task), 'w').write('This is fine')
+        
+        job_ids = iter(['100', '101'])
+        with mock.patch('time.sleep', side_effect = sleep) as fake_sleep, \
+             mock.patch.object(pyGRID, '_qsub', side_effect = lambda e: next(job_ids)):
+            given_up = gridJob.supervise(poll_interval = 60, max_retries = 1)
+            self.assertEqual(fake_sleep.call_count, 1)
+        
+        # the task in error crashed and is given up after its resubmission
+        self.assertEqual([job.get(aux_file_kw['id']) for job in given_up], ['101'])
+        root = ET.parse(gridJob.auxilliaryFilename).getroot()
+        self.assertEqual([job.get(aux_file_kw['id']) for job in root[-2:]], 
+                         ['100', '101'])
+        self.assertEqual(root[-1].get(aux_file_kw['array']), '3')
+        self.assertEqual(root[-1].find(aux_file_kw['crashes']).text, '3')
+        assert root[-2].find(aux_file_kw['crashes']) is None
+    
+    def test_definition_cache(self):
+        xml_filename = os.path.abspath('tests/tests.xml')
+        self.stream_dir = tempfile.mkdtemp()
+        os.chdir(self.stream_dir)
+        shutil.copy(xml_filename, 'tests.xml')
+        cache = DefinitionCache('cache')
+        simulations = cache.load('tests.xml')
+        self.assertEqual([name for name, gridJob in simulations],
+                         [e.get('N') for e in self.root.findall('sim_element')])
+        self.assertEqual(len(os.listdir('cache')), 1)
+        
+        # the cached simulations are resolved like the ones parsed from the file
+        with mock.patch.object(DefinitionCache, 'build') as fake_build:
+            simulations = dict(cache.load('tests.xml'))
+            assert not fake_build.called
+        for name in ['basicTest', 'parSpaceTest', 'postProcTest']:
+            gridJob = pyGRID(find_sim_element(self.root, name), self.parent_map)
+            self.assertEqual(str(simulations[name]), str(gridJob))
+        self.assertEqual(simulations['postProcTest'].post_proc.sim.args.N, 'postProcJob')
+        simulations['basicTest'].sim.add_option('l', 'h_rt=1:00:00')
+        self.assertEqual(simulations['basicTest'].sim.args.l, 'h_rt=1:00:00')
+        
+        # a change of the file rebuilds the simulations
+        with open('tests.xml', 'a') as xml_file:
+            xml_file.write('<!-- changed -->')
+        with mock.patch.object(cache, 'build', wraps = cache.build) as fake_build:
+            self.assertEqual(len(cache.load('tests.xml')), len(simulations))
+            assert fake_build.called
+        
+        # a single simulation is built from its elements only and cached on its own
+        cache = DefinitionCache('single')
+        with mock.patch('pyGRID.load_sim_elements', wraps = load_sim_elements) as fake_load:
+            simulations = cache.load('tests.xml', names = ['postProcTest'])
+            fake_load.assert_called_once_with(os.path.abspath('tests.xml'), 
+                                              ['postProcTest'])
+        self.assertEqual([name for name, gridJob in simulations], ['postProcTest'])
+        self.assertEqual(simulations[0][1].post_proc.sim.args.N, 'postProcJob')
+        directory = os.path.join('single', os.listdir('single')[0])
+        self.assertEqual(len(os.listdir(directory)), 1)
+        with mock.patch.object(DefinitionCache, 'build') as fake_build, \
+             mock.patch('pyGRID.load_sim_elements') as fake_load:
+            simulations = cache.load('tests.xml', names = ['postProcTest'])
+            assert not fake_build.called and not fake_load.called
+        self.assertEqual(simulations[0][1].post_proc.sim.args.N, 'postProcJob')
+        # the index of the simulations is written when they are all loaded
+        self.assertEqual(len(cache.load('tests.xml')), 
+                         len(self.root.findall('sim_element')))
+        self.assertEqual(len(os.listdir(directory)), 
+                         len(set(e.get('N') for e in self.root.findall('sim_element'))) + 1)
+        
+        args = mock.Mock(file = 'tests.xml', cache_dir = 'cache', simulation = 'noSuchSim')
+        assert cached_simulations(args) is None
+        args.simulation = 'inheritanceTest'
+        self.assertEqual(cached_simulations(args)[0].array, '1-10')
+    
+    @mock.patch('subprocess.Popen')
+    def test_profiler(self, fake_popen):
+        fake_popen().stdout.read.side_effect = self.job_id_side_effect
+        sim_element = find_sim_element(self.root,'parSpaceTest')
+        self.stream_dir = tempfile.mkdtemp()
+        os.chdir(self.stream_dir)
+        
+        # nothing is recorded while the profiler is disabled
+        profiler.reset()
+        gridJob = pyGRID(sim_element, self.parent_map)
+        self.assertEqual(profiler.summary(), [])
+        
+        profiler.enable(trace = True)
+        try:
+            gridJob = pyGRID(sim_element, self.parent_map)
+            with profiler.span('submission'):
+                gridJob.submit()
+        finally:
+            profiler.disable()
+        phases = dict((row[0], row[1:]) for row in profiler.summary())
+        self.assertEqual(phases['pyGRID._submit_job'][0], 9)
+        self.assertEqual(phases['pyGRID._qsub'][0], 9)
+        # the element inherited is parsed too
+        self.assertEqual(phases['pyGRID._parse_element'][0], 2)
+        self.assertEqual(phases['submission'][0], 1)
+        count, total, p50, p99 = phases['pyGRID._submit_job']
+        assert 0 < p50 <= p99 <= total <= phases['submission'][1]
+        
+        profiler.write_chrome_trace('trace.json')
+        events = json.load(open('trace.json'))['traceEvents']
+        self.assertEqual(len([e for e in events if e['name'] == 'pyGRID._qsub']), 9)
+        assert all(e['ph'] == 'X' and e['dur'] >= 0 for e in events)
+        profiler.reset()
+    
+    def test_task_remap_bash_code(self):
+        self.assertEqual(array_notation([3]), '3')
+        self.assertEqual(array_notation([3, 4, 5]), '3-5')
+        self.assertEqual(array_notation([3, 5, 7]), '3-7:2')
+        self.assertEqual(array_notation([3, 5, 8]), None)
+        task_ids = [2, 5, 6, 7, 8, 20, 30]
+        code = remap_bash_code(TaskSet(task_ids))
+        for task, original in enumerate(task_ids, 1):
+            p = subprocess.Popen(['bash', '-c', code + 'echo $SGE_TASK_ID'],
+                                 stdout = subprocess.PIPE,
+                                 env = dict(os.environ, SGE_TASK_ID = str(task)))
+            self.assertEqual(p.communicate()[0].strip(), str(original))
+    
+    @mock.patch('subprocess.Popen')
+    def test_sqlite_job_store(self, fake_popen):
+        fake_popen().stdout.read.side_effect = self.job_id_side_effect
+        sim_element = find_sim_element(self.root,'crashTest')
+        gridJob = pyGRID(sim_element, self.parent_map)
+        gridJob.job_store = 'sqlite'
+        self.write_crash_streams(gridJob)
+        store = gridJob._open_job_store()
+        import_grid_file(gridJob.auxilliaryFilename, store)
+        store.close()
+        
+        gridJob.scan_crashed_jobs()
+        store = gridJob._open_job_store()
+        self.assertEqual(len(store.jobs()), 9)
+        crashed = store.crashed_jobs()
+        self.assertEqual(len(crashed), 1)
+        self.assertEqual(crashed[0][1].get(aux_file_kw['id']), '1')
+        self.assertEqual(crashed[0][1].find(aux_file_kw['crashes']).text, '1-5')
+        self.assertEqual(len(store.crashed_jobs({'Amp': 2.0, 'omega': 1.0})), 1)
+        self.assertEqual(len(store.crashed_jobs({'Amp': 5.0})), 0)
+        # the values are compared as numbers
+        self.assertEqual(len(store.crashed_jobs({'Amp': '2', 'omega': '1'})), 1)
+        self.assertEqual(len(store.crashed_jobs({'Amp': 'two'})), 0)
+        store.close()
+        
+        gridJob.resubmit_crashed(scan_first = False, parameters = {'Amp': 2.0})
+        store = gridJob._open_job_store()
+        self.assertEqual(len(store.jobs()), 8 + 1)
+        self.assertEqual(len(store.crashed_jobs()), 0)
+        # the crashed job is kept as history of the resubmission
+        key = store.connection.execute('SELECT key FROM jobs WHERE active = 0').fetchone()[0]
+        self.assertEqual(len(store.resubmissions(key)), 1)
+        
+        os.remove(gridJob.auxilliaryFilename)
+        export_grid_file(store, gridJob.auxilliaryFilename)
+        store.close()
+        root = ET.parse(gridJob.auxilliaryFilename).getroot()
+        self.assertEqual(len(root.findall(aux_file_kw['job'])), 9)
+    
+    def test_resubmit_array_sweep_where(self):
+        sim_element = find_sim_element(self.root,'arraySweepTest')
+        gridJob = pyGRID(sim_element, self.parent_map)
+        self.stream_dir = tempfile.mkdtemp()
+        os.chdir(self.stream_dir)
+        job_ids = iter(['1', '2'])
+        with mock.patch.object(pyGRID, '_qsub', side_effect = lambda e: next(job_ids)):
+            gridJob.submit(array_sweep = True)
+            store = gridJob._open_job_store()
+            self.assertEqual(len(store.crashed_jobs({'Amp': '5'})), 0)
+            key, job_element = store.jobs()[0]
+            store.set_crashes(key, TaskSet.parse('1-90'))
+            store.close()
+            
+            # only the crashed tasks whose combination matches are resubmitted
+            gridJob.resubmit_crashed(scan_first = False, parameters = {'Amp': '5'})
+        
+        root = ET.parse(gridJob.auxilliaryFilename).getroot()
+        self.assertEqual([job.get(aux_file_kw['id']) for job in root], ['1', '2'])
+        old, new = root
+        self.assertEqual(len(TaskSet.parse(old.find(aux_file_kw['crashes']).text)), 60)
+        tasks = parse_array_notation(new.get(aux_file_kw['array']))
+        self.assertEqual(len(tasks), 30)
+        self.assertEqual(set(dict(gridJob._task_run(new, i)[0])['Amp'] for i in tasks),
+                         set(['5.0']))
+        self.assertEqual(set(gridJob._task_run(new, i)[1] for i in tasks), 
+                         set(range(1, 11)))
+        assert not any(dict(gridJob._task_run(old, i)[0])['Amp'] == '5.0' 
+                for i in TaskSet.parse(old.find(aux_file_kw['crashes']).text))
+    
+    @mock.patch('subprocess.Popen')
+    def test_array_sweep_submission(self,fake_popen):
+        fake_popen().stdout.read.side_effect = self.job_id_side_effect
+        sim_element = find_sim_element(self.root,'arraySweepTest')
+        gridJob = pyGRID(sim_element, self.parent_map)
+        with mock.patch('__builtin__.open', mock.mock_open(), create=True) as fake_file, \
+             mock.patch('os.rename'):
+            gridJob.submit(array_sweep = True)
+            # a single qsub call for the 9 combinations times the 10 tasks of the array
+            popen_calls = fake_popen.call_args_list
+            assert len(popen_calls) == 2
+            assert re.match("qsub -terse -t 1-90 -o '.*' -e '.*' " +
+                            script_pattern.format('arraySweepTest', script_hash_length),
+                            popen_calls[1][0][0])
+            
             handle = fake_file()
-            aux_code = handle.write.call_args_list[0][0][0]
+            bash_code = handle.write.call_args_list[0][0][0]
+            assert 'SGE_TASK_ID=$((1 + (pyGRID_index % 10) * 1))' in bash_code
+            assert 'export omega=' in bash_code
+            assert 'export Amp=' in bash_code
+            assert 'echo "Parameter space test"' in bash_code
+            
+            aux_code = handle.write.call_args_list[1][0][0]
+            root = ET.fromstring(aux_code)
+            job = root.find(aux_file_kw['job'])
+            self.assertEqual(job.get(aux_file_kw['array']), '1-90')
+            self.assertEqual(job.get(aux_file_kw['tasks']), '1-10')
+            par_elements = job.findall(aux_file_kw['parameter'])
+            self.assertEqual(len(par_elements), 2)
+            
+            # the script written for the user doesn't decode the parameters
+            bash_code = handle.write.call_args_list[2][0][0]
+            assert 'pyGRID_index' not in bash_code
+        
+        sim_element = find_sim_element(self.root,'parSpaceTest')
+        gridJob = pyGRID(sim_element, self.parent_map)
+        with self.assertRaises(InvalidArraySweepError):
+            gridJob.submit(array_sweep = True)
+    
+    def test_parameter_constraints(self):
+        space = ParameterSpace(['Amp', 'omega'], [[2.0, 5.0, 6.0], [1.0, 5.5, 10.0]])
+        constrained = space.constrain(['omega < Amp'])
+        self.assertEqual(list(constrained), [(2.0, 1.0), (5.0, 1.0), (6.0, 1.0), 
+                                             (6.0, 5.5)])
+        self.assertEqual(len(constrained), 4)
+        self.assertEqual(constrained[-1], (6.0, 5.5))
+        self.assertEqual(constrained.groups, [[0, 1]])
+        self.assertEqual(list(space.constrain(['omega < Amp', 'sqrt(Amp) > 2'])),
+                         [(5.0, 1.0), (6.0, 1.0), (6.0, 5.5)])
+        self.assertEqual(len(space.constrain(['(omega > 1) & (omega < 2)'])), 0)
+        # the values left are written the same way as before constraining
+        space = ParameterSpace(['a', 'b'], [[4.0 / 3, 2.0], [1, 2]])
+        constrained = space.constrain(['b < 2'])
+        self.assertEqual([str(v) for v in constrained[0]], ['1.33333333333', '1'])
+        self.assertEqual([type(v) for v in constrained[1]], [float, int])
+        for constraint in ['foo < 1', 'omega <', '__import__("os")']:
+            with self.assertRaises(InvalidConstraintError):
+                space.constrain([constraint])
+        
+        # the parameters zipped in a group vary together
+        space = ParameterSpace(['a', 'b', 'c'], [[1, 2], [10, 20, 30], [3, 4]],
+                               groups = [[0, 2], [1]])
+        self.assertEqual(list(space), [(1, 10, 3), (1, 20, 3), (1, 30, 3),
+                                       (2, 10, 4), (2, 20, 4), (2, 30, 4)])
+        self.assertEqual([space[i] for i in range(len(space))], list(space))
+        self.assertEqual(list(space.constrain(['b > 10 * a'])), 
+                         [(1, 20, 3), (1, 30, 3), (2, 30, 4)])
+        
+    def test_constrained_submission(self):
+        sim_element = find_sim_element(self.root,'constraintTest')
+        gridJob = pyGRID(sim_element, self.parent_map)
+        self.assertEqual(gridJob.constraints, ['omega < Amp'])
+        self.stream_dir = tempfile.mkdtemp()
+        os.chdir(self.stream_dir)
+        
+        # the combinations pruned are never submitted
+        with mock.patch('subprocess.Popen') as fake_popen:
+            fake_popen().stdout.read.side_effect = self.job_id_side_effect
+            gridJob.submit()
+            qsub_calls = [c[0][0] for c in fake_popen.call_args_list[1:]]
+            self.assertEqual(len(qsub_calls), 4)
+            assert not any('omega=10.0' in c for c in qsub_calls)
+            
+            # an array sweep runs one task per combination left and TASK_ID
+            gridJob.submit(array_sweep = True)
+            assert '-t 1-8 ' in fake_popen.call_args[0][0]
+        job = ET.parse(gridJob.auxilliaryFilename).getroot()[0]
+        self.assertEqual(job.get(aux_file_kw['groups']), '0 0')
+        par_elements = job.findall(aux_file_kw['parameter'])
+        names = [e.get(aux_file_kw['par_name']) for e in par_elements]
+        par_values = [e.text.split() for e in par_elements]
+        groups = parse_sweep_groups(job.get(aux_file_kw['groups']))
+        script = fake_popen.call_args[0][0].split()[-1]
+        for task in range(1, 9):
+            combination, original_task = decode_array_sweep_task(task, par_values,
+                                                                 '1-2', groups)
+            values = dict(zip(names, combination))
+            assert float(values['omega']) < float(values['Amp'])
+            output = subprocess.check_output(['bash', '-c', open(script).read() + 
+                                '\necho $omega $Amp $SGE_TASK_ID', 'sh'],
+                                env = dict(os.environ, SGE_TASK_ID = str(task)))
+            self.assertEqual(output.split()[-3:], [values['omega'], values['Amp'],
+                                                   str(original_task)])
+    
+    def test_parameter_sampling(self):
+        # the first points of the Sobol sequence
+        self.assertEqual(sobol_points(4, 2).tolist(), [[0., 0.], [0.5, 0.5], 
+                                                       [0.75, 0.25], [0.25, 0.75]])
+        # every point of a Latin hypercube sample is in its own stratum
+        points = sampling_points('lhs', 16, 3, seed = 1)
+        for column in points.T:
+            self.assertEqual(sorted((column * 16).astype(int)), range(16))
+        for method in sampling_methods:
+            points = sampling_points(method, 64, 21, seed = 2)
+            self.assertEqual(points.shape, (64, 21))
+            assert ((points >= 0) & (points < 1)).all()
+            numpy.testing.assert_array_equal(points, 
+                                             sampling_points(method, 64, 21, seed = 2))
+        with self.assertRaises(InvalidSamplingError):
+            sobol_points(4, 22)
+        
+        sim_element = find_sim_element(self.root,'samplingTest')
+        gridJob = pyGRID(sim_element, self.parent_map)
+        self.assertEqual(gridJob.sampling, dict(method = 'lhs', samples = 6, seed = 3))
+        self.assertEqual(gridJob.parameter_bounds, dict(omega = (1., 10.)))
+        names, space = gridJob._generate_param_space()
+        combinations = list(space)
+        self.assertEqual(len(combinations), 6)
+        self.assertEqual(combinations, list(gridJob._generate_param_space()[1]))
+        values = dict(zip(names, zip(*combinations)))
+        # the continuous parameter is sampled over its interval, the other one takes 
+        # its values
+        assert all(1. <= omega <= 10. for omega in values['omega'])
+        self.assertEqual(len(set(values['omega'])), 6)
+        assert set(values['Amp']) <= set([2.0, 5.0, 6.0])
+        # the samples are python numbers, written the same way whichever way the 
+        # combinations are submitted
+        assert all(type(v) is float for c in combinations for v in c)
+        
+        gridJob.constraints = ['omega < Amp']
+        assert all(c[names.index('omega')] < c[names.index('Amp')]
+                                            for c in gridJob._generate_param_space()[1])
+        for attributes in ['sampling="grid" samples="4"', 'sampling="lhs"', 
+                           'sampling="lhs" samples="0"', 'sampling="sobol" samples="a"']:
+            with self.assertRaises(InvalidSamplingError):
+                parse_sampling(ET.fromstring('<parameters {0}/>'.format(attributes)))
+    
+    def test_parameter_groups(self):
+        sim_element = find_sim_element(self.root,'groupTest')
+        gridJob = pyGRID(sim_element, self.parent_map)
+        self.assertEqual(gridJob.parameter_groups, [['omega', 'Amp']])
+        self.assertEqual(sorted(gridJob.parameters), ['Amp', 'omega', 'phase'])
+        names, space = gridJob._generate_param_space()
+        self.assertEqual(len(space), 6)
+        expected = set((o, a, p) for o, a in [(1., 2.), (5.5, 5.), (10., 6.)] 
+                                                                    for p in [0., 1.])
+        self.assertEqual(set((c[names.index('omega')], c[names.index('Amp')], 
+                              c[names.index('phase')]) for c in space), expected)
+        self.stream_dir = tempfile.mkdtemp()
+        os.chdir(self.stream_dir)
+        
+        # every job records the values of its parameters
+        with mock.patch('subprocess.Popen') as fake_popen:
+            fake_popen().stdout.read.side_effect = self.job_id_side_effect
+            gridJob.submit()
+            self.assertEqual(len(fake_popen.call_args_list[1:]), 6)
+            jobs = ET.parse(gridJob.auxilliaryFilename).getroot()
+            self.assertEqual(set((float(j.get('PAR_omega')), float(j.get('PAR_Amp')),
+                                  float(j.get('PAR_phase'))) for j in jobs), expected)
+            
+            # an array sweep records the groups to map a TASK_ID to its combination
+            os.remove(gridJob.auxilliaryFilename)
+            gridJob.output_filename_template = '$JOB_NAME.o$JOB_ID.$TASK_ID'
+            gridJob.array = None
+            gridJob.submit(array_sweep = True)
+            assert '-t 1-6 ' in fake_popen.call_args[0][0]
+        job = ET.parse(gridJob.auxilliaryFilename).getroot()[0]
+        par_elements = job.findall(aux_file_kw['parameter'])
+        par_values = [e.text.split() for e in par_elements]
+        groups = parse_sweep_groups(job.get(aux_file_kw['groups']))
+        combinations = set(tuple(float(v) for v in 
+                                decode_array_sweep_task(task, par_values, None, groups)[0])
+                                                                for task in range(1, 7))
+        self.assertEqual(combinations, set(tuple(c) for c in space))
+        
+        for code in ['<group><parameter name="a">1 2</parameter>'
+                     '<parameter name="b">1 2 3</parameter></group>',
+                     '<group><parameter name="a">1 2</parameter></group>'
+                     '<parameter name="a">1 2</parameter>']:
+            with self.assertRaises(InvalidParameterGroupError):
+                parse_parameters(ET.fromstring('<parameters>{0}</parameters>'.format(code)))
+    
+    def test_bundled_submission(self):
+        sim_element = find_sim_element(self.root,'constraintTest')
+        gridJob = pyGRID(sim_element, self.parent_map)
+        # the combination run as the fifth task of the sweep crashes
+        gridJob.sim.args.code = error_handling_bash_code + '\necho $omega $Amp '\
+                            '$SGE_TASK_ID\nif [ $pyGRID_item -eq 5 ]; then false; fi\n'
+        self.stream_dir = tempfile.mkdtemp()
+        os.chdir(self.stream_dir)
         
-        with mock.patch('__builtin__.open', mock.mock_open(read_data=aux_code), 
-                                                               create=True) as fake_file:
-                                                               
+        # the 8 tasks of the sweep run in bundles of 3
+        with mock.patch('subprocess.Popen') as fake_popen:
+            fake_popen().stdout.read.side_effect = self.job_id_side_effect
+            gridJob.submit(bundle = 3)
+            assert '-t 1-3 ' in fake_popen.call_args[0][0]
+        job = ET.parse(gridJob.auxilliaryFilename).getroot()[0]
+        self.assertEqual(job.get(aux_file_kw['items']), '1-8')
+        self.assertEqual(job.get(aux_file_kw['bundle']), '3')
+        
+        par_elements = job.findall(aux_file_kw['parameter'])
+        par_values = [e.text.split() for e in par_elements]
+        names = [e.get(aux_file_kw['par_name']) for e in par_elements]
+        groups = parse_sweep_groups(job.get(aux_file_kw['groups']))
+        expected = []
+        for item in [4, 5, 6]:
+            combination, task = decode_array_sweep_task(item, par_values, '1-2', groups)
+            values = dict(zip(names, combination))
+            expected.append([values['omega'], values['Amp'], str(task)])
+        
+        script = fake_popen.call_args[0][0].split()[-1]
+        stream_filename = '{0}.o{1}.2'.format(gridJob.sim.args.N, job.get('JOB_ID'))
+        with open(stream_filename, 'w') as stream_file:
+            subprocess.call(['bash', script], stdout = stream_file, 
+                            env = dict(os.environ, SGE_TASK_ID = '2'))
+        lines = [l.split() for l in open(stream_filename) if len(l.split()) == 3]
+        self.assertEqual(lines, expected)
+        assert pyGRID_error_identifier + ' task 5\n' in open(stream_filename).read()
+        
+        # the crash is reported for the combination, not for the bundle
+        gridJob.scan_crashed_jobs(incremental = False)
+        job = ET.parse(gridJob.auxilliaryFilename).getroot()[0]
+        self.assertEqual(job.findtext(aux_file_kw['crashes']), '5')
+        with mock.patch('subprocess.Popen') as fake_popen:
+            fake_popen().stdout.read.side_effect = self.job_id_side_effect
             gridJob.resubmit_crashed(scan_first = False)
-            popen_calls = fake_popen.call_args_list            
-            # let's extract the strings of the qsub calls and for file write calls
-            qsub_calls = [popen_calls[i][0][0] for i in range(1,len(popen_calls))]
-            assert len(qsub_calls) == 5
-            assert all('-v PAR_Amp=2.0,PAR_omega=1.0' in s for s in qsub_calls)
-            for i in range(1,6):
-                assert any('-t {0}'.format(str(i)) in s for s in qsub_calls)
+            assert '-t 1-1 ' in fake_popen.call_args[0][0]
+        job = ET.parse(gridJob.auxilliaryFilename).getroot()[0]
+        self.assertEqual(job.get(aux_file_kw['items']), '5')
+        self.assertEqual(job.get(aux_file_kw['bundle']), '3')
+        
+        # the combinations of a bundle can run at the same time on its slots
+        with mock.patch('subprocess.Popen') as fake_popen:
+            fake_popen().stdout.read.side_effect = self.job_id_side_effect
+            gridJob.submit(bundle = 3, parallel = True)
+        script = fake_popen.call_args[0][0].split()[-1]
+        output = subprocess.check_output(['bash', script], 
+                                    env = dict(os.environ, SGE_TASK_ID = '2', NSLOTS = '2'))
+        self.assertEqual(sorted(l.split() for l in output.splitlines() 
+                                                    if len(l.split()) == 3), expected)
     
+    def test_completion_cache(self):
+        sim_element = find_sim_element(self.root,'parSpaceTest')
+        gridJob = pyGRID(sim_element, self.parent_map)
+        gridJob.array = None
+        gridJob.outputs = ['$JOB_NAME.$PAR_omega.$PAR_Amp.dat']
+        self.stream_dir = tempfile.mkdtemp()
+        os.chdir(self.stream_dir)
+        gridJob.scheduler = self.write_fake_scheduler('<job_info/>', '')
+        
+        def submitted_combinations(**kwargs):
+            gridJob.scheduler.invalidate()
+            with mock.patch.object(pyGRID, '_qsub', 
+                                   side_effect = lambda e: self.job_id_side_effect()):
+                gridJob.submit(**kwargs)
+            root = ET.parse(gridJob.auxilliaryFilename).getroot()
+            return sorted((float(job.get('PAR_omega')), float(job.get('PAR_Amp'))) 
+                                                                        for job in root)
+        
+        def run_jobs(crashed = (), running = (), missing = ()):
+            # the jobs write their stream and output files, the finished ones are
+            # accounted and the running ones are in the queue
+            finished = []
+            queued = []
+            for job in ET.parse(gridJob.auxilliaryFilename).getroot():
+                combination = (job.get('PAR_omega'), job.get('PAR_Amp'))
+                for index, output, error in gridJob._stream_files(job.attrib):
+                    for filename in [output, error]:
+                        open(filename, 'w').write(pyGRID_error_identifier if 
+                                    combination in crashed else 'This is fine')
+                if combination not in missing:
+                    open('parSpaceTest.{0}.{1}.dat'.format(*combination), 'w').close()
+                if combination in running:
+                    queued.append('<job_list><JB_job_number>{0}</JB_job_number><state>'
+                                  'r</state></job_list>'.format(job.get('JOB_ID')))
+                else:
+                    finished.append('====\njobname parSpaceTest\njobnumber {0}\nfailed 0'
+                                    '\nexit_status 0\n'.format(job.get('JOB_ID')))
+            open('qstat.out', 'w').write('<job_info>' + ''.join(queued) + '</job_info>')
+            open('qacct.out', 'a').write(''.join(finished))
+        
+        self.assertEqual(len(submitted_combinations()), 9)
+        # one job crashed, one didn't write its output file and one is still running
+        # though its files already exist
+        run_jobs(crashed = [('1.0', '2.0')], running = [('5.5', '6.0')],
+                 missing = [('10.0', '6.0')])
+        
+        # only the combinations left are submitted when the sweep grows, and the job
+        # still running is kept
+        gridJob.parameters['Amp'] = [2.0, 5.0, 6.0, 7.0]
+        self.assertEqual(submitted_combinations(), [(1.0, 2.0), (1.0, 7.0), (5.5, 6.0),
+                                                (5.5, 7.0), (10.0, 6.0), (10.0, 7.0)])
+        self.assertEqual(len(CompletionCache('parSpaceTest.' + 
+                                             completion_file_extension)), 7)
+        
+        # the runs submitted with a different script aren't completed, even if they 
+        # are scanned after the script changed
+        run_jobs()
+        gridJob.sim.args.code += '\necho changed'
+        self.assertEqual(len(submitted_combinations()), 12)
+        self.assertEqual(len(CompletionCache('parSpaceTest.' + 
+                                             completion_file_extension)), 12)
+        run_jobs()
+        with mock.patch('sys.stdout', new_callable = StringIO.StringIO) as output:
+            self.assertEqual(submitted_combinations(), [])
+        self.assertEqual(output.getvalue(), 'parSpaceTest: skipped 12 of 12 '
+                         'combinations already completed or in the queue, submitting 0\n')
+        self.assertEqual(len(submitted_combinations(force = True)), 12)
+        
+        # every combination is submitted again if the scheduler can't be asked
+        run_jobs()
+        gridJob.scheduler = SchedulerState(qstat = os.path.abspath('no_qstat'), 
+                                           qacct = os.path.abspath('no_qacct'))
+        with mock.patch('sys.stdout', new_callable = StringIO.StringIO) as output:
+            self.assertEqual(len(submitted_combinations()), 12)
+        assert output.getvalue().startswith('parSpaceTest: submitting every combination')
+        assert 'no_qstat' in output.getvalue()
+
+    def test_completion_cache_sweep_values(self):
+        # the runs of values with more digits than str writes are recognised whatever
+        # the way they were submitted and whether the space was constrained or not
+        sim_element = find_sim_element(self.root,'constraintTest')
+        gridJob = pyGRID(sim_element, self.parent_map)
+        gridJob.array = None
+        gridJob.parameters['omega'] = ParamParser().parse('1:4:2')
+        gridJob.outputs = ['$JOB_NAME.$PAR_omega.$PAR_Amp.dat']
+        self.stream_dir = tempfile.mkdtemp()
+        os.chdir(self.stream_dir)
+        gridJob.scheduler = self.write_fake_scheduler('<job_info/>', '')
+
+        def submit(**kwargs):
+            gridJob.scheduler.invalidate()
+            with mock.patch.object(pyGRID, '_qsub',
+                                   side_effect = lambda e: self.job_id_side_effect()), \
+                 mock.patch('sys.stdout', new_callable = StringIO.StringIO) as output:
+                gridJob.submit(**kwargs)
+            return output.getvalue()
+
+        def run_jobs():
+            finished = []
+            for job in ET.parse(gridJob.auxilliaryFilename).getroot():
+                for index, output, error in gridJob._stream_files(job.attrib):
+                    for filename in [output, error]:
+                        open(filename, 'w').write('This is fine')
+                    finished.append('====\njobname constraintTest\njobnumber {0}\n'
+                                    'taskid {1}\nfailed 0\nexit_status 0\n'.format(
+                                            job.get('JOB_ID'), index or 'undefined'))
+                items = job.get(aux_file_kw['items']) or job.get(aux_file_kw['array'])
+                for item in parse_array_notation(items) if items else [None]:
+                    values = dict(gridJob._task_run(job, item)[0])
+                    open('constraintTest.{omega}.{Amp}.dat'.format(**values), 'w').close()
+            open('qacct.out', 'a').write(''.join(finished))
+
+        single, array_sweep, bundle = dict(), dict(array_sweep = True), dict(bundle = 5)
+        for first, second in [(single, array_sweep), (array_sweep, bundle), 
+                              (bundle, single)]:
+            # a new script so that the runs of the previous modes aren't completed
+            gridJob.sim.args.code += '\necho {0} {1}'.format(first, second)
+            gridJob.constraints = []
+            self.assertEqual(submit(**first), '')
+            run_jobs()
+            gridJob.constraints = ['omega < Amp']
+            self.assertEqual(submit(**second), 'constraintTest: skipped 11 of 11 '
+                    'combinations already completed or in the queue, submitting 0\n')
+        assert os.path.exists('constraintTest.1.3333333333333333.5.0.dat')
+
+    def test_decode_array_sweep_task(self):
+        par_values = [['2.0', '5.0', '6.0'], ['1.0', '5.5', '10.0']]
+        self.assertEqual(decode_array_sweep_task(1, par_values), (('2.0', '1.0'), None))
+        self.assertEqual(decode_array_sweep_task(2, par_values), (('2.0', '5.5'), None))
+        self.assertEqual(decode_array_sweep_task(9, par_values), (('6.0', '10.0'), None))
+        self.assertEqual(decode_array_sweep_task('1', par_values, '5-9:2'),
+                                                            (('2.0', '1.0'), 5))
+        self.assertEqual(decode_array_sweep_task('3', par_values, '5-9:2'),
+                                                            (('2.0', '1.0'), 9))
+        self.assertEqual(decode_array_sweep_task('4', par_values, '5-9:2'),
+                                                            (('2.0', '5.5'), 5))
+        
     @mock.patch('subprocess.Popen')
     def test_post_processing(self,fake_popen):
         fake_popen().stdout.read.side_effect = self.job_id_side_effect
@@ -271,11 +1432,14 @@ class TestPyGRID(unittest.TestCase):
         
         assert hasattr(gridJob,'post_proc')
         
-        with mock.patch('__builtin__.open', mock.mock_open(), create=True) as fake_file:
+        with mock.patch('__builtin__.open', mock.mock_open(), create=True) as fake_file, \
+             mock.patch('os.rename'):
             gridJob.submit()
             
             post_proc_call = fake_popen.call_args_list[-1]
-            assert post_proc_call[0][0] == 'qsub -terse postProcJob.sh'
+            assert re.match("qsub -terse -o '.*' -e '.*' " +
+                            script_pattern.format('postProcJob', script_hash_length),
+                            post_proc_call[0][0])
             assert post_proc_call[1]['shell'] == True
             assert post_proc_call[1]['stdout'] == subprocess.PIPE
             assert post_proc_call[1]['stderr'] == subprocess.STDOUT            
@@ -284,6 +1448,18 @@ class TestPyGRID(unittest.TestCase):
             
             bash_code = handle.write.call_args_list[-3][0][0]
             assert '#$ -hold_jid 1,2,3,4,5,6,7,8,9' in bash_code
+        
+        # the post processing job is submitted again when every run had completed
+        calls = fake_popen.call_count
+        with mock.patch('__builtin__.open', mock.mock_open(), create=True), \
+             mock.patch('os.rename'), \
+             mock.patch.object(pyGRID, '_pending_combinations', 
+                               side_effect = lambda params, *args: (params, [])):
+            gridJob.submit()
+        self.assertEqual(fake_popen.call_count, calls + 1)
+        assert re.search(script_pattern.format('postProcJob', script_hash_length),
+                                                        fake_popen.call_args[0][0])
+        assert not hasattr(gridJob.post_proc.sim.args, 'hold_jid')
 
 if __name__ == '__main__':
     unittest.main()
\ No newline at end of file
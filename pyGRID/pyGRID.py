@@ -7,23 +7,47 @@ Created on Fri Aug 23 19:45:20 2013
 """
 
 import argparse
+import bisect
+import copy
+import cPickle as pickle
+import getpass
+import hashlib
+import heapq
 import itertools
+import os
+import pipes
 import subprocess
 import re
+import sqlite3
 import sys
+import threading
+import time
 import xml.etree.ElementTree as ET
+try:
+    # the C implementation parses the definition files much faster
+    import xml.etree.cElementTree as cET
+except ImportError:
+    cET = ET
+from multiprocessing.pool import ThreadPool
+import numpy
 from numpy import linspace
-from xml.dom import minidom
 from pyqsub import qsubOptions
+from pyprofiler import profiler
 
 # global dictionary to map the syntax of the xml to the internal representation
 # This is useful in the case we want to change the syntax of the pyGRID
 # input/output files.
 grid_file_kw = dict(parameter = 'parameter',
                 parameters = 'parameters',
+                group = 'group',
                 par_name = 'name',
                 par_inherit = 'inherit',
                 code = 'code',
+                outputs = 'outputs',
+                constraint = 'constraint',
+                sampling = 'sampling',
+                samples = 'samples',
+                seed = 'seed',
                 root_element = 'simulations',
                 sim_element = 'sim_element',
                 sim_name = 'N',
@@ -34,16 +58,69 @@ aux_file_kw = dict(root = 'jobs',
                     name = 'JOB_NAME',
                     id = 'JOB_ID',
                     array = 'array',
+                    tasks = 'tasks',
+                    groups = 'groups',
+                    remap = 'remap',
+                    bundle = 'bundle',
+                    items = 'items',
+                    parallel = 'parallel',
+                    retries = 'retries',
+                    script = 'script',
+                    parameter = 'parameter',
+                    par_name = 'name',
                     crashes = 'crashes')
 
+scan_file_kw = dict(root = 'streams',
+                    stream = 'stream',
+                    name = 'name',
+                    size = 'size',
+                    mtime = 'mtime',
+                    offset = 'offset',
+                    crashed = 'crashed')
+
 filename_prefixes = dict(parameters = 'PAR')
 
+# states of the tasks of a job reported by SchedulerState
+task_states = dict(pending = 'pending',
+                   running = 'running',
+                   error = 'error',
+                   finished = 'finished',
+                   failed = 'failed',
+                   unknown = 'unknown')
+# the states of the tasks waiting or running in the queue. The tasks in error, Eqw, stay
+# in the queue until they are deleted but never run, so they crashed
+queued_states = [task_states['pending'], task_states['running']]
+crashed_states = [task_states['failed'], task_states['error']]
+
+# header of the xml files written by pyGRID
+xml_header = '<?xml version="1.0" ?>\n'
+
 # extensions for the bash and auxiliary files written by pyGRID
 bash_file_extension = 'sh'                 
+# the number of hexadecimal digits of the hash naming the scripts submitted
+script_hash_length = 12
 auxilliary_file_extension = 'grid'
+scan_file_extension = 'scan'
+completion_file_extension = 'done'
+
+# the regular expressions matching the values of the variables of the filename templates
+# when mapping a filename back to them. The other variables match any text
+template_variable_patterns = dict(JOB_ID = r'\d+', TASK_ID = r'\d+')
+# the pseudo environment variables SGE expands in the paths of the stream files
+template_known_variables = ['HOME', 'USER', 'JOB_ID', 'JOB_NAME', 'HOSTNAME', 'TASK_ID']
+# the FilenameTemplate objects compiled, keyed by their string template and known names
+compiled_templates = dict()
+
+# the directory holding the simulations compiled from the xml files, and the version of
+# its format. The cached simulations are rebuilt when the version changes
+definition_cache_dir = os.path.join(os.environ.get('XDG_CACHE_HOME', 
+                                    os.path.join(os.path.expanduser('~'), '.cache')), 
+                                    'pyGRID')
+definition_cache_version = 6
 
 # This string, to be added to the bash files written by pyGRID, is a bash trap function
-# that detects errors in the execution of the files.
+# that detects errors in the execution of the files. In a bundle of tasks (see 
+# bundle_bash_code) the identifier is followed by the TASK_ID of the task that crashed.
 pyGRID_error_identifier = "pyGRID ERROR!"
 error_handling_bash_code = '\n'\
 'function error_trap_handler()\n' \
@@ -51,12 +128,121 @@ error_handling_bash_code = '\n'\
 '        MYSELF="$0"              # equals to my script name\n' \
 '        LASTLINE="$1"            # argument 1: last line of error occurence\n' \
 '        LASTERR="$2"             # argument 2: error code of last command\n' \
-'        echo "{0}"\n' \
+'        echo "{0}${{pyGRID_item:+ task ${{pyGRID_item}}}}"\n' \
 '        echo "${{MYSELF}}: line ${{LASTLINE}}: exit status of last command: ${{LASTERR}}"\n' \
 '}}\n' \
 '\n' \
 'trap \'error_trap_handler ${{LINENO}} $?\' ERR\n'.format(pyGRID_error_identifier)
 
+# the error identifier printed by a task of a bundle, holding its TASK_ID
+bundle_error_regex = re.compile(re.escape(pyGRID_error_identifier) + r' task (\d+)')
+
+# size in bytes of the blocks read from the stream files when searching for errors
+scan_chunk_size = 1 << 16
+
+# number of stream files handed to a thread at a time when scanning for crashed jobs
+scan_batch_size = 64
+
+# number of jobs prepared for every qsub process when submitting jobs concurrently
+submission_batch_size = 64
+
+# number of seconds the state of the jobs read from the scheduler is reused
+scheduler_state_ttl = 30
+
+# default number of seconds between two polls of the supervisor, number of times the 
+# crashed tasks of a job are resubmitted and seconds a job resubmitted once waits before
+# being resubmitted again (see pyGRID.supervise)
+supervisor_poll_interval = 60
+supervisor_max_retries = 3
+supervisor_backoff = 60
+
+# Bash code added to the script of an array sweep (see pyGRID.submit). Every task of the
+# array job decodes the values of its parameters from SGE_TASK_ID with a mixed radix
+# decomposition, the last parameter being the fastest changing one as in
+# itertools.product. The task id of the original array job is restored in SGE_TASK_ID.
+array_sweep_header_bash_code = '\n'\
+'# Code inserted by pyGRID to decode the parameters of the task from SGE_TASK_ID\n' \
+'pyGRID_index=$((SGE_TASK_ID - 1))\n'
+array_sweep_task_bash_code = '' \
+'SGE_TASK_ID=$(({0} + (pyGRID_index % {1}) * {2}))\n' \
+'pyGRID_index=$((pyGRID_index / {1}))\n'
+array_sweep_no_task_bash_code = 'SGE_TASK_ID=undefined\n'
+array_sweep_parameter_bash_code = '' \
+'pyGRID_values=({0})\n' \
+'export {1}=${{pyGRID_values[$((pyGRID_index % {2}))]}}\n'
+array_sweep_group_bash_code = 'pyGRID_index=$((pyGRID_index / {0}))\n'
+
+# the methods sampling the parameter space instead of taking every combination, see
+# sample_parameter_space
+sampling_methods = ['random', 'lhs', 'sobol']
+
+# The direction numbers of the Sobol sequence from S. Joe and F. Y. Kuo, "Constructing
+# Sobol sequences with better two-dimensional projections", SIAM J. Sci. Comput. 30,
+# 2635 (2008), for the dimensions after the first one: the degree s and the
+# coefficients a of the primitive polynomial and the initial direction numbers m.
+sobol_direction_numbers = [
+    (1, 0, [1]), (2, 1, [1, 3]), (3, 1, [1, 3, 1]), (3, 2, [1, 1, 1]),
+    (4, 1, [1, 1, 3, 3]), (4, 4, [1, 3, 5, 13]), (5, 2, [1, 1, 5, 5, 17]),
+    (5, 4, [1, 1, 5, 5, 5]), (5, 7, [1, 1, 7, 11, 19]), (5, 11, [1, 1, 5, 1, 1]),
+    (5, 13, [1, 1, 1, 3, 11]), (5, 14, [1, 3, 5, 5, 31]),
+    (6, 1, [1, 3, 3, 9, 7, 49]), (6, 13, [1, 1, 1, 15, 21, 21]),
+    (6, 16, [1, 3, 1, 13, 27, 49]), (6, 19, [1, 1, 1, 15, 7, 5]),
+    (6, 22, [1, 3, 1, 15, 13, 25]), (6, 25, [1, 1, 5, 5, 19, 61]),
+    (7, 1, [1, 3, 7, 11, 23, 15, 103]), (7, 4, [1, 3, 7, 13, 13, 15, 69])]
+# the number of bits of the points of the Sobol sequence
+sobol_bits = 30
+
+# the numpy functions and constants the constraints on the parameters can use
+constraint_functions = dict((name, getattr(numpy, name)) for name in ['abs', 'sqrt', 
+        'exp', 'log', 'log10', 'sin', 'cos', 'tan', 'arctan2', 'floor', 'ceil', 'round',
+        'minimum', 'maximum', 'mod', 'where', 'isclose', 'logical_and', 'logical_or',
+        'logical_not', 'logical_xor', 'pi', 'e'])
+
+# Bash code wrapping the script of an array job whose tasks each run a bundle of tasks,
+# see bundle_bash_code. The tasks of a bundle run one after the other, or at the same
+# time on the NSLOTS slots of the task, in a subshell each so they don't share any 
+# state, and the TASK_ID of every one is set in SGE_TASK_ID.
+bundle_function_bash_code = '\n'\
+'# Code inserted by pyGRID to run {0} tasks in every task of the array job\n' \
+'pyGRID_run_item()\n' \
+'(\n' \
+'pyGRID_item=$1\n' \
+'SGE_TASK_ID=$1\n'
+bundle_loop_bash_code = ')\n' \
+'\n' \
+'pyGRID_position=$(((SGE_TASK_ID - 1) * {0}))\n' \
+'pyGRID_last=$((pyGRID_position + {0} < {1} ? pyGRID_position + {0} : {1}))\n' \
+'pyGRID_running=0\n' \
+'while [ $pyGRID_position -lt $pyGRID_last ]; do\n' \
+'{4}' \
+'    pyGRID_position=$((pyGRID_position + 1))\n' \
+'done\n' \
+'wait\n'
+bundle_sequential_bash_code = \
+'    pyGRID_run_item $(({2} + pyGRID_position * {3}))\n'
+bundle_parallel_bash_code = \
+'    pyGRID_run_item $(({2} + pyGRID_position * {3})) &\n' \
+'    pyGRID_running=$((pyGRID_running + 1))\n' \
+'    if [ $pyGRID_running -ge ${{NSLOTS:-1}} ]; then\n' \
+'        wait\n' \
+'        pyGRID_running=0\n' \
+'    fi\n'
+
+# Bash code added to the script of an array job resubmitting tasks whose TASK_IDs can't
+# be expressed with the qsub notation. The TASK_IDs of the original tasks are given as
+# runs first:count:step (see TaskSet) and restored in SGE_TASK_ID.
+task_remap_bash_code = '\n'\
+'# Code inserted by pyGRID to map SGE_TASK_ID to the TASK_ID of the task resubmitted\n' \
+'pyGRID_index=$((SGE_TASK_ID - 1))\n' \
+'for pyGRID_run in {0}; do\n' \
+'    pyGRID_run=(${{pyGRID_run//:/ }})\n' \
+'    if [ $pyGRID_index -lt ${{pyGRID_run[1]}} ]; then\n' \
+'        SGE_TASK_ID=$((pyGRID_run[0] + pyGRID_index * pyGRID_run[2]))\n' \
+'        break\n' \
+'    fi\n' \
+'    pyGRID_index=$((pyGRID_index - pyGRID_run[1]))\n' \
+'done\n'
+
 
 def find_sim_element(root,sim_name):
     """
@@ -81,6 +267,98 @@ def find_sim_element(root,sim_name):
                 return sim_element
         return None
 
+def iter_sim_elements(filename):
+    """
+    Generate the simulation elements of an xml file, in the order they appear in the
+    file, with a streaming parse. Every element is released once the next one is
+    parsed, so the memory used doesn't depend on the size of the file. Yield tuples
+    holding the root element, without children, and the simulation element.
+
+    Arguments:
+    filename -- the name of the xml file
+    """
+    with open(filename, 'rb') as xml_file:
+        depth = 0
+        root = None
+        for event, element in cET.iterparse(xml_file, events = ('start', 'end')):
+            if event == 'start':
+                if depth == 0:
+                    root = element
+                depth += 1
+                continue
+            depth -= 1
+            if depth == 1:
+                if element.tag == grid_file_kw['sim_element']:
+                    yield root, element
+                del root[:]
+
+
+def load_sim_elements(filename, sim_names):
+    """
+    Return a root element holding only the simulation elements of an xml file with the
+    given names and the ones they inherit from or post process with, however deep the
+    chain, in the order they appear in the file. The file is parsed with a streaming
+    parse up to the point where all the elements needed have been seen, and parsed a
+    second time up to the last element missing only if some of the elements needed
+    appear before the ones depending on them. The names the file doesn't define are
+    ignored.
+
+    Arguments:
+    filename -- the name of the xml file
+    sim_names -- a list with the names of the simulations
+    """
+    dependency_attributes = [grid_file_kw['par_inherit'], grid_file_kw['post_proc']]
+    # the simulations every simulation depends on, for the first element of every name
+    dependencies = dict()
+    positions = dict()
+    kept = dict()
+    
+    def required_names():
+        # the names needed, and whether they have all been seen
+        required = set()
+        stack = list(sim_names)
+        while stack:
+            name = stack.pop()
+            if name not in required:
+                required.add(name)
+                stack.extend(dependencies.get(name, []))
+        return required, all(name in dependencies for name in required)
+    
+    root_tag, root_attributes = grid_file_kw['root_element'], dict()
+    required, complete = required_names()
+    for position, (root, sim_element) in enumerate(iter_sim_elements(filename)):
+        root_tag, root_attributes = root.tag, dict(root.items())
+        name = sim_element.get(grid_file_kw['sim_name'])
+        if name in dependencies:
+            continue
+        dependencies[name] = [sim_element.get(a) for a in dependency_attributes
+                                                        if sim_element.get(a) is not None]
+        positions[name] = position
+        if name in required:
+            kept[name] = sim_element
+            required, complete = required_names()
+            if complete:
+                # the rest of the file isn't needed
+                break
+    
+    required = set(name for name in required if name in dependencies)
+    # the elements needed that were released before knowing it
+    missing = set(name for name in required if name not in kept)
+    if missing:
+        for root, sim_element in iter_sim_elements(filename):
+            name = sim_element.get(grid_file_kw['sim_name'])
+            if name in missing:
+                kept[name] = sim_element
+                missing.remove(name)
+                if not missing:
+                    break
+    
+    root = cET.Element(root_tag, root_attributes)
+    root.extend(sorted((kept[name] for name in required), 
+                       key = lambda e: positions[e.get(grid_file_kw['sim_name'])]))
+    return root
+
+
 def attributes_list(root,attr_name):
     """
     Compile a list with the values of an attribute for the nodes in the root tree. Returns
@@ -99,6 +377,48 @@ def attributes_list(root,attr_name):
     return values
 
 
+def xml_escape(data):
+    """
+    Escape the characters that can't appear in the text or in the attributes of an
+    xml element.
+
+    Arguments:
+    data -- the string to escape
+    """
+    return data.replace('&','&amp;').replace('<','&lt;').replace('"','&quot;')\
+                                                                .replace('>','&gt;')
+
+
+def pretty_xml(element, level = 0):
+    """
+    Return the string representing an xml element, indented with tabs at the given
+    level, in the same format of xml.dom.minidom pretty printing.
+
+    Arguments:
+    element -- An ElementTree.Element defining an xml tree.
+
+    Keyword arguments:
+    level -- the level of indentation of the element (default 0)
+    """
+    indent = '\t' * level
+    attributes = ''.join(' {0}="{1}"'.format(k, xml_escape(v)) 
+                                                for k, v in sorted(element.items()))
+    text = element.text.strip(' \n\t') if element.text else ''
+    children = list(element)
+    if not children and not text:
+        return '{0}<{1}{2}/>\n'.format(indent, element.tag, attributes)
+    if not children:
+        return '{0}<{1}{2}>{3}</{1}>\n'.format(indent, element.tag, attributes, 
+                                                                      xml_escape(text))
+    buf = ['{0}<{1}{2}>\n'.format(indent, element.tag, attributes)]
+    if text:
+        buf.append('{0}\t{1}\n'.format(indent, xml_escape(text)))
+    buf.extend(pretty_xml(child, level + 1) for child in children)
+    buf.append('{0}</{1}>\n'.format(indent, element.tag))
+    return ''.join(buf)
+
+
+@profiler.profiled('writeXMLFile')
 def writeXMLFile(element,filename):
     """
     Utility method that takes an xml element and write it to a file with pretty
@@ -108,499 +428,3688 @@ def writeXMLFile(element,filename):
     element -- An ElementTree.Element defining an xml tree.
     filename -- String representing the location and name of the file to write
     """
-    rough_string = ET.tostring(element, 'utf-8').replace('\n','').replace('\t','')
-    reparsed = minidom.parseString(rough_string)
     text_file = open(filename, "w")
-    text_file.write(reparsed.toprettyxml())
+    text_file.write(xml_header + pretty_xml(element))
     text_file.close()
 
 
-def parse_array_notation(array_string):
+def write_if_changed(filename, content):
     """
-    Parse a string defining an array of jobs and return an array of integers
-    containing the TASK_IDs of the jobs. For the notation of an array job see qsub 
-    man page.
+    Write a text file unless it already holds the given content. The file is written
+    to a temporary file first and then renamed so that a concurrent reader never sees
+    it partially written. Return True if the file was written.
 
     Arguments:
-    array_string -- The string defining the array job
+    filename -- the name of the file
+    content -- a string with the content of the file
     """
-    pieces = re.split("-|:",array_string)
-    if len(pieces) == 1:
-        return int(pieces[0])
-    if len(pieces) == 2:
-        return range(int(pieces[0]),int(pieces[1])+1)
-    if len(pieces) == 3:
-        return range(int(pieces[0]),int(pieces[1])+1,int(pieces[2]))
-    return []
+    try:
+        with open(filename) as text_file:
+            if text_file.read() == content:
+                return False
+    except IOError:
+        pass
+    temporary_filename = '{0}.{1}.{2}.tmp'.format(filename, os.getpid(),
+                                                  threading.current_thread().ident)
+    with open(temporary_filename, 'w') as text_file:
+        text_file.write(content)
+    os.rename(temporary_filename, filename)
+    return True
 
 
-def substitute_in_templates(template,substitution_dict):
+class DirectoryListing:
     """
-    Create a real filename by substituting the arguments in a template filename
-
-    Arguments:
-    filename_template -- The string template to generate the filename
-    substitution_dict -- a dictionary containing the keywords to substitute as keys and
-                         the values to substitute them with as values
+    Cache of the content of the directories holding the stream files of the jobs. Every
+    directory is listed only once so that checking whether a stream file exists doesn't 
+    require trying to open it. The cache can be shared between threads.
     """
-    for k,v in substitution_dict.iteritems(): 
-        template = template.replace(k,v)
-    return template
 
+    def __init__(self):
+        self.listings = dict()
+        self.lock = threading.Lock()
 
-def parse_parameters(par_element = None):
-    """
-    Parse the children of the parameter element and return a dictionary with the
-    parameter names as keys and list of parameter values as values
+    def exists(self, filename):
+        """
+        Return True if the file is in the listing of its directory.
 
-    Keyword arguments:
-    par_element -- An ElementTree.Element defining the parameters for
-                   the job (default None). If None is passed returns an 
-                   empty dictionary
-    """
-    parameters = dict()
-    param_parser = ParamParser()
-    
-    if par_element is None:
-        return parameters
-        
-    for parameter in par_element.findall(grid_file_kw['parameter']):
-        par_name = parameter.get(grid_file_kw['par_name'])
-        par_value = parameter.text.strip(' \n\t')
-        parameters[par_name] = param_parser.parse(par_value)
-    return parameters
+        Arguments:
+        filename -- the name of the file
+        """
+        directory, name = os.path.split(filename)
+        directory = directory or os.curdir
+        with self.lock:
+            if directory not in self.listings:
+                try:
+                    self.listings[directory] = set(os.listdir(directory))
+                except OSError:
+                    self.listings[directory] = set()
+        return name in self.listings[directory]
 
 
-class ParamParser:
+class ScanCheckpoints:
     """
-    Class to parse the values assigned to a parameter.
+    Record of the size, modification time, number of bytes searched and verdict for 
+    every stream file scanned for errors. Stream files that didn't change since the last
+    scan are not read again and only the bytes appended to the ones that grew are
+    searched. Only the stream files searched since the record was last saved are saved,
+    so the ones of jobs replaced or cleared are forgotten. The record can be shared 
+    between threads.
     """
-    
-    def __init__(self):
-        self.scanner = re.Scanner([
-            (r"[0-9.eE+-]+", lambda scanner,token:("NUMBER", token)),
-            (r"[a-z_]+",     lambda scanner,token:("IDENTIFIER", token)),
-            (r"[:]",        lambda scanner,token:("COLON")),
-            (r"[,]",        lambda scanner,token:("COMMA")),
-            (r"\s+",         None), # None == skip token.
-        ])
-    
-    def _tokenize(self,string):
+
+    def __init__(self, filename = None):
         """
-        Tokenize a string using re.Scanner and return a list containing the token in the
-        form tuple for numbers and identifiers and strings for commas and colons
-        
-        Arguments:
-        string -- the string to tokenize
+        Load the checkpoints from a file written by save, if it exists.
+
+        Keyword arguments:
+        filename -- the name of the file holding the checkpoints (default None)
         """
-        return self.scanner.scan(string)
-    
-    def _process_interval(self):
+        self.checkpoints = dict()
+        # the stream files searched since the checkpoints were last saved
+        self.searched = set()
+        self.lock = threading.Lock()
+        if filename is None or not os.path.exists(filename):
+            return
+        for stream in ET.parse(filename).getroot().findall(scan_file_kw['stream']):
+            self.checkpoints[stream.get(scan_file_kw['name'])] = (
+                                        int(stream.get(scan_file_kw['size'])),
+                                        float(stream.get(scan_file_kw['mtime'])),
+                                        int(stream.get(scan_file_kw['offset'])),
+                                        stream.get(scan_file_kw['crashed']) == '1')
+
+    @profiler.profiled('ScanCheckpoints.search')
+    def search(self, filename, tail_size = None):
         """
-        Creates a list of values from the entries in the interval stack. It appends the
-        new_values to the values stack and empty the interval stack.
+        Search a stream file for the pyGRID error identifier, reading only the bytes
+        that weren't searched yet, and return True if it's found. Raise IOError if the
+        file doesn't exist.
+
+        Arguments:
+        filename -- the name of the stream file
+
+        Keyword arguments:
+        tail_size -- if not None only the last tail_size bytes of the file are searched
+                     (default None)
         """
-        startValue = self.interval[0]
-        stopValue = self.interval[-1]
+        try:
+            status = os.stat(filename)
+        except OSError:
+            raise IOError(filename)
         
-        samples = 10
-        if len(self.interval) == 3:
-            samples = self.interval[1]                
+        size, mtime, offset, crashed = self.checkpoints.get(filename, (0, None, 0, False))
+        if status.st_size < offset or (status.st_size == size and 
+                                                        status.st_mtime != mtime):
+            # the file has been rewritten
+            offset, crashed = 0, False
         
-        new_values = linspace(startValue, stopValue, samples)
-        self.values.extend(new_values)
-        self.interval = []
-    
-    def _print_state(self, current_token):
-        """
-        Utility method to output the current state of the parser.
-        """
-        print "t "+str(current_token)+"\tPV "+str(self.prev_token)+"\tI "+str(self.interval)+"\tV "+str(self.values)
+        if not crashed and (status.st_size != size or status.st_mtime != mtime):
+            # search the appended bytes together with the end of the ones already
+            # searched in case an identifier spans both
+            start = max(0, offset - len(pyGRID_error_identifier) + 1)
+            crashed = search_file_for_error(filename, tail_size = tail_size, 
+                                                                        start = start)
         
-    def parse(self,string):
+        with self.lock:
+            self.checkpoints[filename] = (status.st_size, status.st_mtime, 
+                                                            status.st_size, crashed)
+            self.searched.add(filename)
+        return crashed
+
+    @profiler.profiled('ScanCheckpoints.save')
+    def save(self, filename):
         """
-        Parse a string representing the values of a parameter and returns them in a list.
+        Write the checkpoints of the stream files searched since the last save to a
+        file and forget the other ones.
+
+        Arguments:
+        filename -- the name of the file to write
         """
-        self.values = []
-        self.interval = []
-        self.prev_token = None        
-        
-        tokens, remainder = self._tokenize(string)
-        for t in tokens:
-            
-            if t is 'COLON':        
-                if isinstance(self.prev_token, tuple) and self.prev_token[0] is 'NUMBER':
-                    self.interval.append(float(self.prev_token[1]))
-                    self.prev_token = t
-                    continue
-                
-                raise InvalidParamStringError(string)
-                
-            elif isinstance(t, tuple):
-                if t[0] is 'NUMBER':
-                    if isinstance(self.prev_token, tuple) and self.prev_token[0] is 'NUMBER':
-                        if len(self.interval) == 0:
-                            self.values.append(float(self.prev_token[1]))
-                        else:
-                            self.interval.append(float(self.prev_token[1]))
-                            self._process_interval()
-                            
-                    self.prev_token = t
-        
-        if len(self.interval) != 0:
-            self.interval.append(float(self.prev_token[1]))
-            self._process_interval()
-            self.prev_token = None
-            
-        if isinstance(self.prev_token, tuple) and self.prev_token[0] is 'NUMBER':
-            self.values.append(float(self.prev_token[1]))
-            self.prev_token = None
-            
-        return self.values
-            
+        with self.lock:
+            self.checkpoints = dict((name, self.checkpoints[name]) 
+                                                            for name in self.searched)
+            self.searched = set()
+        root = ET.Element(scan_file_kw['root'])
+        for name, (size, mtime, offset, crashed) in sorted(self.checkpoints.items()):
+            stream = ET.SubElement(root, scan_file_kw['stream'])
+            stream.set(scan_file_kw['name'], name)
+            stream.set(scan_file_kw['size'], str(size))
+            stream.set(scan_file_kw['mtime'], repr(mtime))
+            stream.set(scan_file_kw['offset'], str(offset))
+            stream.set(scan_file_kw['crashed'], '1' if crashed else '0')
+        writeXMLFile(root, filename)
 
-class InvalidNameError(Exception):
-    def __str__(self):
-        return "The simulation element representing the job must have a name."
-    
 
-class InvalidSimulatioNameError(Exception):
-    def __init__(self, sim_name):
-        self.sim_name = sim_name
-    def __str__(self):
-        return "The file defines no job named {0}".format(self.sim_name)
+def parameter_value_string(value):
+    """
+    Return the string a value of a parameter is written as, whether it's passed to a
+    job, written in the auxiliary file or hashed in a completion key. Numpy numbers
+    are written as the python ones and floats with all their digits, so a value is 
+    written the same way however the combinations of the parameters are generated.
 
+    Arguments:
+    value -- the value of the parameter
+    """
+    if isinstance(value, numpy.generic):
+        value = value.item()
+    if isinstance(value, float):
+        return repr(value)
+    return str(value)
 
-class InvalidParamStringError(Exception):
-    def __init__(self, par_string):
-        self.par_string = par_string
-    def __str__(self):
-        return "The parameter string {0} has invalid formatting".format(self.par_string)
 
+def completion_key(script_hash, outputs, parameter_list, task_id = None):
+    """
+    Return the hash identifying a run of a simulation: a task, or a job if it isn't an
+    array job, with given values of the parameters. It doesn't depend on the order of
+    the parameters nor on the JOB_ID, so a run keeps its key when the sweep changes.
+
+    Arguments:
+    script_hash -- the hash of the bash script of the simulation the run ran, see
+                   pyGRID._script_hash
+    outputs -- a list with the templates of the files the simulation writes
+    parameter_list -- a list of pairs defining the name of the parameter and its value
 
-class pyGRID:
+    Keyword arguments:
+    task_id -- the TASK_ID of the task, None if the job isn't an array job 
+               (default None)
     """
-    Main class. It represents a job to submit to the cluster through qsub.
+    digest = hashlib.sha1(script_hash)
+    digest.update('\0'.join([''] + list(outputs) + ['']))
+    for name, value in sorted((str(n), parameter_value_string(v)) 
+                                                            for n, v in parameter_list):
+        digest.update('\0{0}={1}'.format(name, value))
+    digest.update('\0\0{0}'.format(task_id))
+    return digest.hexdigest()
+
+
+class CompletionCache:
     """
-    
-    def __init__(self, sim_element=None, parent_map=None):
+    Record of the keys of the runs of a simulation that completed without errors, see
+    completion_key, so that submitting a sweep again skips them. The keys are written
+    one per line so that the record of a large sweep loads quickly.
+    """
+
+    def __init__(self, filename = None):
         """
-        Initialise a pyGRID object from a simulation element and a map 
-        of parents for every node in the xml tree.
+        Load the keys from a file written by save, if it exists.
 
         Keyword arguments:
-        sim_element -- An ElementTree.Element defining the parameters for
-                       the job (default None). If None is passed the
-                       object is initialised with an empty qsubOptions object and an
-                       empty dictionary for the parameters list
-        parent_map -- A dictionary containing a list of nodes as keys and their parents
-                      as values (default None). If None is passed the inherit attribute
-                      of the simulation element is ignored.
+        filename -- the name of the file holding the keys (default None)
         """
-        self.sim = qsubOptions()
-        self.parameters = dict()
-        self.output_filename_template = "$JOB_NAME.o$JOB_ID.$TASK_ID"
-        self.error_filename_template = "$JOB_NAME.e$JOB_ID.$TASK_ID"
-        
-        if sim_element is None:
+        self.keys = set()
+        if filename is None or not os.path.exists(filename):
             return
-        
-        # parse the element
-        self._parse_element(sim_element,parent_map)
-        
-    def __str__(self):
-        return '{0}\nParameters: {1}'.format(str(self.sim.args), str(self.parameters))
+        with open(filename) as completion_file:
+            self.keys.update(line.strip() for line in completion_file if line.strip())
 
-    def _parse_element(self, sim_element=None, parent_map=None):
+    def __contains__(self, key):
+        return key in self.keys
+
+    def __len__(self):
+        return len(self.keys)
+
+    def add(self, key):
         """
-        Parse the children of the simulation element and insert them as arguments
-        of the cluster job.
+        Record a run that completed.
+        """
+        self.keys.add(key)
 
-        Keyword arguments:
-        sim_element -- An ElementTree.Element defining the parameters for
-                       the job (default None).
-        parent_map -- a dictionary containing a list of the elements in an XML tree as
-                      as keys and their parent node as values
+    def discard(self, key):
         """
-        if sim_element is None:
+        Forget a run, if it was recorded.
+        """
+        self.keys.discard(key)
+
+    @profiler.profiled('CompletionCache.save')
+    def save(self, filename):
+        """
+        Write the keys to a file. The file is left untouched if it is up to date, and 
+        isn't created if there are no keys.
+
+        Arguments:
+        filename -- the name of the file to write
+        """
+        if not self.keys and not os.path.exists(filename):
             return
-        
-        # check if the simulation element inherits from another sim_element
-        inherit_from = sim_element.get(grid_file_kw['par_inherit'])
-        if inherit_from is not None and parent_map is not None:
-            # parse the options from the parent element first
-            
-            # simulation elements are always the children of the root element so we can
-            # use the parent map to retrieve the root
-            root_element = parent_map[sim_element]
-            parent_element = find_sim_element(root_element,inherit_from)
-            self._parse_element(parent_element,parent_map)
-        
-        # the name of the job is expressed as an attribute of the xml element so we deal
-        # with it differently 
-        job_name = sim_element.get(grid_file_kw['sim_name'])
-        if (job_name is None) or (len(job_name) == 0):
-            raise InvalidNameError
-        self.sim.parse_and_add('-N {0}'.format(job_name))
-        
-        self.bashFilename = self.sim.args.N + '.' + bash_file_extension
-        self.auxilliaryFilename = self.sim.args.N + '.' + auxilliary_file_extension
-        
-        # parse the parameters to pass to the job
-        par_element = sim_element.find(grid_file_kw['parameters'])
-        if par_element is not None:
-            self.parameters = parse_parameters(par_element)
-        
-        # parse the remaining qsub options
-        for child in sim_element:
-        
+        write_if_changed(filename, ''.join(key + '\n' for key in sorted(self.keys)))
+
+
+class GridFileWriter:
+    """
+    Writes the auxiliary file of a simulation one job element at a time so that the
+    elements of the jobs submitted don't have to be held in memory. The elements are 
+    buffered and written to the file in blocks.
+    """
+
+    def __init__(self, filename, buffer_size = 1000):
+        """
+        Open the auxiliary file for writing.
+
+        Arguments:
+        filename -- String representing the location and name of the file to write
+
+        Keyword arguments:
+        buffer_size -- the number of job elements to buffer before writing them to the
+                       file (default 1000)
+        """
+        self.file = open(filename, "w")
+        self.buffer_size = buffer_size
+        self.buffer = [xml_header, '<{0}>\n'.format(aux_file_kw['root'])]
+
+    def write(self, element):
+        """
+        Add a job element to the auxiliary file.
+
+        Arguments:
+        element -- An ElementTree.Element describing a job
+        """
+        self.buffer.append(pretty_xml(element, 1))
+        if len(self.buffer) >= self.buffer_size:
+            self.flush()
+
+    @profiler.profiled('GridFileWriter.flush')
+    def flush(self):
+        self.file.write(''.join(self.buffer))
+        self.buffer = []
+
+    @profiler.profiled('GridFileWriter.close')
+    def close(self):
+        self.buffer.append('</{0}>\n'.format(aux_file_kw['root']))
+        self.flush()
+        self.file.close()
+
+
+def parameter_values_equal(value, other):
+    """
+    Return True if two values of a parameter are equal, compared as numbers if they 
+    both are, so that 5 and 5.0 are equal, and as strings otherwise.
+
+    Arguments:
+    value -- the first value
+    other -- the second value
+    """
+    try:
+        return float(value) == float(other)
+    except (TypeError, ValueError):
+        return str(value) == str(other)
+
+
+def job_matches_parameters(job_element, parameters):
+    """
+    Return True if a job may run the given values of the parameters: the values of its
+    parameters are equal to them, see parameter_values_equal, or it's an array sweep
+    over the parameters, whose tasks are matched one by one when resubmitted.
+
+    Arguments:
+    job_element -- an ElementTree.Element describing the job
+    parameters -- a dictionary with the values of the parameters
+    """
+    swept = set(e.get(aux_file_kw['par_name']) 
+                                for e in job_element.findall(aux_file_kw['parameter']))
+    for name, value in parameters.items():
+        if name in swept:
+            continue
+        job_value = job_element.get(filename_prefixes['parameters'] + '_' + name)
+        if job_value is None or not parameter_values_equal(job_value, value):
+            return False
+    return True
+
+
+class XMLJobStore:
+    """
+    Job store keeping the jobs of a simulation in the auxiliary xml file written by
+    pyGRID. The jobs are represented by their ElementTree.Element objects, which are
+    also used as keys.
+    """
+    
+    extension = auxilliary_file_extension
+    
+    def __init__(self, filename):
+        """
+        Arguments:
+        filename -- the name of the auxiliary file
+        """
+        self.filename = filename
+        self.root = None
+        self.writer = None
+    
+    def _load(self):
+        if self.root is None:
+            self.root = ET.fromstring(open(self.filename,'r').read())
+        return self.root
+    
+    def clear(self):
+        """
+        Remove all the jobs from the store. The jobs added afterwards are written to the
+        file while they are added.
+        """
+        self.root = None
+        self.writer = GridFileWriter(self.filename)
+    
+    def add_job(self, job_element):
+        """
+        Add a job to the store.
+        
+        Arguments:
+        job_element -- an ElementTree.Element describing the job
+        """
+        if self.writer is not None:
+            self.writer.write(job_element)
+        else:
+            self._load().append(job_element)
+    
+    def jobs(self):
+        """
+        Return a list of pairs holding the key and the element of every job in the store.
+        """
+        return [(job, job) for job in self._load().findall(aux_file_kw['job'])]
+    
+    def crashed_jobs(self, parameters = None):
+        """
+        Return a list of pairs holding the key and the element of every crashed job in
+        the store.
+        
+        Keyword arguments:
+        parameters -- a dictionary with the values of the parameters the crashed jobs 
+                      must have, see job_matches_parameters (default None)
+        """
+        crashed = []
+        for key, job in self.jobs():
+            if job.find(aux_file_kw['crashes']) is None:
+                continue
+            if parameters and not job_matches_parameters(job, parameters):
+                continue
+            crashed.append((key, job))
+        return crashed
+    
+    def set_crashes(self, key, crash_indices):
+        """
+        Record the crashes of a job replacing the ones recorded before.
+        
+        Arguments:
+        key -- the key of the job
+        crash_indices -- None if the job didn't crash, otherwise a TaskSet with the 
+                         TASK_IDs of the tasks that crashed, empty if the job isn't an
+                         array job
+        """
+        for crashes_element in key.findall(aux_file_kw['crashes']):
+            key.remove(crashes_element)
+        if crash_indices is not None:
+            crashes_element = ET.SubElement(key, aux_file_kw['crashes'])
+            crash_indices = TaskSet(crash_indices)
+            if crash_indices:
+                crashes_element.text = str(crash_indices)
+    
+    def replace_job(self, key, job_elements):
+        """
+        Replace a job with the jobs resubmitted in its place.
+        
+        Arguments:
+        key -- the key of the job
+        job_elements -- a list of ElementTree.Element objects describing the new jobs
+        """
+        self._load().remove(key)
+        self.root.extend(job_elements)
+    
+    def save(self):
+        """
+        Write the changes to the file.
+        """
+        if self.writer is not None:
+            self.writer.close()
+            self.writer = None
+        elif self.root is not None:
+            writeXMLFile(self.root, self.filename)
+    
+    def close(self):
+        self.save()
+
+
+class SQLiteJobStore:
+    """
+    Job store keeping the jobs of a simulation in an indexed SQLite database. Crashes 
+    and resubmissions are recorded with targeted updates and the jobs replaced by a 
+    resubmission are kept as history. The keys of the jobs are the ids of their rows.
+    """
+    
+    extension = 'db'
+    
+    schema = """
+        CREATE TABLE IF NOT EXISTS jobs (
+            key INTEGER PRIMARY KEY,
+            active INTEGER NOT NULL DEFAULT 1,
+            resubmitted_from INTEGER);
+        CREATE TABLE IF NOT EXISTS attributes (
+            job INTEGER NOT NULL, 
+            name TEXT NOT NULL, 
+            value TEXT);
+        CREATE INDEX IF NOT EXISTS attributes_job ON attributes (job);
+        CREATE INDEX IF NOT EXISTS attributes_value ON attributes (name, value);
+        CREATE TABLE IF NOT EXISTS sweep_parameters (
+            job INTEGER NOT NULL, 
+            position INTEGER NOT NULL, 
+            name TEXT NOT NULL, 
+            vals TEXT NOT NULL);
+        CREATE INDEX IF NOT EXISTS sweep_parameters_job ON sweep_parameters (job);
+        CREATE TABLE IF NOT EXISTS crashes (
+            job INTEGER NOT NULL, 
+            first INTEGER,
+            last INTEGER,
+            step INTEGER);
+        CREATE INDEX IF NOT EXISTS crashes_job ON crashes (job);
+        """
+    
+    def __init__(self, filename):
+        """
+        Open the database, creating it if needed.
+        
+        Arguments:
+        filename -- the name of the database file
+        """
+        self.filename = filename
+        self.connection = sqlite3.connect(filename)
+        self.connection.executescript(self.schema)
+    
+    def clear(self):
+        """
+        Remove all the jobs, and their history, from the store.
+        """
+        for table in ['jobs', 'attributes', 'sweep_parameters', 'crashes']:
+            self.connection.execute('DELETE FROM {0}'.format(table))
+    
+    def add_job(self, job_element, resubmitted_from = None):
+        """
+        Add a job to the store and return its key.
+        
+        Arguments:
+        job_element -- an ElementTree.Element describing the job
+        
+        Keyword arguments:
+        resubmitted_from -- the key of the job this job has been resubmitted for 
+                            (default None)
+        """
+        cursor = self.connection.execute(
+                    'INSERT INTO jobs (resubmitted_from) VALUES (?)', (resubmitted_from,))
+        key = cursor.lastrowid
+        self.connection.executemany('INSERT INTO attributes VALUES (?, ?, ?)',
+                                        [(key, k, v) for k, v in job_element.items()])
+        self.connection.executemany('INSERT INTO sweep_parameters VALUES (?, ?, ?, ?)',
+                [(key, position, e.get(aux_file_kw['par_name']), e.text) for position, e
+                         in enumerate(job_element.findall(aux_file_kw['parameter']))])
+        crashes_element = job_element.find(aux_file_kw['crashes'])
+        if crashes_element is not None:
+            self.set_crashes(key, TaskSet.parse(crashes_element.text or ''))
+        return key
+    
+    def _elements(self, condition = 'jobs.active = 1', arguments = ()):
+        """
+        Build the ElementTree.Element objects of the jobs matching a condition on the
+        jobs table and return a list of pairs holding their keys and elements.
+        """
+        keys = [row[0] for row in self.connection.execute(
+                'SELECT key FROM jobs WHERE {0} ORDER BY key'.format(condition), arguments)]
+        elements = dict((key, ET.Element(aux_file_kw['job'])) for key in keys)
+        
+        query = 'SELECT {0} FROM {1} JOIN jobs ON jobs.key = {1}.job WHERE {2} ORDER BY '\
+                                                                        '{1}.job{3}'
+        for key, name, value in self.connection.execute(query.format(
+                'job, name, value', 'attributes', condition, ''), arguments):
+            elements[key].set(name, value)
+        for key, name, values in self.connection.execute(query.format(
+                'job, name, vals', 'sweep_parameters', condition, ', position'), arguments):
+            par_element = ET.SubElement(elements[key], aux_file_kw['parameter'])
+            par_element.set(aux_file_kw['par_name'], name)
+            par_element.text = values
+        rows = self.connection.execute(query.format('job, first, last, step', 'crashes',
+                                                    condition, ', first'), arguments)
+        for key, runs in itertools.groupby(rows, lambda row: row[0]):
+            crashes_element = ET.SubElement(elements[key], aux_file_kw['crashes'])
+            tasks = TaskSet._from_runs(run[1:] for run in runs if run[1] is not None)
+            if tasks:
+                crashes_element.text = str(tasks)
+        
+        return [(key, elements[key]) for key in keys]
+    
+    def jobs(self):
+        """
+        Return a list of pairs holding the key and the element of every job in the store.
+        """
+        return self._elements()
+    
+    def crashed_jobs(self, parameters = None):
+        """
+        Return a list of pairs holding the key and the element of every crashed job in
+        the store.
+        
+        Keyword arguments:
+        parameters -- a dictionary with the values of the parameters the crashed jobs 
+                      must have, see job_matches_parameters (default None)
+        """
+        condition = ['jobs.active = 1',
+                     'EXISTS (SELECT 1 FROM crashes c WHERE c.job = jobs.key)']
+        arguments = []
+        for name, value in (parameters or dict()).items():
+            # the values are compared as numbers too, then checked exactly below
+            try:
+                number = float(value)
+            except (TypeError, ValueError):
+                number = str(value)
+            condition.append('(EXISTS (SELECT 1 FROM attributes a WHERE a.job = jobs.key '
+                             'AND a.name = ? AND (a.value = ? OR CAST(a.value AS REAL) = ?))'
+                             ' OR EXISTS (SELECT 1 FROM sweep_parameters s '
+                             'WHERE s.job = jobs.key AND s.name = ?))')
+            arguments.extend([filename_prefixes['parameters'] + '_' + name, str(value),
+                              number, name])
+        crashed = self._elements(' AND '.join(condition), arguments)
+        if parameters:
+            crashed = [(key, job) for key, job in crashed 
+                                        if job_matches_parameters(job, parameters)]
+        return crashed
+    
+    def resubmissions(self, key):
+        """
+        Return a list of pairs holding the key and the element of every job resubmitted
+        in place of a job.
+        
+        Arguments:
+        key -- the key of the job
+        """
+        return self._elements('jobs.resubmitted_from = ?', (key,))
+    
+    def set_crashes(self, key, crash_indices):
+        """
+        Record the crashes of a job replacing the ones recorded before.
+        
+        Arguments:
+        key -- the key of the job
+        crash_indices -- None if the job didn't crash, otherwise a TaskSet with the 
+                         TASK_IDs of the tasks that crashed, empty if the job isn't an
+                         array job
+        """
+        self.connection.execute('DELETE FROM crashes WHERE job = ?', (key,))
+        if crash_indices is None:
+            return
+        runs = TaskSet(crash_indices).runs or [(None, None, None)]
+        self.connection.executemany('INSERT INTO crashes VALUES (?, ?, ?, ?)',
+                                                    [(key,) + run for run in runs])
+    
+    def replace_job(self, key, job_elements):
+        """
+        Replace a job with the jobs resubmitted in its place. The job is kept as history.
+        
+        Arguments:
+        key -- the key of the job
+        job_elements -- a list of ElementTree.Element objects describing the new jobs
+        """
+        self.connection.execute('UPDATE jobs SET active = 0 WHERE key = ?', (key,))
+        for job_element in job_elements:
+            self.add_job(job_element, resubmitted_from = key)
+    
+    def save(self):
+        """
+        Commit the changes to the database.
+        """
+        self.connection.commit()
+    
+    def close(self):
+        self.save()
+        self.connection.close()
+
+
+# job stores available to pyGRID
+job_stores = dict(xml = XMLJobStore, sqlite = SQLiteJobStore)
+
+
+def import_grid_file(filename, store):
+    """
+    Replace the jobs in a job store with the ones in an auxiliary xml file.
+    
+    Arguments:
+    filename -- the name of the auxiliary file
+    store -- the job store
+    """
+    store.clear()
+    for job_element in ET.parse(filename).getroot().findall(aux_file_kw['job']):
+        store.add_job(job_element)
+    store.save()
+
+
+def export_grid_file(store, filename):
+    """
+    Write the jobs in a job store to an auxiliary xml file.
+    
+    Arguments:
+    store -- the job store
+    filename -- the name of the auxiliary file
+    """
+    grid_file = GridFileWriter(filename)
+    try:
+        for key, job_element in store.jobs():
+            grid_file.write(job_element)
+    finally:
+        grid_file.close()
+
+
+class TaskSet:
+    """
+    Set of TASK_IDs stored as a sorted list of runs (first, last, step) of evenly 
+    spaced TASK_IDs whose spans don't overlap, so that the TASK_IDs of an array job are
+    never expanded. The string of a set is the qsub notation n[-m[:s]] of its runs 
+    separated by commas.
+    """
+
+    def __init__(self, task_ids = ()):
+        """
+        Keyword arguments:
+        task_ids -- an iterable of TASK_IDs or another TaskSet (default empty)
+        """
+        self.runs = []
+        if isinstance(task_ids, TaskSet):
+            self.runs = list(task_ids.runs)
+            return
+        for task_id in task_ids:
+            self.add(task_id)
+
+    @classmethod
+    def parse(cls, string):
+        """
+        Return the set of TASK_IDs defined by a string with the qsub notation of one or
+        more runs separated by commas or whitespace. A list of TASK_IDs separated by 
+        spaces, as pyGRID used to record crashes, is also accepted.
+
+        Arguments:
+        string -- the string defining the TASK_IDs
+        """
+        task_set = cls()
+        for piece in re.split(r'[,\s]+', string.strip()):
+            if not piece:
+                continue
+            match = re.match(r'^(\d+)(?:-(\d+)(?::(\d+))?)?$', piece)
+            if match is None:
+                raise InvalidArrayNotationError(string)
+            first = int(match.group(1))
+            last = int(match.group(2) or first)
+            step = int(match.group(3) or 1)
+            if last < first or step < 1:
+                raise InvalidArrayNotationError(string)
+            task_set._add_run(first, last, step)
+        return task_set
+
+    def _add_run(self, first, last, step):
+        """
+        Add a run of TASK_IDs to the set.
+        """
+        last = first + (last - first) // step * step
+        if first == last:
+            step = 1
+        if self.runs and first <= self.runs[-1][1]:
+            self.runs = (self | TaskSet._from_runs([(first, last, step)])).runs
+        else:
+            self._append_run(first, last, step)
+
+    def _append_run(self, first, last, step):
+        """
+        Append a normalised run of TASK_IDs following all the others, merging it with 
+        the last run when they are evenly spaced together.
+        """
+        if self.runs:
+            prev_first, prev_last, prev_step = self.runs[-1]
+            gap = first - prev_last
+            if prev_first == prev_last and (first == last or step == gap):
+                self.runs[-1] = (prev_first, last, gap)
+                return
+            if gap == prev_step and (first == last or step == prev_step):
+                self.runs[-1] = (prev_first, last, prev_step)
+                return
+        self.runs.append((first, last, step))
+
+    @classmethod
+    def _from_runs(cls, runs):
+        task_set = cls()
+        for run in runs:
+            task_set._append_run(*run)
+        return task_set
+
+    def add(self, task_id):
+        """
+        Add a TASK_ID to the set.
+        """
+        task_id = int(task_id)
+        self._add_run(task_id, task_id, 1)
+
+    def run_lengths(self):
+        """
+        Return a list of tuples (first, count, step) describing the runs of the set.
+        """
+        return [(first, (last - first) // step + 1, step) 
+                                                for first, last, step in self.runs]
+
+    def __len__(self):
+        return sum(count for first, count, step in self.run_lengths())
+
+    def __nonzero__(self):
+        return len(self.runs) > 0
+
+    def __iter__(self):
+        for first, last, step in self.runs:
+            for task_id in xrange(first, last + 1, step):
+                yield task_id
+
+    def __contains__(self, task_id):
+        position = bisect.bisect_right(self.runs, (task_id, float('inf'))) - 1
+        if position < 0:
+            return False
+        first, last, step = self.runs[position]
+        return task_id <= last and (task_id - first) % step == 0
+
+    def __getitem__(self, index):
+        if index < 0:
+            index += len(self)
+        if index >= 0:
+            for first, count, step in self.run_lengths():
+                if index < count:
+                    return first + index * step
+                index -= count
+        raise IndexError('task set index out of range')
+
+    def __or__(self, other):
+        union = TaskSet()
+        runs = list(heapq.merge(self.runs, other.runs))
+        start = 0
+        while start < len(runs):
+            # group the runs whose spans overlap
+            end = start + 1
+            group_last = runs[start][1]
+            while end < len(runs) and runs[end][0] <= group_last:
+                group_last = max(group_last, runs[end][1])
+                end += 1
+            group = runs[start:end]
+            if len(group) == 1:
+                union._append_run(*group[0])
+            elif all(run[2] == 1 for run in group):
+                union._append_run(group[0][0], group_last, 1)
+            else:
+                # only the TASK_IDs of interleaved runs are expanded
+                task_ids = set()
+                for first, last, step in group:
+                    task_ids.update(xrange(first, last + 1, step))
+                for task_id in sorted(task_ids):
+                    union._append_run(task_id, task_id, 1)
+            start = end
+        return union
+
+    def __sub__(self, other):
+        difference = TaskSet()
+        for first, last, step in self.runs:
+            # the smallest TASK_ID of the run not handled yet
+            low = first
+            position = max(bisect.bisect_right(other.runs, (first, float('inf'))) - 1, 0)
+            for other_first, other_last, other_step in itertools.islice(other.runs, 
+                                                                    position, None):
+                if other_first > last:
+                    break
+                if other_last < low:
+                    continue
+                # the TASK_IDs before the span of the other run are kept
+                high = first + (other_first - 1 - first) // step * step
+                if high >= low:
+                    difference._append_run(low, high, step if high > low else 1)
+                end = min(last, other_last)
+                if other_step > 1:
+                    # only the TASK_IDs within the span of interleaved runs are expanded
+                    for task_id in xrange(max(low, high + step), end + 1, step):
+                        if (task_id - other_first) % other_step:
+                            difference._append_run(task_id, task_id, 1)
+                low = first + ((end - first) // step + 1) * step
+            if low <= last:
+                difference._append_run(low, last, step if last > low else 1)
+        return difference
+
+    def __and__(self, other):
+        return self - (self - other)
+
+    def __eq__(self, other):
+        if not isinstance(other, TaskSet):
+            return NotImplemented
+        return self.runs == other.runs or \
+               (len(self) == len(other) and not (self - other))
+
+    def __ne__(self, other):
+        equal = self.__eq__(other)
+        return equal if equal is NotImplemented else not equal
+
+    def array_string(self):
+        """
+        Return the qsub notation n[-m[:s]] of the set, or None if its TASK_IDs aren't
+        evenly spaced.
+        """
+        if len(self.runs) != 1:
+            return None
+        return str(self)
+
+    def __str__(self):
+        pieces = []
+        for first, last, step in self.runs:
+            if first == last:
+                pieces.append(str(first))
+            elif step == 1:
+                pieces.append('{0}-{1}'.format(first, last))
+            else:
+                pieces.append('{0}-{1}:{2}'.format(first, last, step))
+        return ','.join(pieces)
+
+    def __repr__(self):
+        return 'TaskSet.parse({0!r})'.format(str(self))
+
+
+def parse_array_notation(array_string):
+    """
+    Parse a string defining an array of jobs and return a TaskSet containing the 
+    TASK_IDs of the jobs. For the notation of an array job see qsub man page.
+
+    Arguments:
+    array_string -- The string defining the array job
+    """
+    return TaskSet.parse(array_string)
+
+
+def array_notation(task_ids):
+    """
+    Return the qsub notation n[-m[:s]] of a set of TASK_IDs, or None if they aren't
+    evenly spaced.
+
+    Arguments:
+    task_ids -- a TaskSet or an iterable of integers
+    """
+    return TaskSet(task_ids).array_string()
+
+
+def array_task_range(array_string):
+    """
+    Return a tuple (first, count, step) describing the TASK_IDs of an array job defined
+    with the qsub notation n[-m[:s]].
+
+    Arguments:
+    array_string -- The string defining the array job
+    """
+    run_lengths = parse_array_notation(array_string).run_lengths()
+    if len(run_lengths) != 1:
+        raise InvalidArrayNotationError(array_string)
+    return run_lengths[0]
+
+
+def remap_bash_code(task_ids):
+    """
+    Return the bash code that lets the tasks of an array job 1-k restore in SGE_TASK_ID
+    the TASK_IDs of the tasks they resubmit.
+
+    Arguments:
+    task_ids -- a TaskSet with the TASK_IDs of the tasks resubmitted
+    """
+    return task_remap_bash_code.format(' '.join('{0}:{1}:{2}'.format(*run) 
+                                                    for run in task_ids.run_lengths()))
+
+
+def array_sweep_bash_code(par_names, par_values, array_string = None, groups = None):
+    """
+    Return the bash code that lets a task of an array sweep export the values of its
+    parameters and the TASK_ID of the original array job.
+
+    Arguments:
+    par_names -- a list with the names of the parameters
+    par_values -- a list with the values of every parameter, in the order of par_names
+    array_string -- the string defining the original array job (default None)
+    groups -- a list with the lists of the positions of the parameters whose values
+              are zipped together, see ParameterSpace. If None every parameter is in
+              its own group (default None)
+    """
+    code = [array_sweep_header_bash_code]
+    if array_string is None:
+        code.append(array_sweep_no_task_bash_code)
+    else:
+        first, count, step = array_task_range(array_string)
+        code.append(array_sweep_task_bash_code.format(first, count, step))
+    if groups is None:
+        groups = [[i] for i in range(len(par_names))]
+    # the last group changes fastest so it's decoded first
+    for group in reversed(groups):
+        for position in group:
+            values = par_values[position]
+            code.append(array_sweep_parameter_bash_code.format(
+                    ' '.join(parameter_value_string(v) for v in values), 
+                    par_names[position], len(values)))
+        code.append(array_sweep_group_bash_code.format(len(par_values[group[0]])))
+    return ''.join(code)
+
+
+def bundle_bash_code(simulation_code, items_string, size, parallel = False, 
+                                                                        code = None):
+    """
+    Return the bash code of the tasks of an array job 1-k that run a bundle of tasks
+    each: the task n runs the tasks of the array job defined by items_string from the
+    ((n - 1) * size + 1)-th to the (n * size)-th.
+
+    Arguments:
+    simulation_code -- the bash code of the simulation run by every task of a bundle
+    items_string -- the string defining the array job of the tasks bundled, in the 
+                    qsub notation n-m:s
+    size -- the number of tasks of every bundle
+
+    Keyword arguments:
+    parallel -- if True the tasks of a bundle run at the same time on the NSLOTS slots
+                of the task, otherwise one after the other (default False)
+    code -- bash code run by every task of a bundle before the code of the simulation,
+            with SGE_TASK_ID set to the TASK_ID of the task (default None)
+    """
+    first, count, step = array_task_range(items_string)
+    loop_code = bundle_parallel_bash_code if parallel else bundle_sequential_bash_code
+    return ''.join([bundle_function_bash_code.format(size), code or '', '\n',
+                    simulation_code, '\n',
+                    bundle_loop_bash_code.format(size, count, first, step, 
+                                                loop_code.format(size, count, first, step))])
+
+
+def bundle_count(items_string, size):
+    """
+    Return the number of bundles of a given size needed to run the tasks of an array
+    job.
+
+    Arguments:
+    items_string -- the string defining the array job of the tasks bundled
+    size -- the number of tasks of every bundle
+    """
+    count = array_task_range(items_string)[1]
+    return (count + size - 1) // size
+
+
+def bundle_items(items_string, size, bundle):
+    """
+    Return a TaskSet with the TASK_IDs of the tasks run by a bundle.
+
+    Arguments:
+    items_string -- the string defining the array job of the tasks bundled
+    size -- the number of tasks of every bundle
+    bundle -- the TASK_ID of the bundle, from 1
+    """
+    first, count, step = array_task_range(items_string)
+    positions = xrange((bundle - 1) * size, min(bundle * size, count))
+    return TaskSet(first + position * step for position in positions)
+
+
+def bundle_of_item(items_string, size, item):
+    """
+    Return the TASK_ID of the bundle running a task.
+
+    Arguments:
+    items_string -- the string defining the array job of the tasks bundled
+    size -- the number of tasks of every bundle
+    item -- the TASK_ID of the task
+    """
+    first, count, step = array_task_range(items_string)
+    return (item - first) // step // size + 1
+
+
+def combination_from_index(par_values, index, groups = None):
+    """
+    Return the combination of the values of the parameters at a given position in the
+    order of itertools.product over the groups of parameters, the last group being the
+    fastest changing one.
+
+    Arguments:
+    par_values -- a list with the values of every parameter
+    index -- the position of the combination
+
+    Keyword arguments:
+    groups -- a list with the lists of the positions of the parameters whose values
+              are zipped together, see ParameterSpace. If None every parameter is in
+              its own group (default None)
+    """
+    if groups is None:
+        groups = [[i] for i in range(len(par_values))]
+    values = [None] * len(par_values)
+    for group in reversed(groups):
+        length = len(par_values[group[0]])
+        for position in group:
+            values[position] = par_values[position][index % length]
+        index = index // length
+    return tuple(values)
+
+
+def sweep_groups_string(groups):
+    """
+    Return the string recording the groups of the parameters of an array sweep in its
+    job element: the index of the group of every parameter, separated by spaces.
+
+    Arguments:
+    groups -- a list with the lists of the positions of the parameters zipped together
+    """
+    group_ids = [0] * sum(len(group) for group in groups)
+    for group_id, group in enumerate(groups):
+        for position in group:
+            group_ids[position] = group_id
+    return ' '.join(str(i) for i in group_ids)
+
+
+def parse_sweep_groups(string):
+    """
+    Return the list of the groups of the parameters of an array sweep from the string
+    recorded in its job element, or None if the string is None.
+
+    Arguments:
+    string -- the string written by sweep_groups_string
+    """
+    if string is None:
+        return None
+    groups = dict()
+    for position, group_id in enumerate(string.split()):
+        groups.setdefault(int(group_id), []).append(position)
+    return [groups[group_id] for group_id in sorted(groups)]
+
+
+def decode_array_sweep_task(task_id, par_values, array_string = None, groups = None):
+    """
+    Map the TASK_ID of an array sweep back to the values of the parameters and the
+    TASK_ID of the original array job. The TASK_ID returned is None if the original
+    job wasn't an array job.
+
+    Arguments:
+    task_id -- the TASK_ID of the array sweep
+    par_values -- a list with the values of every parameter
+    array_string -- the string defining the original array job (default None)
+    groups -- a list with the lists of the positions of the parameters whose values
+              are zipped together. If None every parameter is in its own group
+              (default None)
+    """
+    index = int(task_id) - 1
+    original_task = None
+    if array_string is not None:
+        first, count, step = array_task_range(array_string)
+        original_task = first + (index % count) * step
+        index = index // count
+
+    return combination_from_index(par_values, index, groups), original_task
+
+
+def parse_qstat_xml(text):
+    """
+    Parse the output of qstat -xml and return a dictionary mapping the JOB_IDs of the 
+    jobs in the queue to lists of pairs holding a TaskSet with the TASK_IDs of some of 
+    their tasks, None if the job isn't an array job, and the state of the tasks.
+
+    Arguments:
+    text -- the output of qstat -xml
+    """
+    queued = dict()
+    for job_list in ET.fromstring(text).iter('job_list'):
+        job_id = job_list.findtext('JB_job_number').strip()
+        code = job_list.findtext('state', '').strip()
+        if 'E' in code:
+            state = task_states['error']
+        elif 'r' in code or 't' in code:
+            state = task_states['running']
+        else:
+            state = task_states['pending']
+        tasks = job_list.findtext('tasks')
+        if tasks is not None:
+            tasks = TaskSet.parse(tasks)
+        queued.setdefault(job_id, []).append((tasks, state))
+    return queued
+
+
+def parse_qacct_output(text):
+    """
+    Parse the accounting records printed by qacct -j and return a dictionary mapping 
+    pairs (JOB_ID, TASK_ID) to the state of the tasks. The TASK_ID is None for jobs 
+    that aren't array jobs.
+
+    Arguments:
+    text -- the output of qacct -j
+    """
+    records = dict()
+    for block in re.split(r'^=+\s*$', text, flags = re.MULTILINE):
+        record = dict(line.split(None, 1) for line in block.splitlines() 
+                                                            if len(line.split()) > 1)
+        if 'jobnumber' not in record:
+            continue
+        task_id = record.get('taskid', 'undefined').strip()
+        task_id = int(task_id) if task_id.isdigit() else None
+        failed = record.get('failed', '0').split()[0] != '0' or \
+                 record.get('exit_status', '0').split()[0] != '0'
+        records[(record['jobnumber'].strip(), task_id)] = \
+                            task_states['failed'] if failed else task_states['finished']
+    return records
+
+
+class SchedulerState:
+    """
+    Cache of the state of the jobs of the user in the scheduler. The jobs in the queue
+    are read with a single call to qstat -xml and the jobs that left it with a single 
+    call to qacct -j for every job name, so the number of calls doesn't depend on the
+    number of jobs. Both are reused for ttl seconds.
+    """
+
+    def __init__(self, ttl = scheduler_state_ttl, qstat = 'qstat', qacct = 'qacct', 
+                                                                        user = None):
+        """
+        Keyword arguments:
+        ttl -- the number of seconds the state read from the scheduler is reused
+               (default scheduler_state_ttl)
+        qstat -- the qstat command (default 'qstat')
+        qacct -- the qacct command (default 'qacct')
+        user -- the owner of the jobs. If None the current user (default None)
+        """
+        self.ttl = ttl
+        self.qstat = qstat
+        self.qacct = qacct
+        self.user = user or os.environ.get('USER') or getpass.getuser()
+        self.lock = threading.Lock()
+        self.queued = None
+        self.queued_time = None
+        # job name -> (time of the call, accounting records)
+        self.accounting = dict()
+
+    def _expired(self, timestamp):
+        return timestamp is None or time.time() - timestamp >= self.ttl
+
+    def _run(self, arguments):
+        try:
+            p = subprocess.Popen(arguments, stdout = subprocess.PIPE, 
+                                                        stderr = subprocess.PIPE)
+        except OSError as error:
+            raise SchedulerQueryError(arguments[0], str(error))
+        output, error = p.communicate()
+        return p.returncode, output, error
+
+    def _queued_jobs(self):
+        with self.lock:
+            if self._expired(self.queued_time):
+                returncode, output, error = self._run([self.qstat, '-xml', '-u', 
+                                                                            self.user])
+                if returncode != 0:
+                    raise SchedulerQueryError(self.qstat, error)
+                self.queued = parse_qstat_xml(output)
+                self.queued_time = time.time()
+            return self.queued
+
+    def _accounting(self, job_name):
+        with self.lock:
+            timestamp, records = self.accounting.get(job_name, (None, None))
+            if self._expired(timestamp):
+                # qacct fails when no job has the name yet
+                returncode, output, error = self._run([self.qacct, '-j', job_name])
+                records = parse_qacct_output(output) if returncode == 0 else dict()
+                self.accounting[job_name] = (time.time(), records)
+            return records
+
+    def in_queue(self, job_id):
+        """
+        Return True if any task of a job is waiting or running in the queue. The tasks
+        in error don't count since they never leave the queue by themselves.
+
+        Arguments:
+        job_id -- the JOB_ID of the job
+        """
+        return any(state in queued_states 
+                            for tasks, state in self._queued_jobs().get(str(job_id), []))
+
+    def invalidate(self):
+        """
+        Forget the state read from the scheduler.
+        """
+        with self.lock:
+            self.queued_time = None
+            self.accounting = dict()
+
+    def state(self, job_id, task_id = None, job_name = None):
+        """
+        Return the state of a task, one of the values of task_states.
+
+        Arguments:
+        job_id -- the JOB_ID of the job
+
+        Keyword arguments:
+        task_id -- the TASK_ID of the task, None if the job isn't an array job 
+                   (default None)
+        job_name -- the name of the job, used to read the accounting records of all
+                    the jobs with the same name at once. If None the JOB_ID is used
+                    (default None)
+        """
+        job_id = str(job_id)
+        for tasks, state in self._queued_jobs().get(job_id, []):
+            if tasks is None or task_id is None or task_id in tasks:
+                return state
+        records = self._accounting(job_name or job_id)
+        return records.get((job_id, task_id), task_states['unknown'])
+
+
+def job_retries(job_element):
+    """
+    Return the number of times the tasks of a job have been resubmitted.
+
+    Arguments:
+    job_element -- an ElementTree.Element describing the job
+    """
+    return int(job_element.get(aux_file_kw['retries'], 0))
+
+
+@profiler.profiled('search_file_for_error')
+def search_file_for_error(filename, chunk_size = scan_chunk_size, tail_size = None,
+                                                                            start = 0):
+    """
+    Search a stream file for the pyGRID error identifier and return True if it's found.
+    The file is read backwards in blocks of bounded size, starting from its end where 
+    the error trap usually prints, so the memory used doesn't depend on the size of the
+    file. Raise IOError if the file can't be opened.
+
+    Arguments:
+    filename -- the name of the stream file
+
+    Keyword arguments:
+    chunk_size -- the size in bytes of the blocks read from the file
+    tail_size -- if not None only the last tail_size bytes of the file are searched
+                 (default None)
+    start -- the position in bytes from which the file is searched (default 0)
+    """
+    overlap_size = len(pyGRID_error_identifier) - 1
+    with open(filename, 'rb') as stream_file:
+        stream_file.seek(0, 2)
+        position = stream_file.tell()
+        limit = start if tail_size is None else max(start, position - tail_size)
+        # the beginning of the block read last is kept to find identifiers that span
+        # two blocks
+        overlap = ''
+        while position > limit:
+            start = max(limit, position - chunk_size)
+            stream_file.seek(start)
+            chunk = stream_file.read(position - start) + overlap
+            if pyGRID_error_identifier in chunk:
+                return True
+            overlap = chunk[:overlap_size]
+            position = start
+    return False
+
+
+@profiler.profiled('search_file_for_crashed_items')
+def search_file_for_crashed_items(filename, tail_size = None):
+    """
+    Return a TaskSet with the TASK_IDs printed after the pyGRID error identifier by the
+    tasks of a bundle that crashed in a stream file. Raise IOError if the file can't be
+    opened.
+
+    Arguments:
+    filename -- the name of the stream file
+
+    Keyword arguments:
+    tail_size -- if not None only the last tail_size bytes of the file are searched
+                 (default None)
+    """
+    items = set()
+    with open(filename, 'rb') as stream_file:
+        if tail_size is not None:
+            stream_file.seek(0, 2)
+            stream_file.seek(max(0, stream_file.tell() - tail_size))
+        for line in stream_file:
+            if pyGRID_error_identifier in line:
+                items.update(int(item) for item in bundle_error_regex.findall(line))
+    return TaskSet(sorted(items))
+
+
+def substitute_in_templates(template,substitution_dict):
+    """
+    Create a real filename by substituting the arguments in a template filename
+
+    Arguments:
+    filename_template -- The string template to generate the filename
+    substitution_dict -- a dictionary containing the keywords to substitute as keys and
+                         the values to substitute them with as values
+    """
+    for k,v in substitution_dict.iteritems(): 
+        template = template.replace(k,v)
+    return template
+
+
+class FilenameTemplate:
+    """
+    Filename template like $JOB_NAME.o$JOB_ID.$TASK_ID compiled once into its literal
+    parts and the names of its variables. It renders filenames, in batches for the
+    tasks of an array job, and maps filenames back to the values of the variables.
+    Variables without a value are left in the filenames as they are.
+
+    As in SGE, a variable is the longest known name following the $, so the characters
+    after it, underscores included, are literal text: with the known name PAR_Amp,
+    out_$PAR_Amp_$TASK_ID has the variables PAR_Amp and TASK_ID. Unknown names extend
+    to the end of the word.
+    """
+
+    variable_regex = re.compile(r'\$(\w+)')
+
+    def __init__(self, template, names = ()):
+        """
+        Arguments:
+        template -- the string template, with variables written $NAME
+
+        Keyword arguments:
+        names -- the names of the variables known besides the SGE pseudo environment
+                 variables, e.g. PAR_omega (default ())
+        """
+        self.template = template
+        known = sorted(set(template_known_variables).union(names), key = len,
+                       reverse = True)
+        # literals has one more element than names: the text after the last variable
+        self.literals = []
+        self.names = []
+        start = 0
+        for match in self.variable_regex.finditer(template):
+            word = match.group(1)
+            name = next((n for n in known if word.startswith(n)), word)
+            self.literals.append(template[start:match.start()])
+            self.names.append(name)
+            start = match.start(1) + len(name)
+        self.literals.append(template[start:])
+        self.default_regex = self.regex()
+
+    def render(self, values):
+        """
+        Return the filename obtained substituting the values of the variables.
+
+        Arguments:
+        values -- a dictionary with the names of the variables, without $, as keys
+        """
+        buf = [self.literals[0]]
+        for name, literal in zip(self.names, self.literals[1:]):
+            buf.append(str(values[name]) if name in values else '$' + name)
+            buf.append(literal)
+        return ''.join(buf)
+
+    def render_tasks(self, values, task_ids):
+        """
+        Return an iterator over the filenames of the tasks of an array job. The values
+        of the variables are substituted once and only the TASK_ID changes between the
+        filenames.
+
+        Arguments:
+        values -- a dictionary with the names of the variables, without $, as keys
+        task_ids -- an iterable with the TASK_IDs
+        """
+        escape = lambda text: text.replace('{', '{{').replace('}', '}}')
+        buf = [escape(self.literals[0])]
+        for name, literal in zip(self.names, self.literals[1:]):
+            if name == 'TASK_ID':
+                buf.append('{0}')
+            else:
+                buf.append(escape(str(values[name]) if name in values else '$' + name))
+            buf.append(escape(literal))
+        return itertools.imap(''.join(buf).format, task_ids)
+
+    def regex(self, values = None):
+        """
+        Return a compiled regular expression matching the filenames rendered from the
+        template, with a named group for every variable.
+
+        Keyword arguments:
+        values -- a dictionary with the values of the variables known in advance, or
+                  lists of their possible values, which the filenames must hold 
+                  (default None)
+        """
+        values = values or dict()
+        buf = [re.escape(self.literals[0])]
+        seen = set()
+        for name, literal in zip(self.names, self.literals[1:]):
+            if name in seen:
+                buf.append('(?P={0})'.format(name))
+            else:
+                if name in values:
+                    choices = values[name]
+                    if not isinstance(choices, (list, tuple)):
+                        choices = [choices]
+                    pattern = '|'.join(re.escape(str(v)) for v in choices)
+                else:
+                    pattern = template_variable_patterns.get(name, '.+?')
+                buf.append('(?P<{0}>{1})'.format(name, pattern))
+                seen.add(name)
+            buf.append(re.escape(literal))
+        return re.compile(''.join(buf) + r'\Z')
+
+    def match(self, filename, values = None):
+        """
+        Return a dictionary with the values of the variables of a filename rendered from
+        the template, or None if the filename doesn't match the template.
+
+        Arguments:
+        filename -- the filename
+
+        Keyword arguments:
+        values -- a dictionary with the values of the variables known in advance, or
+                  lists of their possible values, which remove the ambiguities when the
+                  values hold the literal parts of the template (default None)
+        """
+        regex = self.default_regex if not values else self.regex(values)
+        match = regex.match(filename)
+        if match is None:
+            return None
+        return match.groupdict()
+
+
+def filename_template(template, names = ()):
+    """
+    Return the FilenameTemplate compiled from a string template. The templates are
+    compiled only once for every set of known variable names.
+
+    Arguments:
+    template -- the string template, with variables written $NAME
+
+    Keyword arguments:
+    names -- the names of the variables known besides the SGE pseudo environment
+             variables, e.g. PAR_omega (default ())
+    """
+    key = (template, frozenset(names))
+    compiled = compiled_templates.get(key)
+    if compiled is None:
+        compiled = compiled_templates[key] = FilenameTemplate(template, names)
+    return compiled
+
+
+def parameter_elements(par_element):
+    """
+    Return a list with the parameter elements children of the parameters element and
+    of its group elements.
+
+    Arguments:
+    par_element -- An ElementTree.Element defining the parameters for the job
+    """
+    return par_element.findall(grid_file_kw['parameter']) + par_element.findall(
+                            '{0}/{1}'.format(grid_file_kw['group'], grid_file_kw['parameter']))
+
+
+def parse_parameters(par_element = None):
+    """
+    Parse the children of the parameter element, and the ones of its group elements,
+    and return a dictionary with the parameter names as keys and list of parameter 
+    values as values. Raise InvalidParameterGroupError if the parameters of a group 
+    don't have the same number of values.
+
+    Keyword arguments:
+    par_element -- An ElementTree.Element defining the parameters for
+                   the job (default None). If None is passed returns an 
+                   empty dictionary
+    """
+    parameters = dict()
+    param_parser = ParamParser()
+    
+    if par_element is None:
+        return parameters
+        
+    for parameter in parameter_elements(par_element):
+        par_name = parameter.get(grid_file_kw['par_name'])
+        par_value = parameter.text.strip(' \n\t')
+        parameters[par_name] = param_parser.parse(par_value)
+    
+    for group in parse_parameter_groups(par_element):
+        lengths = [len(parameters[name]) for name in group]
+        if len(set(lengths)) > 1:
+            raise InvalidParameterGroupError(group, lengths)
+    return parameters
+
+
+def parse_parameter_groups(par_element = None):
+    """
+    Return a list with the lists of the names of the parameters of every group element
+    child of the parameters element, whose values are zipped element-wise rather than
+    combined. Raise InvalidParameterGroupError if a parameter is in more than one 
+    group.
+
+    Keyword arguments:
+    par_element -- An ElementTree.Element defining the parameters for the job
+                   (default None). If None is passed returns an empty list
+    """
+    if par_element is None:
+        return []
+    groups = []
+    for group_element in par_element.findall(grid_file_kw['group']):
+        groups.append([p.get(grid_file_kw['par_name']) 
+                            for p in group_element.findall(grid_file_kw['parameter'])])
+    names = list(itertools.chain(*groups))
+    if len(set(names)) != len(names) or set(names) & set(p.get(grid_file_kw['par_name'])
+                                for p in par_element.findall(grid_file_kw['parameter'])):
+        raise InvalidParameterGroupError(names)
+    return [group for group in groups if group]
+
+
+def parse_constraints(par_element = None):
+    """
+    Return a list with the constraints on the combinations of the values of the 
+    parameters defined by the constraint children of the parameter element.
+
+    Keyword arguments:
+    par_element -- An ElementTree.Element defining the parameters for the job
+                   (default None). If None is passed returns an empty list
+    """
+    if par_element is None:
+        return []
+    return [c.text.strip(' \n\t') for c in par_element.findall(grid_file_kw['constraint'])
+                                                                            if c.text]
+
+
+def parse_parameter_bounds(par_element = None):
+    """
+    Return a dictionary with the names of the parameters defined by a single interval
+    as keys and tuples with the start and the stop value of the interval as values.
+
+    Keyword arguments:
+    par_element -- An ElementTree.Element defining the parameters for the job
+                   (default None). If None is passed returns an empty dictionary
+    """
+    bounds = dict()
+    param_parser = ParamParser()
+    if par_element is None:
+        return bounds
+    for parameter in parameter_elements(par_element):
+        interval = param_parser.bounds(parameter.text.strip(' \n\t'))
+        if interval is not None:
+            bounds[parameter.get(grid_file_kw['par_name'])] = interval
+    return bounds
+
+
+def parse_sampling(par_element = None):
+    """
+    Return a dictionary with the method, the number of samples and the seed of the 
+    sampling of the combinations of the parameters given by the sampling, samples and
+    seed attributes of the parameter element, to pass to sample_parameter_space, or
+    None if the element has no sampling attribute. Raise InvalidSamplingError if the
+    attributes are invalid.
+
+    Keyword arguments:
+    par_element -- An ElementTree.Element defining the parameters for the job
+                   (default None). If None is passed returns None
+    """
+    if par_element is None or par_element.get(grid_file_kw['sampling']) is None:
+        return None
+    method = par_element.get(grid_file_kw['sampling']).strip().lower()
+    if method not in sampling_methods:
+        raise InvalidSamplingError('the sampling method {0} is not one of {1}'.format(
+                                                    method, ', '.join(sampling_methods)))
+    try:
+        samples = int(par_element.get(grid_file_kw['samples']))
+        seed = par_element.get(grid_file_kw['seed'])
+        if seed is not None:
+            seed = int(seed)
+    except (TypeError, ValueError):
+        raise InvalidSamplingError('the samples attribute must be a positive integer '
+                                   'and the seed attribute an integer')
+    if samples <= 0:
+        raise InvalidSamplingError('the samples attribute must be a positive integer')
+    return dict(method = method, samples = samples, seed = seed)
+
+
+class ParameterSpace:
+    """
+    Lazy representation of all the possible combinations of the values of the
+    parameters of a job. The parameters are split in groups whose values are zipped,
+    every parameter being in its own group by default, and the combinations are the
+    product of the groups. The combinations are generated while iterating, in the order
+    of itertools.product, and can be accessed by index without generating the ones 
+    before them.
+    """
+
+    def __init__(self, names, values, groups = None):
+        """
+        Arguments:
+        names -- a list with the names of the parameters
+        values -- a list with the values of every parameter, in the order of names.
+                  The parameters of a group have the same number of values
+
+        Keyword arguments:
+        groups -- a list with the lists of the positions in names of the parameters
+                  whose values are zipped together. If None every parameter is in its
+                  own group (default None)
+        """
+        self.names = list(names)
+        self.values = [list(v) for v in values]
+        if groups is None:
+            groups = [[i] for i in range(len(self.names))]
+        self.groups = [list(group) for group in groups]
+
+    def group_lengths(self):
+        """
+        Return a list with the number of values of every group of parameters.
+        """
+        return [len(self.values[group[0]]) for group in self.groups]
+
+    def __len__(self):
+        return reduce(lambda size, length: size * length, self.group_lengths(), 1)
+
+    def __iter__(self):
+        if self.groups == [[i] for i in range(len(self.names))]:
+            return itertools.product(*self.values)
+        if len(self.groups) == 1:
+            return itertools.izip(*self.values)
+        rows = [zip(*[self.values[position] for position in group]) 
+                                                            for group in self.groups]
+        # the position in the concatenated rows of the groups of every parameter
+        order = sorted(range(len(self.names)), 
+                       key = list(itertools.chain(*self.groups)).__getitem__)
+        def combinations():
+            for c in itertools.product(*rows):
+                values = list(itertools.chain(*c))
+                yield tuple(values[i] for i in order)
+        return combinations()
+
+    def __getitem__(self, index):
+        size = len(self)
+        if index < 0:
+            index += size
+        if index < 0 or index >= size:
+            raise IndexError('parameter space index out of range')
+        return combination_from_index(self.values, index, self.groups)
+
+    def constrain(self, constraints):
+        """
+        Return a ParameterSpace holding only the combinations for which all the 
+        constraints are true, in the same order, with all the parameters in a single
+        group. The constraints are python expressions of the names of the parameters
+        evaluated at once over the whole grid of combinations as numpy arrays, so they
+        combine conditions with the & | ~ operators rather than and, or, not. They can
+        use the functions in constraint_functions. Raise InvalidConstraintError if a
+        constraint can't be evaluated.
+
+        Arguments:
+        constraints -- a list with the constraints
+        """
+        lengths = self.group_lengths()
+        namespace = dict(constraint_functions)
+        for axis, group in enumerate(self.groups):
+            # every group varies along its own axis of the grid
+            shape = [1] * len(self.groups)
+            shape[axis] = lengths[axis]
+            for position in group:
+                namespace[self.names[position]] = numpy.asarray(
+                                                    self.values[position]).reshape(shape)
+        
+        mask = numpy.ones(lengths, dtype = bool)
+        for constraint in constraints:
+            try:
+                mask &= numpy.asarray(eval(constraint, {'__builtins__': {}}, namespace),
+                                                                        dtype = bool)
+            except Exception as e:
+                raise InvalidConstraintError(constraint, str(e))
+        
+        # the indices of the combinations left are in the order of itertools.product.
+        # The values are converted back to python ones so that they are written the 
+        # same way whether the space was constrained or not
+        indices = numpy.nonzero(mask)
+        values = [None] * len(self.names)
+        for axis, group in enumerate(self.groups):
+            for position in group:
+                values[position] = numpy.asarray(
+                                        self.values[position])[indices[axis]].tolist()
+        return ParameterSpace(self.names, values, [range(len(self.names))])
+
+
+def sobol_points(samples, dimensions, seed = None):
+    """
+    Return a numpy array with the first points of the Sobol sequence in the unit 
+    hypercube, one per row, generated in Gray code order from the direction numbers
+    in sobol_direction_numbers. Raise InvalidSamplingError if there are more dimensions
+    than direction numbers or more samples than points of sobol_bits bits.
+
+    Arguments:
+    samples -- the number of points
+    dimensions -- the number of dimensions of the hypercube
+
+    Keyword arguments:
+    seed -- if not None the points are scrambled by a random digital shift drawn with
+            this seed, which keeps the uniformity of the sequence (default None)
+    """
+    if dimensions > len(sobol_direction_numbers) + 1:
+        raise InvalidSamplingError('the Sobol sequence is limited to {0} parameters'
+                                        .format(len(sobol_direction_numbers) + 1))
+    if samples > 1 << sobol_bits:
+        raise InvalidSamplingError('the Sobol sequence is limited to {0} samples'
+                                        .format(1 << sobol_bits))
+    
+    directions = numpy.zeros((dimensions, sobol_bits), dtype = numpy.int64)
+    directions[0] = 1 << numpy.arange(sobol_bits - 1, -1, -1)
+    for dimension in range(1, dimensions):
+        degree, coefficients, initial = sobol_direction_numbers[dimension - 1]
+        v = directions[dimension]
+        for i in range(sobol_bits):
+            if i < degree:
+                v[i] = initial[i] << (sobol_bits - 1 - i)
+                continue
+            v[i] = v[i - degree] ^ (v[i - degree] >> degree)
+            for k in range(1, degree):
+                if (coefficients >> (degree - 1 - k)) & 1:
+                    v[i] ^= v[i - k]
+    
+    shift = numpy.zeros(dimensions, dtype = numpy.int64)
+    if seed is not None:
+        shift = numpy.random.RandomState(seed).randint(0, 1 << sobol_bits, dimensions)
+    points = numpy.empty((samples, dimensions), dtype = numpy.int64)
+    points[0] = shift
+    if samples > 1:
+        # the point n differs from the previous one by the direction of the lowest bit
+        # set in n
+        n = numpy.arange(1, samples, dtype = numpy.int64)
+        bits = numpy.log2(n & -n).astype(int)
+        points[1:] = numpy.bitwise_xor.accumulate(directions[:, bits].T, axis = 0) ^ shift
+    return points / float(1 << sobol_bits)
+
+
+def sampling_points(method, samples, dimensions, seed = None):
+    """
+    Return a numpy array with points in the unit hypercube, one per row, drawn with a
+    sampling method in sampling_methods: uniformly at random, by Latin hypercube 
+    sampling, where every dimension is split in as many strata as samples and every 
+    stratum holds one point, or from the Sobol sequence.
+
+    Arguments:
+    method -- the sampling method
+    samples -- the number of points
+    dimensions -- the number of dimensions of the hypercube
+
+    Keyword arguments:
+    seed -- the seed of the random numbers. If None the random and Latin hypercube 
+            points are drawn with the seed 0 and the Sobol points are not scrambled, so
+            that the points are always reproducible (default None)
+    """
+    if method == 'sobol':
+        return sobol_points(samples, dimensions, seed)
+    random_state = numpy.random.RandomState(0 if seed is None else seed)
+    if method == 'random':
+        return random_state.random_sample((samples, dimensions))
+    if method == 'lhs':
+        strata = numpy.argsort(random_state.random_sample((samples, dimensions)), axis = 0)
+        return (strata + random_state.random_sample((samples, dimensions))) / samples
+    raise InvalidSamplingError('the sampling method {0} is not one of {1}'.format(
+                                                    method, ', '.join(sampling_methods)))
+
+
+def sample_parameter_space(names, values, bounds, method, samples, seed = None,
+                                                                        groups = None):
+    """
+    Return a ParameterSpace holding a number of combinations of the values of the
+    parameters sampled with a method in sampling_methods, with all the parameters in a
+    single group. The parameters defined by a single interval are sampled over the 
+    continuous interval, the other ones take one of their values, and the parameters 
+    zipped in a group take the values at the same position.
+
+    Arguments:
+    names -- a list with the names of the parameters, every group a dimension of the
+             sampling in this order
+    values -- a list with the values of every parameter, in the order of names
+    bounds -- a dictionary with the names of the parameters defined by a single 
+              interval as keys and tuples with its start and stop value as values,
+              see parse_parameter_bounds
+    method -- the sampling method
+    samples -- the number of combinations
+
+    Keyword arguments:
+    seed -- the seed of the sampling, see sampling_points (default None)
+    groups -- a list with the lists of the positions in names of the parameters
+              whose values are zipped together. If None every parameter is in its
+              own group (default None)
+    """
+    if groups is None:
+        groups = [[i] for i in range(len(names))]
+    points = sampling_points(method, samples, len(groups), seed)
+    columns = [None] * len(names)
+    for dimension, group in enumerate(groups):
+        u = points[:, dimension]
+        if len(group) == 1 and names[group[0]] in bounds:
+            start, stop = bounds[names[group[0]]]
+            columns[group[0]] = (start + u * (stop - start)).tolist()
+            continue
+        length = len(values[group[0]])
+        indices = numpy.minimum((u * length).astype(int), length - 1)
+        for position in group:
+            columns[position] = numpy.asarray(values[position])[indices].tolist()
+    return ParameterSpace(names, columns, [range(len(names))])
+
+
+class ParamParser:
+    """
+    Class to parse the values assigned to a parameter.
+    """
+    
+    def __init__(self):
+        self.scanner = re.Scanner([
+            (r"[0-9.eE+-]+", lambda scanner,token:("NUMBER", token)),
+            (r"[a-z_]+",     lambda scanner,token:("IDENTIFIER", token)),
+            (r"[:]",        lambda scanner,token:("COLON")),
+            (r"[,]",        lambda scanner,token:("COMMA")),
+            (r"\s+",         None), # None == skip token.
+        ])
+    
+    def _tokenize(self,string):
+        """
+        Tokenize a string using re.Scanner and return a list containing the token in the
+        form tuple for numbers and identifiers and strings for commas and colons
+        
+        Arguments:
+        string -- the string to tokenize
+        """
+        return self.scanner.scan(string)
+    
+    def _process_interval(self):
+        """
+        Creates a list of values from the entries in the interval stack. It appends the
+        new_values to the values stack and empty the interval stack.
+        """
+        startValue = self.interval[0]
+        stopValue = self.interval[-1]
+        
+        samples = 10
+        if len(self.interval) == 3:
+            samples = self.interval[1]                
+        
+        new_values = linspace(startValue, stopValue, samples)
+        self.values.extend(new_values)
+        self.intervals.append((startValue, stopValue, len(new_values)))
+        self.interval = []
+    
+    def _print_state(self, current_token):
+        """
+        Utility method to output the current state of the parser.
+        """
+        print "t "+str(current_token)+"\tPV "+str(self.prev_token)+"\tI "+str(self.interval)+"\tV "+str(self.values)
+        
+    def parse(self,string):
+        """
+        Parse a string representing the values of a parameter and returns them in a list.
+        """
+        self.values = []
+        self.interval = []
+        self.intervals = []
+        self.prev_token = None        
+        
+        tokens, remainder = self._tokenize(string)
+        for t in tokens:
+            
+            if t is 'COLON':        
+                if isinstance(self.prev_token, tuple) and self.prev_token[0] is 'NUMBER':
+                    self.interval.append(float(self.prev_token[1]))
+                    self.prev_token = t
+                    continue
+                
+                raise InvalidParamStringError(string)
+                
+            elif isinstance(t, tuple):
+                if t[0] is 'NUMBER':
+                    if isinstance(self.prev_token, tuple) and self.prev_token[0] is 'NUMBER':
+                        if len(self.interval) == 0:
+                            self.values.append(float(self.prev_token[1]))
+                        else:
+                            self.interval.append(float(self.prev_token[1]))
+                            self._process_interval()
+                            
+                    self.prev_token = t
+        
+        if len(self.interval) != 0:
+            self.interval.append(float(self.prev_token[1]))
+            self._process_interval()
+            self.prev_token = None
+            
+        if isinstance(self.prev_token, tuple) and self.prev_token[0] is 'NUMBER':
+            self.values.append(float(self.prev_token[1]))
+            self.prev_token = None
+            
+        return self.values
+    
+    def bounds(self, string):
+        """
+        Return a tuple with the start and the stop value if the string representing the
+        values of a parameter is a single interval, None otherwise.
+        """
+        values = self.parse(string)
+        if len(self.intervals) != 1 or self.intervals[0][2] != len(values):
+            return None
+        return self.intervals[0][:2]
+            
+
+class InvalidNameError(Exception):
+    def __str__(self):
+        return "The simulation element representing the job must have a name."
+    
+
+class InvalidSimulatioNameError(Exception):
+    def __init__(self, sim_name):
+        self.sim_name = sim_name
+    def __str__(self):
+        return "The file defines no job named {0}".format(self.sim_name)
+
+
+class InheritanceCycleError(Exception):
+    def __init__(self, sim_names):
+        self.sim_names = sim_names
+    def __str__(self):
+        return "The simulations inherit from or post process each other in a cycle: "\
+               "{0}".format(' -> '.join(self.sim_names))
+
+
+class InvalidParamStringError(Exception):
+    def __init__(self, par_string):
+        self.par_string = par_string
+    def __str__(self):
+        return "The parameter string {0} has invalid formatting".format(self.par_string)
+
+
+class InvalidConstraintError(Exception):
+    def __init__(self, constraint, message):
+        self.constraint = constraint
+        self.message = message
+    def __str__(self):
+        return "The constraint {0} on the parameters can't be evaluated: {1}".format(
+                                                        self.constraint, self.message)
+
+
+class InvalidSamplingError(Exception):
+    def __init__(self, message):
+        self.message = message
+    def __str__(self):
+        return "The sampling of the parameters is invalid: {0}".format(self.message)
+
+
+class InvalidParameterGroupError(Exception):
+    def __init__(self, par_names, lengths = None):
+        self.par_names = par_names
+        self.lengths = lengths
+    def __str__(self):
+        if self.lengths is None:
+            return "The parameters {0} are in more than one group".format(
+                                                            ', '.join(self.par_names))
+        return "The parameters {0} of a group have different numbers of values: "\
+               "{1}".format(', '.join(self.par_names), 
+                            ', '.join(str(l) for l in self.lengths))
+
+
+class InvalidArraySweepError(Exception):
+    def __init__(self, template):
+        self.template = template
+    def __str__(self):
+        return "The stream template {0} depends on the parameters and can't be used "\
+               "in an array sweep".format(self.template)
+
+
+class InvalidArrayNotationError(Exception):
+    def __init__(self, array_string):
+        self.array_string = array_string
+    def __str__(self):
+        return "The TASK_IDs {0} have invalid formatting".format(self.array_string)
+
+
+class SchedulerQueryError(Exception):
+    def __init__(self, command, message):
+        self.command = command
+        self.message = message
+    def __str__(self):
+        return "The scheduler command {0} failed: {1}".format(self.command, 
+                                                                self.message.strip())
+
+
+class pyGRID:
+    """
+    Main class. It represents a job to submit to the cluster through qsub.
+    """
+    
+    def __init__(self, sim_element=None, parent_map=None):
+        """
+        Initialise a pyGRID object from a simulation element and a map 
+        of parents for every node in the xml tree.
+
+        Keyword arguments:
+        sim_element -- An ElementTree.Element defining the parameters for
+                       the job (default None). If None is passed the
+                       object is initialised with an empty qsubOptions object and an
+                       empty dictionary for the parameters list
+        parent_map -- A dictionary containing a list of nodes as keys and their parents
+                      as values (default None). If None is passed the inherit and 
+                      post_processing attributes of the simulation element are ignored.
+        """
+        self.sim = qsubOptions()
+        self.parameters = dict()
+        # the lists of the names of the parameters whose values are zipped element-wise
+        # rather than combined
+        self.parameter_groups = []
+        # the expressions the combinations of the values of the parameters submitted
+        # satisfy, see ParameterSpace.constrain
+        self.constraints = []
+        # the start and stop values of the parameters defined by a single interval and
+        # the sampling of the combinations of the parameters, see sample_parameter_space.
+        # If sampling is None all the combinations are submitted
+        self.parameter_bounds = dict()
+        self.sampling = None
+        self.output_filename_template = "$JOB_NAME.o$JOB_ID.$TASK_ID"
+        self.error_filename_template = "$JOB_NAME.e$JOB_ID.$TASK_ID"
+        # the templates of the files written by every run of the simulation, which must
+        # exist for a run to be skipped as completed when submitting, see submit
+        self.outputs = []
+        # number of bytes at the end of the stream files searched for errors. If None
+        # the whole files are searched
+        self.scan_tail_size = None
+        # name of the job store holding the jobs submitted, see job_stores
+        self.job_store = 'xml'
+        # SchedulerState telling the tasks in the queue and the ones that failed when
+        # scanning for crashed jobs. If None only the stream files are searched
+        self.scheduler = None
+        # the filenames of the scripts already written, keyed by the hash of their
+        # content
+        self.scripts = dict()
+        
+        if sim_element is None:
+            return
+        
+        if parent_map is None:
+            self._parse_element(sim_element)
+        else:
+            # simulation elements are always the children of the root element so we can
+            # use the parent map to retrieve the root
+            definitions = SimulationDefinitions(parent_map[sim_element])
+            self.__dict__.update(definitions.build(sim_element).__dict__)
+        
+    def __str__(self):
+        return '{0}\nParameters: {1}'.format(str(self.sim.args), str(self.parameters))
+
+    @profiler.profiled('pyGRID._parse_element')
+    def _parse_element(self, sim_element=None):
+        """
+        Parse the children of the simulation element and insert them as arguments
+        of the cluster job, over the ones already set. The inherit and post_processing
+        attributes are resolved by SimulationDefinitions.
+
+        Keyword arguments:
+        sim_element -- An ElementTree.Element defining the parameters for
+                       the job (default None).
+        """
+        if sim_element is None:
+            return
+        
+        # the name of the job is expressed as an attribute of the xml element so we deal
+        # with it differently 
+        job_name = sim_element.get(grid_file_kw['sim_name'])
+        if (job_name is None) or (len(job_name) == 0):
+            raise InvalidNameError
+        self.sim.add_option('N', job_name)
+        
+        self.bashFilename = self.sim.args.N + '.' + bash_file_extension
+        self.auxilliaryFilename = self.sim.args.N + '.' + auxilliary_file_extension
+        
+        # parse the parameters to pass to the job
+        par_element = sim_element.find(grid_file_kw['parameters'])
+        if par_element is not None:
+            self.parameters = parse_parameters(par_element)
+            self.parameter_groups = parse_parameter_groups(par_element)
+            self.constraints = parse_constraints(par_element)
+            self.parameter_bounds = parse_parameter_bounds(par_element)
+            self.sampling = parse_sampling(par_element)
+        
+        # parse the remaining qsub options
+        for child in sim_element:
+        
             if child.tag == grid_file_kw['parameters']:
                 continue
         
-            argument_value = child.text
-            if argument_value is not None:
-                argument_value = argument_value.strip(' \n\t')
+            argument_value = child.text
+            if argument_value is not None:
+                argument_value = argument_value.strip(' \n\t')
+        
+            if child.tag == grid_file_kw['code']:
+                self.sim.args.code = error_handling_bash_code + '\n\n' + argument_value
+            elif child.tag == 't':
+                self.array = argument_value
+            elif child.tag == 'o':
+                setattr(self,'output_filename_template',argument_value)
+            elif child.tag == 'e':
+                setattr(self,'error_filename_template',argument_value)
+            elif child.tag == grid_file_kw['outputs']:
+                self.outputs = (argument_value or '').split()
+            else:
+                self.sim.add_option(child.tag, argument_value)
+    
+    def copy(self):
+        """
+        Return a new pyGRID object for the same simulation, and a copy of its post
+        processing job if any, which can be modified independently of this one.
+        """
+        gridJob = pyGRID()
+        gridJob.__dict__.update(self.__dict__)
+        gridJob.sim = copy.copy(self.sim)
+        gridJob.sim.args = copy.deepcopy(self.sim.args)
+        gridJob.parameters = dict(self.parameters)
+        gridJob.scripts = dict()
+        if hasattr(self, 'post_proc'):
+            gridJob.post_proc = self.post_proc.copy()
+        return gridJob
+            
+    def _open_job_store(self, filepath = None):
+        """
+        Return the job store holding the jobs submitted for this simulation.
+        
+        Keyword arguments:
+        filepath -- the path of the file of the job store in case it has been renamed 
+                    from pyGRID default. If None the pyGRID default is used
+        """
+        return job_stores[self.job_store](filepath or self._job_store_filename())
+    
+    def _job_store_filename(self):
+        """
+        Return the default name of the file of the job store of the simulation, without
+        opening the store.
+        """
+        return self.sim.args.N + '.' + job_stores[self.job_store].extension
+    
+    def _script_hash(self):
+        """
+        Return the hash of the bash script of the simulation, which names the script 
+        submitted for its jobs and is recorded in their elements. The scripts of array 
+        sweeps and bundles wrap the same code, so their runs are recorded with the hash
+        of the script of the simulation too.
+        """
+        return hashlib.sha1(self.sim.qsub_script()).hexdigest()[:script_hash_length]
+    
+    @profiler.profiled('pyGRID._generate_param_space')
+    def _generate_param_space(self):
+        """
+        Generate all the possible combinations of the parameters for the job, or the
+        ones sampled if the job has a sampling. The parameters of a group take their
+        values together, at the same position.
+        Returns a list of parameters and a ParameterSpace object yielding all possible
+        combinations of the parameters values satisfying the constraints. If the job
+        has no parameters then returns None for both.
+        """
+        if len(self.parameters) == 0:
+            return None,None
+        
+        names = self.parameters.keys()
+        if self.sampling is not None:
+            # the parameters are sorted so that they always take the same dimension
+            names = sorted(names)
+        values = [self.parameters[name] for name in names]
+        
+        # every parameter not zipped in a group is in its own group, the groups in the
+        # order of their first parameter
+        grouped = dict((name, group) for group in self.parameter_groups for name in group)
+        groups = []
+        for position, name in enumerate(names):
+            if name not in grouped:
+                groups.append([position])
+            elif grouped[name][0] == name:
+                groups.append([names.index(n) for n in grouped[name]])
+        
+        if self.sampling is None:
+            space = ParameterSpace(names, values, groups)
+        else:
+            space = sample_parameter_space(names, values, self.parameter_bounds,
+                                           groups = groups, **self.sampling)
+        if self.constraints:
+            space = space.constrain(self.constraints)
+        return space.names, space
+    
+    def _prepare_job(self,parameter_list = None, array_string = None):
+        """
+        Utility method to prepare the submission of a job to qsub. Return an
+        ElementTree.Element object describing the job and the list of arguments for qsub,
+        without the name of the bash script. The values of the parameters are passed to
+        the job with -v and the filenames of its output and error streams with -o and -e,
+        so that the jobs of a simulation share the same bash script.
+        
+        Keyword arguments:
+        parameter_list -- a list of pairs defining the name of the parameter and its value
+                          for the job
+        array_string   -- a string for submitting an array job
+        """
+        job = ET.Element(aux_file_kw['job'])
+        job.set(aux_file_kw['name'],self.sim.args.N)
+        
+        substitution_dict = dict()
+        execstring = ['qsub', '-terse']
+        if parameter_list:
+            param_string = []
+            for name, value in parameter_list:
+                value = parameter_value_string(value)
+                param_string.append(str(name) + '=' + value)
+                job.set('PAR_'+str(name),value)
+                substitution_dict[filename_prefixes['parameters']+'_'+str(name)] = value
+            param_string = ','.join(param_string)
+            execstring.extend(['-v',param_string])
+        output_filename = self._filename_template(self.output_filename_template).render(
+                                                                    substitution_dict)
+        error_filename = self._filename_template(self.error_filename_template).render(
+                                                                    substitution_dict)
+        
+        if array_string:
+            execstring.extend(['-t',array_string])
+            job.set(aux_file_kw['array'],array_string)
+        
+        # quote the filenames so that the shell doesn't expand the pseudo environment
+        # variables of qsub
+        execstring.extend(['-o', pipes.quote(output_filename),
+                           '-e', pipes.quote(error_filename)])
+        
+        return job, execstring
+    
+    def _write_script(self, code = None, bundle = None):
+        """
+        Utility method to write the bash script submitted for the jobs of the simulation.
+        The script is named after the hash of its content, so that it is written only
+        once however many jobs run it and a script already submitted is never modified.
+        Return the filename of the script.
+        
+        Keyword arguments:
+        code -- bash code run before the code of the simulation (default None)
+        bundle -- a tuple holding the string defining the array job of the tasks 
+                  bundled, the number of tasks of every bundle and True if they run at
+                  the same time, see bundle_bash_code. If None every task of the job
+                  runs the simulation once (default None)
+        """
+        if code is None and bundle is None:
+            script = self.sim.qsub_script()
+        else:
+            simulation_code = getattr(self.sim.args, 'code', '')
+            if bundle is None:
+                self.sim.args.code = code + '\n' + simulation_code
+            else:
+                self.sim.args.code = bundle_bash_code(simulation_code, *bundle, 
+                                                                        code = code)
+            script = self.sim.qsub_script()
+            self.sim.args.code = simulation_code
+        
+        script_hash = hashlib.sha1(script).hexdigest()[:script_hash_length]
+        filename = self.scripts.get(script_hash)
+        if filename is None:
+            filename = '.'.join([self.sim.args.N, script_hash, bash_file_extension])
+            # the content of the file is known from its name
+            if not os.path.exists(filename):
+                write_if_changed(filename, script)
+            self.scripts[script_hash] = filename
+        return filename
+    
+    def _write_user_script(self):
+        """
+        Utility method to write the bash script of the simulation the user can submit by
+        hand. The file is left untouched if it is up to date.
+        """
+        write_if_changed(self.bashFilename, self.sim.qsub_script())
+    
+    @profiler.profiled('pyGRID._qsub')
+    def _qsub(self, execstring):
+        """
+        Utility method to run qsub and return the job_id of the job submitted.
+        
+        Arguments:
+        execstring -- the command line to execute
+        """
+        p = subprocess.Popen(execstring, stdout = subprocess.PIPE, 
+                                                stderr = subprocess.STDOUT, shell = True)
+                
+        jobID = p.stdout.read().strip(' \n\t')
+        return jobID.split('.')[0]
+    
+    @profiler.profiled('pyGRID._submit_job')
+    def _submit_job(self,parameter_list = None, array_string = None, code = None):
+        """
+        Utility method to submit a job to qsub. Return an ElementTree.Element object
+        describing the job just submitted.
+        
+        Keyword arguments:
+        parameter_list -- a list of pairs defining the name of the parameter and its value
+                          for the job
+        array_string   -- a string for submitting an array job
+        code -- bash code run before the code of the simulation by this job only 
+                (default None)
+        """
+        job, execstring = self._prepare_job(parameter_list, array_string)
+        execstring.append(self._write_script(code))
+        
+        # retrieve the job_id and add it to the job xml element
+        job.set(aux_file_kw['id'], self._qsub(' '.join(execstring)))
+        return job
+    
+    def _submit_bundles(self, items_string, size, parallel = False, 
+                                                    parameter_list = None, code = None):
+        """
+        Utility method to submit the tasks of an array job as an array job whose tasks
+        each run a bundle of them. Return an ElementTree.Element object describing the
+        job just submitted, which records the tasks bundled so that the crashes can be
+        reported per task.
+        
+        Arguments:
+        items_string -- the string defining the array job of the tasks bundled
+        size -- the number of tasks of every bundle
+        
+        Keyword arguments:
+        parallel -- if True the tasks of a bundle run at the same time on the slots of
+                    the task, otherwise one after the other (default False)
+        parameter_list -- a list of pairs defining the name of the parameter and its 
+                          value for the job (default None)
+        code -- bash code run by every task of a bundle before the code of the
+                simulation (default None)
+        """
+        array_string = '1-{0}'.format(bundle_count(items_string, size))
+        job, execstring = self._prepare_job(parameter_list, array_string)
+        execstring.append(self._write_script(code, (items_string, size, parallel)))
+        job.set(aux_file_kw['id'], self._qsub(' '.join(execstring)))
+        job.set(aux_file_kw['items'], items_string)
+        job.set(aux_file_kw['bundle'], str(size))
+        if parallel:
+            job.set(aux_file_kw['parallel'], '1')
+        return job
+    
+    def _submit_jobs_concurrently(self, params, combinations, array_string = None,
+                                                                            workers = 1):
+        """
+        Utility method to submit a job for every combination of the parameters running
+        at most workers qsub processes at the same time. The bash script is written
+        before starting the qsub processes. Yield the ElementTree.Element objects
+        describing the jobs just submitted, in the same order as the combinations.
+        
+        Arguments:
+        params -- a list with the names of the parameters
+        combinations -- an iterable with the combinations of the values of the parameters
+        
+        Keyword arguments:
+        array_string -- a string for submitting an array job
+        workers -- the maximum number of qsub processes running at the same time
+        """
+        script_filename = self._write_script()
+        
+        combinations = iter(combinations)
+        pool = ThreadPool(workers)
+        try:
+            while True:
+                # prepare the jobs in batches so that the memory used doesn't depend on
+                # the size of the parameter space
+                job_elements = []
+                execstrings = []
+                for c in itertools.islice(combinations, workers * submission_batch_size):
+                    job, execstring = self._prepare_job(zip(params,c), array_string)
+                    execstring.append(script_filename)
+                    job_elements.append(job)
+                    execstrings.append(' '.join(execstring))
+                if len(job_elements) == 0:
+                    break
+                
+                job_ids = pool.map(self._qsub, execstrings)
+                for job, jobID in zip(job_elements, job_ids):
+                    job.set(aux_file_kw['id'], jobID)
+                    yield job
+        finally:
+            pool.close()
+            pool.join()
+    
+    def _submit_array_sweep(self, params, combinations, array_string = None,
+                                                        bundle = 1, parallel = False):
+        """
+        Utility method to submit every combination of the parameters as a single array
+        job. Every combination is run for each TASK_ID of the original array job, if any.
+        Return an ElementTree.Element object describing the job just submitted, which
+        holds the values of the parameters needed to map a TASK_ID back to its
+        combination.
+
+        Arguments:
+        params -- a list with the names of the parameters
+        combinations -- a ParameterSpace with the combinations of the values of the
+                        parameters
+        array_string -- a string defining the original array job (default None)
+        bundle -- the number of combinations run by every task of the array job 
+                  (default 1)
+        parallel -- if True the combinations of a task run at the same time on its 
+                    slots, otherwise one after the other (default False)
+        """
+        par_prefix = '$' + filename_prefixes['parameters'] + '_'
+        for template in [self.output_filename_template, self.error_filename_template]:
+            if par_prefix in template:
+                raise InvalidArraySweepError(template)
+
+        par_values = combinations.values
+        groups = combinations.groups
+        tasks = 1
+        if array_string:
+            tasks = array_task_range(array_string)[1]
+        sweep_string = '1-{0}'.format(len(combinations) * tasks)
+
+        code = array_sweep_bash_code(params, par_values, array_string, groups)
+        if bundle > 1:
+            job = self._submit_bundles(sweep_string, bundle, parallel, code = code)
+        else:
+            job = self._submit_job(array_string = sweep_string, code = code)
+        if array_string:
+            job.set(aux_file_kw['tasks'],array_string)
+        if any(len(group) > 1 for group in groups):
+            job.set(aux_file_kw['groups'], sweep_groups_string(groups))
+        for name, values in zip(params, par_values):
+            par_element = ET.SubElement(job, aux_file_kw['parameter'])
+            par_element.set(aux_file_kw['par_name'], name)
+            par_element.text = ' '.join(parameter_value_string(v) for v in values)
+        return job
+
+    @profiler.profiled('pyGRID.submit')
+    def submit(self, array_sweep = False, workers = 1, bundle = 1, parallel = False,
+                                                                        force = False):
+        """
+        Submit a job to the queue manager for every possible combination of the
+        parameters of the simulation. It also writes an xml file holding the job_id from
+        the queue manager for every job submitted with the list of the parameters passed
+        and the array information.
+        
+        The jobs submitted before are scanned first, and the combinations whose runs, 
+        every task of an array job, all completed without errors with the same script
+        and whose output files all exist are skipped, see CompletionCache, as well as 
+        the runs still in the queue. The scheduler must be set in the scheduler 
+        attribute for the runs to count as completed or in the queue, and the jobs with
+        tasks still in the queue are kept in the job store.
+
+        Keyword arguments:
+        array_sweep -- if True all the combinations of the parameters are submitted as a
+                       single array job, each task decoding the values of its parameters
+                       from SGE_TASK_ID (default False)
+        workers -- the maximum number of qsub processes to run at the same time when
+                   submitting a job per combination (default 1)
+        bundle -- the number of combinations of the parameters, or of tasks of an array
+                  job, run by every task submitted. If greater than 1 the combinations
+                  are submitted as an array sweep (default 1)
+        parallel -- if True the combinations run by a task run at the same time on the
+                    NSLOTS slots it requested with -pe, otherwise one after the other
+                    (default False)
+        force -- if True every combination is submitted, completed or not, and the
+                 jobs submitted before are removed from the job store (default False)
+        """
+        
+        array_string = getattr(self,'array',None)
+        
+        params, combinations = self._generate_param_space()
+        unfinished = []
+        if not force:
+            try:
+                completions, queued, unfinished = self._scan_before_submission(workers)
+            except SchedulerQueryError as error:
+                print "{0}: submitting every combination since the scheduler can't "\
+                      "tell the runs completed: {1}".format(self.sim.args.N, error)
+                completions, queued, unfinished = (), (), []
+            params, combinations = self._pending_combinations(params, combinations,
+                                                array_string, completions, queued)
+        if combinations == []:
+            submitted = []
+        elif combinations is None and bundle > 1 and array_string:
+            submitted = [self._submit_bundles(array_string, bundle, parallel)]
+        elif combinations is None:
+            submitted = [self._submit_job(array_string = array_string)]
+        elif array_sweep or bundle > 1:
+            submitted = [self._submit_array_sweep(params, combinations, array_string,
+                                                                    bundle, parallel)]
+        elif workers > 1:
+            submitted = self._submit_jobs_concurrently(params, combinations,
+                                                                array_string, workers)
+        else:
+            submitted = (self._submit_job(parameter_list = zip(params,c), 
+                                          array_string = array_string) 
+                                                                    for c in combinations)
+        
+        # record the job IDs while the jobs are submitted, after the ones of the jobs
+        # still in the queue
+        job_ids = []
+        script_hash = self._script_hash()
+        store = self._open_job_store()
+        store.clear()
+        try:
+            for job in unfinished:
+                store.add_job(job)
+                job_ids.append(job.get(aux_file_kw['id']))
+            for job in submitted:
+                job.set(aux_file_kw['script'], script_hash)
+                store.add_job(job)
+                job_ids.append(job.get(aux_file_kw['id']))
+        finally:
+            store.close()
+        
+        # create the bash script without reference to the output/error filenames so that
+        # the user can use it
+        self._write_user_script()
+        
+        # if this job has a post processing simulation submit it to the queue, again
+        # since its inputs changed, even if every run had already completed
+        if hasattr(self,'post_proc'):
+            if job_ids:
+                self.post_proc.sim.args.hold_jid = ','.join(job_ids)
+            elif hasattr(self.post_proc.sim.args, 'hold_jid'):
+                del self.post_proc.sim.args.hold_jid
+            self.post_proc.submit(array_sweep = array_sweep, workers = workers,
+                                  bundle = bundle, parallel = parallel, force = True)
+    
+    def _scan_before_submission(self, workers = 1):
+        """
+        Utility method to scan the jobs submitted before for the simulation, if any, 
+        before submitting it again, see submit. The stream files that don't exist yet
+        aren't reported. Return the CompletionCache of the simulation, a set with the 
+        keys of the runs still in the queue, see completion_key, and a list with the
+        ElementTree.Element objects describing the jobs with tasks still in the queue.
+        
+        Keyword arguments:
+        workers -- the number of threads searching the stream files at the same time
+                   (default 1)
+        """
+        completions = CompletionCache(self._completions_filename())
+        queued = set()
+        if not os.path.exists(self._job_store_filename()):
+            return completions, queued, []
+        
+        store = self._open_job_store()
+        try:
+            checkpoints_filename = self._checkpoints_filename(store)
+            checkpoints = ScanCheckpoints(checkpoints_filename)
+            unfinished = self._scan_job_store(store, workers, checkpoints, completions,
+                                              queued, quiet = True)
+            # the elements are read again to hold the crashes just recorded
+            unfinished = [job for key, job in store.jobs() if key in unfinished]
+        finally:
+            store.close()
+        checkpoints.save(checkpoints_filename)
+        completions.save(self._completions_filename())
+        return completions, queued, unfinished
+    
+    @profiler.profiled('pyGRID._pending_combinations')
+    def _pending_combinations(self, params, combinations, array_string = None,
+                                                    completions = (), queued = ()):
+        """
+        Utility method to drop the combinations of the parameters already completed or
+        still in the queue, see submit, and print how many were skipped. Return the 
+        list of the names of the parameters and a ParameterSpace with the combinations
+        left, with all the parameters in a single group, or an empty list if none is 
+        left. If the simulation has no parameters the combinations are None, or an 
+        empty list if its job completed.
+
+        Arguments:
+        params -- a list with the names of the parameters, or None
+        combinations -- a ParameterSpace with the combinations of the values of the
+                        parameters, or None
+
+        Keyword arguments:
+        array_string -- a string defining the array job of the simulation (default None)
+        completions -- a CompletionCache with the runs completed (default empty)
+        queued -- a set with the keys of the runs still in the queue (default empty)
+        """
+        if len(completions) == 0 and len(queued) == 0:
+            return params, combinations
+        
+        script_hash = self._script_hash()
+        task_ids = [None] if array_string is None else parse_array_notation(array_string)
+        listing = DirectoryListing()
+        templates = [self._filename_template(template) for template in self.outputs]
+        prefix = filename_prefixes['parameters'] + '_'
+        
+        def skipped(combination):
+            parameter_list = zip(params or [], combination)
+            values = dict((prefix + str(name), parameter_value_string(value)) 
+                                                        for name, value in parameter_list)
+            values['JOB_NAME'] = self.sim.args.N
+            for task_id in task_ids:
+                key = completion_key(script_hash, self.outputs, parameter_list, task_id)
+                if key in queued:
+                    continue
+                if key not in completions:
+                    return False
+                if task_id is not None:
+                    values['TASK_ID'] = task_id
+                if not all(listing.exists(t.render(values)) for t in templates):
+                    return False
+            return True
+        
+        if combinations is None:
+            if not skipped(()):
+                return None, None
+            print "{0}: skipped the job already completed or in the queue".format(
+                                                                        self.sim.args.N)
+            return None, []
+        
+        left = []
+        skips = 0
+        for combination in combinations:
+            if skipped(combination):
+                skips += 1
+            else:
+                left.append(combination)
+        if not skips:
+            return params, combinations
+        print "{0}: skipped {1} of {2} combinations already completed or in the queue, "\
+              "submitting {3}".format(self.sim.args.N, skips, skips + len(left), 
+                                                                            len(left))
+        if not left:
+            return params, []
+        return params, ParameterSpace(params, zip(*left), [range(len(params))])
+    
+    @profiler.profiled('pyGRID.scan_crashed_jobs')
+    def scan_crashed_jobs(self, filepath = None, workers = 1, incremental = True):
+        """
+        Loads the jobs submitted for this simulation from its job store, generate the 
+        filenames for the streams and check them for runtime errors. The runs the
+        scheduler reports finished without errors are recorded in the completion cache
+        of the simulation, see submit.
+        
+        Keyword arguments:
+        filepath -- the path of the file of the job store in case it has been renamed 
+                    from pyGRID default. If None the pyGRID default is used
+        workers -- the number of threads searching the stream files at the same time
+                   (default 1)
+        incremental -- if True only the bytes of the stream files written since the
+                       previous scan are searched. The state of the stream files is
+                       recorded in a file next to the auxiliary file (default True)
+        
+        If a SchedulerState is set in the scheduler attribute the tasks still in the 
+        queue aren't searched and the tasks the scheduler reports as failed or in error
+        crashed.
+        """
+        store = self._open_job_store(filepath)
+        checkpoints = None
+        checkpoints_filename = self._checkpoints_filename(store)
+        if incremental:
+            checkpoints = ScanCheckpoints(checkpoints_filename)
+        
+        completions = CompletionCache(self._completions_filename())
+        
+        self._scan_job_store(store, workers, checkpoints, completions)
+        
+        store.close()
+        if checkpoints is not None:
+            checkpoints.save(checkpoints_filename)
+        completions.save(self._completions_filename())
+    
+    def _checkpoints_filename(self, store):
+        """
+        Return the name of the file recording the state of the stream files of the jobs
+        in a job store.
+        """
+        return os.path.splitext(store.filename)[0] + '.' + scan_file_extension
+    
+    def _completions_filename(self):
+        """
+        Return the name of the file recording the runs of the simulation that completed.
+        """
+        return self.sim.args.N + '.' + completion_file_extension
+    
+    @profiler.profiled('pyGRID._scan_job_store')
+    def _scan_job_store(self, store, workers = 1, checkpoints = None, 
+                                        completions = None, queued = None, quiet = False):
+        """
+        Search the stream files of the jobs in an open job store and record the crashes
+        found in the store, see scan_crashed_jobs. Return a set with the keys of the 
+        jobs with tasks still in the queue.
+        
+        Arguments:
+        store -- the job store
+        
+        Keyword arguments:
+        workers -- the number of threads searching the stream files at the same time
+                   (default 1)
+        checkpoints -- a ScanCheckpoints used to search only the bytes of the stream
+                       files written since the last scan (default None)
+        completions -- a CompletionCache recording the runs the scheduler reports 
+                       finished without errors and forgetting the ones that crashed
+                       (default None)
+        queued -- a set collecting the keys of the runs still in the queue, see 
+                  completion_key (default None)
+        quiet -- if True the stream files that don't exist aren't reported 
+                 (default False)
+        """
+        jobs = store.jobs()
+        
+        # the directories holding the stream files are listed once for all the jobs
+        listing = DirectoryListing()
+        
+        def search_task(task):
+            position, index, output, error = task
+            job_element = jobs[position][1]
+            state = self._scheduler_state(job_element, index)
+            if state in queued_states:
+                return position, index, state, False, ()
+            failed = state in crashed_states
+            if not failed and not self._task_crashed(output, error, listing, checkpoints,
+                                                                                quiet):
+                return position, index, state, False, ()
+            if job_element.get(aux_file_kw['bundle']) is not None:
+                # the crashes of a bundle are reported for the tasks it runs
+                return position, index, state, True, self._crashed_bundle_items(
+                                            job_element, index, output, error, failed)
+            return position, index, state, True, () if index is None else (index,)
+        
+        tasks = ((position, index, output, error) 
+                    for position, (key, job_element) in enumerate(jobs)
+                    for index, output, error in self._stream_files(dict(job_element.attrib)))
+        
+        pool = None
+        if workers > 1:
+            pool = ThreadPool(workers)
+            results = pool.imap(search_task, tasks, scan_batch_size)
+        else:
+            results = itertools.imap(search_task, tasks)
+        
+        crashes = dict()
+        unfinished = set()
+        try:
+            for position, index, state, crashed, indices in results:
+                if crashed:
+                    crash_indices = crashes.setdefault(position, TaskSet())
+                    for item in indices:
+                        crash_indices.add(item)
+                if state in queued_states:
+                    unfinished.add(jobs[position][0])
+                if completions is not None:
+                    self._record_completions(completions, jobs[position][1], index,
+                                             state, crashed, indices, queued)
+        finally:
+            if pool is not None:
+                pool.close()
+                pool.join()
+        
+        # the crashes found by a previous scan are replaced
+        for position, (key, job_element) in enumerate(jobs):
+            store.set_crashes(key, crashes.get(position))
+        return unfinished
+    
+    def _record_completions(self, completions, job_element, index, state, crashed,
+                                                        crash_indices = (), queued = None):
+        """
+        Record in a CompletionCache the runs of a task the scheduler reports finished
+        without errors and forget the ones that crashed. The runs of a bundle that
+        crashed are the tasks it runs, the ones that didn't crash completed. The runs
+        are recorded with the hash of the script the job was submitted with, so the
+        jobs submitted before it was recorded are skipped.
+
+        Arguments:
+        completions -- the CompletionCache
+        job_element -- an ElementTree.Element describing the job
+        index -- the TASK_ID of the task, None if the job isn't an array job
+        state -- the state of the task reported by the scheduler, None if unknown
+        crashed -- True if the task crashed
+
+        Keyword arguments:
+        crash_indices -- an iterable with the TASK_IDs of the tasks that crashed, for 
+                         array jobs and bundles (default empty)
+        queued -- a set collecting the keys of the runs still in the queue 
+                  (default None)
+        """
+        script_hash = job_element.get(aux_file_kw['script'])
+        if script_hash is None:
+            return
+        items = [index]
+        if job_element.get(aux_file_kw['bundle']) is not None:
+            items = bundle_items(job_element.get(aux_file_kw['items']), 
+                                 int(job_element.get(aux_file_kw['bundle'])), index)
+        crash_indices = TaskSet(crash_indices)
+        for item in items:
+            parameter_list, task_id = self._task_run(job_element, item)
+            key = completion_key(script_hash, self.outputs, parameter_list, task_id)
+            if state in queued_states:
+                if queued is not None:
+                    queued.add(key)
+            elif crashed and (item is None or item in crash_indices):
+                completions.discard(key)
+            elif state == task_states['finished']:
+                completions.add(key)
+    
+    def _task_run(self, job_element, index):
+        """
+        Return a list of pairs defining the name and the value of the parameters of a
+        task of a job and the TASK_ID it was given in the original array job, None if
+        the simulation isn't an array job.
+
+        Arguments:
+        job_element -- an ElementTree.Element describing the job
+        index -- the TASK_ID of the task, None if the job isn't an array job
+        """
+        remap = job_element.get(aux_file_kw['remap'])
+        if remap is not None:
+            index = TaskSet.parse(remap)[index - 1]
+        par_elements = job_element.findall(aux_file_kw['parameter'])
+        if not len(par_elements):
+            return self._job_parameters(job_element), index
+        # the task of an array sweep decodes its combination from its TASK_ID
+        combination, task_id = decode_array_sweep_task(index, 
+                            [e.text.split() for e in par_elements],
+                            job_element.get(aux_file_kw['tasks']),
+                            parse_sweep_groups(job_element.get(aux_file_kw['groups'])))
+        return zip([e.get(aux_file_kw['par_name']) for e in par_elements], 
+                                                                combination), task_id
+    
+    def _crashed_bundle_items(self, job_element, index, output, error, failed = False):
+        """
+        Return a TaskSet with the TASK_IDs of the tasks of a bundle that crashed, read
+        from the error identifiers in its stream files. All the tasks of the bundle 
+        crashed if it failed or if the identifiers don't tell the tasks.
+
+        Arguments:
+        job_element -- an ElementTree.Element describing the job of the bundle, or a
+                       dictionary with its attributes
+        index -- the TASK_ID of the bundle
+        output -- the filename of the output stream of the bundle
+        error -- the filename of the error stream of the bundle
+
+        Keyword arguments:
+        failed -- True if the scheduler reported that the bundle failed or is in error
+                  (default False)
+        """
+        items = bundle_items(job_element.get(aux_file_kw['items']), 
+                             int(job_element.get(aux_file_kw['bundle'])), index)
+        if failed:
+            return items
+        crashed = TaskSet()
+        streams = [output] if hasattr(self.sim.args, 'j') else [output, error]
+        for filename in streams:
+            try:
+                crashed = crashed | search_file_for_crashed_items(filename, 
+                                                                    self.scan_tail_size)
+            except IOError:
+                pass
+        crashed = crashed & items
+        return crashed if crashed else items
+    
+    def _task_state(self, job_element, index):
+        """
+        Return the state of a task of an array job reported by the scheduler, or None if
+        no SchedulerState is set. The state of a task of a bundle is the one of the 
+        bundle running it.
+
+        Arguments:
+        job_element -- an ElementTree.Element describing the job
+        index -- the TASK_ID of the task
+        """
+        if job_element.get(aux_file_kw['bundle']) is not None:
+            index = bundle_of_item(job_element.get(aux_file_kw['items']), 
+                                   int(job_element.get(aux_file_kw['bundle'])), index)
+        return self._scheduler_state(job_element, index)
+    
+    def _scheduler_state(self, job_element, index = None):
+        """
+        Return the state of a task of a job reported by the scheduler, or None if no
+        SchedulerState is set.
+        
+        Arguments:
+        job_element -- an ElementTree.Element describing the job
+        
+        Keyword arguments:
+        index -- the TASK_ID of the task, None if the job isn't an array job 
+                 (default None)
+        """
+        if self.scheduler is None:
+            return None
+        return self.scheduler.state(job_element.get(aux_file_kw['id']), index, 
+                                                    job_element.get(aux_file_kw['name']))
+    
+    def status(self, filepath = None):
+        """
+        Print the state in the scheduler of the tasks of every job in the job store and
+        return a list of pairs holding the element of each job and a dictionary mapping
+        the states of its tasks to TaskSets with their TASK_IDs, empty for the jobs
+        that aren't array jobs. If no SchedulerState is set one is created.
+        
+        Keyword arguments:
+        filepath -- the path of the file of the job store in case it has been renamed 
+                    from pyGRID default. If None the pyGRID default is used
+        """
+        if self.scheduler is None:
+            self.scheduler = SchedulerState()
+        store = self._open_job_store(filepath)
+        jobs = store.jobs()
+        store.close()
         
-            if child.tag == grid_file_kw['code']:
-                self.sim.args.code = error_handling_bash_code + '\n\n' + argument_value
-            elif child.tag == 't':
-                self.array = argument_value
-            elif child.tag == 'o':
-                setattr(self,'output_filename_template',argument_value)
-            elif child.tag == 'e':
-                setattr(self,'error_filename_template',argument_value)
+        report = []
+        for key, job_element in jobs:
+            states = dict()
+            array_string = job_element.get(aux_file_kw['array'])
+            if array_string is None:
+                states[self._scheduler_state(job_element)] = TaskSet()
             else:
-                if argument_value is not None:
-                    self.sim.parse_and_add('-{0} {1}'.format(child.tag, argument_value))
-                else:
-                    self.sim.parse_and_add('-{0}'.format(child.tag))
-        
-        # finally let's parse the post_processing job if any
-        post_proc_job = sim_element.get(grid_file_kw['post_proc'])
-        if post_proc_job is not None and parent_map is not None:
-            root_element = parent_map[sim_element]
-            post_proc_element = find_sim_element(root_element,post_proc_job)
-            self.post_proc = pyGRID(sim_element = post_proc_element, parent_map = parent_map)
-            
-    def _generate_param_space(self):
+                for index in parse_array_notation(array_string):
+                    states.setdefault(self._scheduler_state(job_element, index), 
+                                                                    TaskSet()).add(index)
+            report.append((job_element, states))
+            print "{0} {1}: {2}".format(job_element.get(aux_file_kw['name']),
+                    job_element.get(aux_file_kw['id']),
+                    ', '.join(' '.join([state, str(tasks)]).strip() 
+                                                for state, tasks in sorted(states.items())))
+        return report
+    
+    def search_stream_for_error(self, job_attributes, listing = None):
         """
-        Generate all the possible combinations of the parameters for the job.
-        Returns a list of parameters and list of all possible combinations of the
-        parameters values. If the job has no parameters then returns None for both.
+        Search the stream files of job defined by the arguments for errors and return
+        True if any is encountered, together with a TaskSet holding the TASK_IDs of the
+        tasks that crashed for array jobs, or of the tasks bundled, or None otherwise.
+
+        Arguments:
+        job_attributes -- a dictionary of attributes defining the job
+        
+        Keyword arguments:
+        listing -- a DirectoryListing used to skip the stream files that don't exist
+                   (default None)
         """
-        if len(self.parameters) == 0:
-            return None,None
-        else:
-            return self.parameters.keys(), [x for x in apply(itertools.product, 
-                                                          self.parameters.values())]
+        crashed = False
+        crash_indices = TaskSet()
+        bundled = job_attributes.get(aux_file_kw['bundle']) is not None
+        for index, output, error in self._stream_files(job_attributes):
+            if self._task_crashed(output, error, listing):
+                crashed = True
+                if bundled:
+                    crash_indices = crash_indices | self._crashed_bundle_items(
+                                                    job_attributes, index, output, error)
+                elif index is not None:
+                    crash_indices.add(index)
+        
+        if crash_indices:
+            return True, crash_indices
+        return crashed, None
     
-    def _submit_job(self,parameter_list = None, array_string = None):
+    def _filename_template(self, template):
         """
-        Utility method to submit a job to qsub. Return an ElementTree.Element object
-        describing the job just submitted.
+        Return the FilenameTemplate compiled from a string template, knowing the
+        variables of the parameters of the simulation.
         
-        Keyword arguments:
-        parameter_list -- a list of pairs defining the name of the parameter and its value
-                          for the job
-        array_string   -- a string for submitting an array job
+        Arguments:
+        template -- the string template, with variables written $NAME
         """
-        job = ET.Element(aux_file_kw['job'])
-        job.set(aux_file_kw['name'],self.sim.args.N)
+        prefix = filename_prefixes['parameters'] + '_'
+        return filename_template(template, [prefix + name for name in self.parameters])
+    
+    def _stream_files(self, job_attributes):
+        """
+        Generate the filenames of the output and error streams for every task of the job
+        defined by the arguments. Yield tuples holding the TASK_ID of the task, None if
+        the job isn't an array job, and the filenames of its output and error streams.
         
-        output_filename = self.output_filename_template
-        error_filename = self.error_filename_template
+        Arguments:
+        job_attributes -- a dictionary of attributes defining the job
+        """
+        job_attributes = dict(job_attributes)
+        array_string = job_attributes.pop(aux_file_kw['array'],None)
+        output = self._filename_template(self.output_filename_template)
+        error = self._filename_template(self.error_filename_template)
         
-        execstring = ['qsub', '-terse']
-        if parameter_list:
-            param_string = []
-            substitution_dict = dict()
-            for pair in parameter_list:
-                param_string.append('='.join(str(x) for x in pair))
-                job.set('PAR_'+str(pair[0]),str(pair[1]))
-                substitution_dict['$'+filename_prefixes['parameters']+'_'+str(pair[0])] = str(pair[1])
-            param_string = ','.join(param_string)
-            execstring.extend(['-v',param_string])
-            output_filename = substitute_in_templates(output_filename,substitution_dict)
-            error_filename = substitute_in_templates(error_filename,substitution_dict)
-
-        self.sim.args.o = output_filename
-        self.sim.args.e = error_filename  
-        self.sim.write_qsub_script(self.bashFilename)      
+        if array_string is None:
+            yield None, output.render(job_attributes), error.render(job_attributes)
+            return
         
-        if array_string:
-            execstring.extend(['-t',array_string])
-            job.set(aux_file_kw['array'],array_string)
+        task_ids = parse_array_notation(array_string)
+        for task in itertools.izip(task_ids, output.render_tasks(job_attributes, task_ids),
+                                   error.render_tasks(job_attributes, task_ids)):
+            yield task
+    
+    def match_stream_file(self, filename):
+        """
+        Map the filename of a stream file of the simulation back to the job and the
+        task that wrote it. Return a tuple holding the stream, 'o' or 'e', the JOB_ID,
+        the TASK_ID and a dictionary with the values of the parameters written in the
+        filename, the IDs being None if the template doesn't hold them, or None if the
+        filename isn't a stream file of the simulation. The values of the parameters
+        are matched against the ones of the simulation so that a value holding a dot
+        doesn't make the filename ambiguous, except the ones sampled over an interval.
         
-        execstring.append(self.bashFilename)
-        execstring = ' '.join(execstring)
-        p = subprocess.Popen(execstring, stdout = subprocess.PIPE, 
-                                                stderr = subprocess.STDOUT, shell = True)
-                
-        # retrieve the job_id and add it to the job xml element
-        jobID = p.stdout.read().strip(' \n\t')
-        job.set(aux_file_kw['id'], jobID.split('.')[0])
-        return job
+        Arguments:
+        filename -- the filename of the stream file
+        """
+        prefix = filename_prefixes['parameters'] + '_'
+        known_values = dict((prefix + name, [parameter_value_string(v) for v in values])
+                                            for name, values in self.parameters.items()
+                    if self.sampling is None or name not in self.parameter_bounds)
+        known_values['JOB_NAME'] = self.sim.args.N
+        for stream, template in [('o', self.output_filename_template),
+                                 ('e', self.error_filename_template)]:
+            values = self._filename_template(template).match(filename, known_values)
+            if values is None:
+                continue
+            parameters = dict((k[len(prefix):], v) for k, v in values.items() 
+                                                                if k.startswith(prefix))
+            task_id = values.get('TASK_ID')
+            return (stream, values.get('JOB_ID'), 
+                    None if task_id is None else int(task_id), parameters)
+        return None
     
-    def submit(self):
+    def _task_crashed(self, output, error, listing = None, checkpoints = None,
+                                                                        quiet = False):
         """
-        Submit a job to the queue manager for every possible combination of the
-        parameters of the simulation. It also writes an xml file holding the job_id from
-        the queue manager for every job submitted with the list of the parameters passed
-        and the array information.
+        Return True if the stream files of a task hold the pyGRID error identifier.
+        
+        Arguments:
+        output -- the filename of the output stream of the task
+        error -- the filename of the error stream of the task
+        
+        Keyword arguments:
+        listing -- a DirectoryListing used to skip the stream files that don't exist
+                   (default None)
+        checkpoints -- a ScanCheckpoints used to search only the bytes of the stream
+                       files written since the last scan (default None)
+        quiet -- if True the stream files that don't exist aren't reported 
+                 (default False)
+        """
+        if self._search_file_for_error(output, listing, checkpoints, quiet):
+            return True
+        # the error stream is merged with the output stream with the -j option
+        return not hasattr(self.sim.args,'j') and self._search_file_for_error(error, 
+                                                            listing, checkpoints, quiet)
+    
+    def _search_file_for_error(self, filename, listing = None, checkpoints = None,
+                                                                        quiet = False):
+        try:
+            if listing is not None and not listing.exists(filename):
+                raise IOError
+            if checkpoints is not None:
+                return checkpoints.search(filename, tail_size = self.scan_tail_size)
+            return search_file_for_error(filename, tail_size = self.scan_tail_size)
+        except IOError:
+            if not quiet:
+                print "The stream file {0} for the job does not exists".format(filename)
+        return False
+    
+    def _job_parameters(self, job_element):
         """
+        Return a list of pairs defining the name and the value of the parameters of a
+        job from the attributes of its element.
         
-        # Root element for the xml holding the information about job submission IDs
-        jobs = ET.Element(aux_file_kw['root'])
+        Arguments:
+        job_element -- an ElementTree.Element describing the job
+        """
+        prefix = filename_prefixes['parameters'] + '_'
+        return [(k[len(prefix):], v) for k, v in job_element.items() 
+                                                                if k.startswith(prefix)]
+    
+    def _resubmit_tasks(self, job_element, task_ids):
+        """
+        Resubmit some tasks of an array job as a single array job and return an
+        ElementTree.Element object describing the new job. If the TASK_IDs can be 
+        expressed with the qsub notation n-m:s the new job keeps them, otherwise it's 
+        an array job 1-k whose tasks map SGE_TASK_ID back to the original TASK_IDs, 
+        which are recorded in the element of the new job. The tasks of a job running
+        bundles of tasks are resubmitted in bundles of the same size.
         
-        array_string = getattr(self,'array',None)
+        Arguments:
+        job_element -- an ElementTree.Element describing the job
+        task_ids -- a TaskSet with the TASK_IDs of the tasks to resubmit
+        """
+        # the crashed tasks of a job that was already remapped refer to the new TASK_IDs
+        remap = job_element.get(aux_file_kw['remap'])
+        if remap is not None:
+            remap = TaskSet.parse(remap)
+            task_ids = TaskSet(remap[i - 1] for i in task_ids)
+        task_ids = TaskSet(task_ids)
         
-        params, combinations = self._generate_param_space()
-        if combinations is None:
-            job = self._submit_job(array_string = array_string)
-            jobs.append(job)
+        # the jobs of an array sweep store the values of the parameters as children
+        # so that a TASK_ID can be mapped back to its combination
+        par_elements = job_element.findall(aux_file_kw['parameter'])
+        code = None
+        parameter_list = None
+        if len(par_elements):
+            code = array_sweep_bash_code(
+                            [e.get(aux_file_kw['par_name']) for e in par_elements],
+                            [e.text.split() for e in par_elements],
+                            job_element.get(aux_file_kw['tasks']),
+                            parse_sweep_groups(job_element.get(aux_file_kw['groups'])))
         else:
-            for c in combinations:
-                job = self._submit_job(parameter_list = zip(params,c), 
-                                                            array_string = array_string)
-                jobs.append(job)
-        # write the xml file with the job IDs
-        writeXMLFile(jobs,self.auxilliaryFilename)
+            parameter_list = self._job_parameters(job_element)
         
-        # create the bash script without reference to the output/error filenames so that
-        # the user can use it
-        delattr(self.sim.args,'o')
-        delattr(self.sim.args,'e')
-        self.sim.write_qsub_script(self.bashFilename)
+        array_string = array_notation(task_ids)
+        remapped = array_string is None
+        if remapped:
+            array_string = '1-{0}'.format(len(task_ids))
+            remap_code = remap_bash_code(task_ids)
+            code = remap_code if code is None else remap_code + code
         
-        # if this job has a post processing simulation submit it to the queue
-        if hasattr(self,'post_proc'):
-            job_ids = attributes_list(jobs,aux_file_kw['id'])
-            self.post_proc.sim.args.hold_jid = ','.join(job_ids)
-            self.post_proc.submit()
+        bundle = job_element.get(aux_file_kw['bundle'])
+        if bundle is None:
+            new_job_element = self._submit_job(parameter_list, array_string, code)
+        else:
+            new_job_element = self._submit_bundles(array_string, int(bundle),
+                        job_element.get(aux_file_kw['parallel']) == '1', parameter_list,
+                        code)
+        if remapped:
+            new_job_element.set(aux_file_kw['remap'], str(task_ids))
+        for attribute in [aux_file_kw['tasks'], aux_file_kw['groups']]:
+            if job_element.get(attribute) is not None:
+                new_job_element.set(attribute, job_element.get(attribute))
+        for par_element in par_elements:
+            new_job_element.append(par_element)
+        return new_job_element
     
-    def scan_crashed_jobs(self, filepath = None):
+    @profiler.profiled('pyGRID.resubmit_crashed')
+    def resubmit_crashed(self, filepath = None, scan_first = True, workers = 1,
+                                                incremental = True, parameters = None):
         """
-        Loads the auxiliary file for this job, generate the filenames for the streams
-        and check them for runtime errors.
+        Resubmit crashed jobs to the queue manager with appropriate values of the 
+        parameters.
         
         Keyword arguments:
-        filepath -- the path of file from which to parse the list of jobs in case it has 
-                    been renamed from pyGRID default. If None the pyGRID default is used
+        filepath -- the path of the file of the job store in case it has been renamed 
+                    from pyGRID default. If None the pyGRID default is used
+        scan_first -- Flag to tell pyGRID whether it should parse the output streams of 
+                      the jobs in search of crashed ones. If False pyGRID will use the 
+                      ids of crashed jobs it finds in the auxilliary file
+        workers -- the number of threads searching the stream files at the same time
+                   when scanning them first (default 1)
+        incremental -- if True only the bytes of the stream files written since the
+                       previous scan are searched when scanning them first (default True)
+        parameters -- a dictionary with the values of the parameters of the crashed jobs
+                      to resubmit, compared as numbers if they are. Only the crashed 
+                      tasks of an array sweep whose combination has the values are 
+                      resubmitted. If None all the crashed jobs are resubmitted
+        
+        If a SchedulerState is set in the scheduler attribute the crashed tasks still in
+        the queue aren't resubmitted.
         """
-        if filepath is None:
-            filepath = self.auxilliaryFilename
+        if scan_first:
+            self.scan_crashed_jobs(filepath = filepath, workers = workers, 
+                                                            incremental = incremental)
         
-        file_string = open(filepath,'r').read()
-        root = ET.fromstring(file_string)
-        for job_element in root.findall(aux_file_kw['job']):
-            crashed, crash_indices = self.search_stream_for_error(dict(job_element.attrib))
-            if crashed:
-                crashes_element = ET.Element(aux_file_kw['crashes'])
-                if crash_indices is not None:
-                    crashes_element.text = ' '.join(str(i) for i in crash_indices)
-                job_element.append(crashes_element)
+        self._write_user_script()
         
-        writeXMLFile(root,self.auxilliaryFilename)
+        store = self._open_job_store(filepath)
+        for key, job_element in store.crashed_jobs(parameters):
+            self._resubmit_crashed_job(store, key, job_element, parameters)
         
-    def search_stream_for_error(self,job_attributes):
+        # record the ids of the jobs just submitted
+        store.close()
+    
+    def _resubmit_crashed_job(self, store, key, job_element, parameters = None):
         """
-        Search the stream files of job defined by the arguments for errors and return
-        True if any is encountered
-
+        Resubmit the crashed tasks of a job, replacing it in a job store, and return an
+        ElementTree.Element object describing the new job, or None if the tasks are 
+        still in the queue. The new job counts the resubmissions in its retries
+        attribute. If only some of the crashed tasks are resubmitted the job keeps the
+        other ones and the new job is added next to it.
+        
         Arguments:
-        job_attributes -- a dictionary of attributes defining the job
+        store -- the job store
+        key -- the key of the job
+        job_element -- an ElementTree.Element describing the job
+        
+        Keyword arguments:
+        parameters -- a dictionary with the values of the parameters of the crashed 
+                      tasks of an array sweep to resubmit. If None all of them are 
+                      resubmitted (default None)
         """
-        array_string = job_attributes.pop(aux_file_kw['array'],None)
-        keywords = ['$'+str(x) for x in job_attributes.keys()]
+        crash_element = job_element.find(aux_file_kw['crashes'])
+        crashed_indices = TaskSet.parse(crash_element.text or '')
+        kept_indices = None
+        if parameters and crashed_indices and \
+                                    job_element.find(aux_file_kw['parameter']) is not None:
+            # the tasks of an array sweep decode their combination from their TASK_ID
+            matching = TaskSet(i for i in crashed_indices 
+                                if self._task_matches(job_element, i, parameters))
+            if not matching:
+                return None
+            kept_indices = TaskSet(i for i in crashed_indices if i not in matching)
+            crashed_indices = matching
         
-        output = substitute_in_templates(self.output_filename_template,
-                                             dict(zip(keywords,job_attributes.values())))
-        error = substitute_in_templates(self.error_filename_template,
-                                             dict(zip(keywords,job_attributes.values())))
+        # the tasks still in the queue are never submitted twice
+        if self.scheduler is not None:
+            if not crashed_indices:
+                if self._scheduler_state(job_element) in queued_states:
+                    return None
+            else:
+                crashed_indices = TaskSet(i for i in crashed_indices if 
+                        self._task_state(job_element, i) not in queued_states)
+                if not crashed_indices:
+                    return None
         
-        if array_string is not None:
-            crash_indices = []
-            
-            array_indices = parse_array_notation(array_string)
-            for index in array_indices:
-                task_output = substitute_in_templates(output,{'$TASK_ID':str(index)})
-                task_error = substitute_in_templates(error,{'$TASK_ID':str(index)})
-            
-                if self._search_file_for_error(task_output):
-                    crash_indices.append(index)
-                    continue
-                
-                if not hasattr(self.sim.args,'j') and self._search_file_for_error(task_error):
-                    crash_indices.append(index)
-            
-            if len(crash_indices):
-                return True, crash_indices
+        if not crashed_indices:
+            # if there are no crashed indices it means the job wasn't an array job so
+            # it's safe to just resubmit it
+            new_job_element = self._submit_job(self._job_parameters(job_element))
         else:
-            if self._search_file_for_error(task_output):
-                return True, None
-            
-            if not hasattr(self.sim.args,'j') and self._search_file_for_error(task_error):
-                return True, None
+            new_job_element = self._resubmit_tasks(job_element, crashed_indices)
+        new_job_element.set(aux_file_kw['retries'], str(job_retries(job_element) + 1))
+        new_job_element.set(aux_file_kw['script'], self._script_hash())
+        if kept_indices:
+            store.set_crashes(key, kept_indices)
+            store.add_job(new_job_element)
+        else:
+            # substitute the old job element with the new one
+            store.replace_job(key, [new_job_element])
+        return new_job_element
+    
+    def _task_matches(self, job_element, index, parameters):
+        """
+        Return True if the values of the parameters of a task of a job are equal to the
+        given ones, see parameter_values_equal.
         
-        return False, None
+        Arguments:
+        job_element -- an ElementTree.Element describing the job
+        index -- the TASK_ID of the task
+        parameters -- a dictionary with the values of the parameters
+        """
+        values = dict(self._task_run(job_element, index)[0])
+        return all(name in values and parameter_values_equal(values[name], value)
+                                                for name, value in parameters.items())
     
-    def _search_file_for_error(self, filename):
-        try:
-            with open(filename, "r") as output_file:
-                output_string = output_file.read()
-                if pyGRID_error_identifier in output_string:
-                    return True
-        except IOError:
-            print "The stream file {0} for the job does not exists".format(filename)
-        return False
+    def _hold_post_processing(self, job_ids):
+        """
+        Make the post processing jobs of the simulation, if any were submitted, wait for
+        the jobs given instead of the ones they were submitted after.
+        
+        Arguments:
+        job_ids -- a list with the JOB_IDs of the jobs to wait for
+        """
+        if not hasattr(self, 'post_proc'):
+            return
+        store = self.post_proc._open_job_store()
+        if not os.path.exists(store.filename):
+            return
+        post_proc_ids = [job.get(aux_file_kw['id']) for key, job in store.jobs()]
+        store.close()
+        if len(post_proc_ids):
+            subprocess.call(['qalter', '-hold_jid', ','.join(job_ids)] + post_proc_ids)
     
-    def resubmit_crashed(self, filepath = None, scan_first = True):
+    def supervise(self, poll_interval = supervisor_poll_interval, 
+                  max_retries = supervisor_max_retries, backoff = supervisor_backoff, 
+                  workers = 1, incremental = True):
         """
-        Resubmit crashed jobs to the queue manager with appropriate values of the 
-        parameters.
+        Monitor the jobs of the simulation until they leave the queue, resubmitting the
+        tasks that crash, then monitor the post processing jobs in the same way. The
+        job store and the state of the stream files are loaded once and kept in memory,
+        and the scheduler is asked for the state of all the jobs once per poll. Return a
+        list with the ElementTree.Element objects of the crashed jobs given up.
         
         Keyword arguments:
-        filepath -- the path of file from which to parse the list of jobs in case it has 
-                    been renamed from pyGRID default. If None the pyGRID default is used
-        scan_first -- Flag to tell pyGRID whether it should parse the output streams of 
-                      the jobs in search of crashed ones. If False pyGRID will use the 
-                      ids of crashed jobs it finds in the auxilliary file
+        poll_interval -- the number of seconds between two polls 
+                         (default supervisor_poll_interval)
+        max_retries -- the number of times the tasks of a job are resubmitted before
+                       giving up (default supervisor_max_retries)
+        backoff -- the number of seconds a job resubmitted once waits before its crashed
+                   tasks are resubmitted again. The time doubles at every resubmission
+                   (default supervisor_backoff)
+        workers -- the number of threads searching the stream files at the same time
+                   (default 1)
+        incremental -- if True only the bytes of the stream files written since the
+                       previous poll are searched (default True)
         """
-        if scan_first:
-            self.scan_crashed_jobs(filepath = filepath)
+        if self.scheduler is None:
+            self.scheduler = SchedulerState(ttl = poll_interval)
+        store = self._open_job_store()
+        checkpoints = None
+        checkpoints_filename = self._checkpoints_filename(store)
+        if incremental:
+            checkpoints = ScanCheckpoints(checkpoints_filename)
+        self._write_user_script()
         
-        self.sim.write_qsub_script(self.bashFilename)
+        # the time after which the crashed tasks of a job can be resubmitted
+        resubmission_times = dict()
+        given_up = []
+        try:
+            while True:
+                self.scheduler.invalidate()
+                self._scan_job_store(store, workers, checkpoints)
+                
+                waiting = False
+                resubmitted = False
+                given_up = []
+                for key, job_element in store.crashed_jobs():
+                    retries = job_retries(job_element)
+                    if retries >= max_retries:
+                        given_up.append(job_element)
+                        continue
+                    delay = backoff * 2 ** (retries - 1) if retries else 0
+                    now = time.time()
+                    if now < resubmission_times.setdefault(key, now + delay):
+                        waiting = True
+                        continue
+                    if self._resubmit_crashed_job(store, key, job_element) is not None:
+                        resubmitted = True
+                    waiting = True
+                
+                store.save()
+                if checkpoints is not None:
+                    checkpoints.save(checkpoints_filename)
+                jobs = store.jobs()
+                if resubmitted:
+                    self._hold_post_processing([job.get(aux_file_kw['id']) 
+                                                                for key, job in jobs])
+                
+                if not waiting and not any(self.scheduler.in_queue(
+                                job.get(aux_file_kw['id'])) for key, job in jobs):
+                    break
+                time.sleep(poll_interval)
+        finally:
+            store.close()
         
-        if filepath is None:
-            filepath = self.auxilliaryFilename
-        file_string = open(filepath,'r').read()
-        root = ET.fromstring(file_string)
-        for job_element in root.findall(aux_file_kw['job']):
-            crash_element = job_element.find(aux_file_kw['crashes'])
-            if crash_element is None:
-                continue
-            
-            crashed_indices = crash_element.text.split()
-            
-            parameters = job_element.attrib
-            parameters.pop(aux_file_kw['name'],None)
-            parameters.pop(aux_file_kw['id'],None)
-            parameters.pop(aux_file_kw['array'],None)
+        for job_element in given_up:
+            print "Giving up job {0} {1} after {2} resubmissions".format(
+                                        job_element.get(aux_file_kw['name']), 
+                                        job_element.get(aux_file_kw['id']), max_retries)
+        
+        if hasattr(self, 'post_proc'):
+            self.post_proc.scheduler = self.scheduler
+            given_up.extend(self.post_proc.supervise(poll_interval, max_retries, backoff,
+                                                                workers, incremental))
+        return given_up
+
+
+class SimulationDefinitions:
+    """
+    The simulations defined in an xml file, with the inherit and post_processing 
+    attributes resolved once for the whole file. The simulations form a graph without
+    cycles, every simulation depending on the one it inherits from and on its post
+    processing job. Every simulation is resolved only once, as a copy of the simulation
+    it inherits from with its own element parsed over it. The resolved simulations are
+    shared and never modified: build returns copies of them.
+    """
+
+    def __init__(self, root):
+        """
+        Arguments:
+        root -- the root ElementTree.Element of the xml file
+        """
+        # the first simulation element of every name, as found by find_sim_element
+        self.elements = dict()
+        for sim_element in root.findall(grid_file_kw['sim_element']):
+            self.elements.setdefault(sim_element.get(grid_file_kw['sim_name']), 
+                                                                        sim_element)
+        self.resolved = dict()
+        # the names of the simulations being resolved, to detect the cycles
+        self.resolving = []
+
+    def build(self, sim_element):
+        """
+        Return a new pyGRID object for a simulation element of the file.
+
+        Arguments:
+        sim_element -- the ElementTree.Element of the simulation
+        """
+        name = sim_element.get(grid_file_kw['sim_name'])
+        if self.elements.get(name) is sim_element:
+            return self.resolve(name).copy()
+        # a simulation hidden by another one with the same name isn't memoised
+        return self._resolve_element(sim_element).copy()
+
+    def resolve(self, name):
+        """
+        Return the shared pyGRID object of a simulation, which must not be modified.
+        Raise InvalidSimulatioNameError if the file defines no simulation with this
+        name and InheritanceCycleError if the simulation depends on itself.
+
+        Arguments:
+        name -- the name of the simulation
+        """
+        gridJob = self.resolved.get(name)
+        if gridJob is None:
+            sim_element = self.elements.get(name)
+            if sim_element is None:
+                raise InvalidSimulatioNameError(name)
+            gridJob = self.resolved[name] = self._resolve_element(sim_element)
+        return gridJob
+
+    def _resolve_element(self, sim_element):
+        name = sim_element.get(grid_file_kw['sim_name'])
+        if name in self.resolving:
+            raise InheritanceCycleError(self.resolving[self.resolving.index(name):] 
+                                                                            + [name])
+        self.resolving.append(name)
+        try:
+            inherit_from = sim_element.get(grid_file_kw['par_inherit'])
+            if inherit_from is not None:
+                # the options of the parent are overwritten by the ones of the element
+                gridJob = self.resolve(inherit_from).copy()
+            else:
+                gridJob = pyGRID()
+            gridJob._parse_element(sim_element)
             
-            if len(crashed_indices) == 0:
-                # if there are no crashed indices it means the job wasn't an array job so
-                # it's safe to just resubmit it
-                new_job_element = self._submit_job(zip(parameters.keys(),
-                                                                parameters.values()))
-                # substitute the old job element with the new one
-                root.remove(job_element)
-                root.append(new_job_element)
+            post_proc_job = sim_element.get(grid_file_kw['post_proc'])
+            if post_proc_job is not None:
+                gridJob.post_proc = self.resolve(post_proc_job)
+        finally:
+            self.resolving.pop()
+        return gridJob
+
+
+class DefinitionCache:
+    """
+    Cache of the simulations compiled from an xml file. The pyGRID objects of the
+    simulations of the file, with their options, parameters, code and post processing
+    jobs resolved, are pickled in a directory of the cache directory, which is reused 
+    as long as the path, the modification time and the hash of the content of the xml
+    file match. Otherwise the simulations are built again. Every simulation is pickled
+    in a file of its own, next to an index of the simulations of the file, so that 
+    loading or building one doesn't depend on the number of simulations.
+    """
+
+    def __init__(self, directory = None):
+        """
+        Keyword arguments:
+        directory -- the directory holding the cache files. If None the pyGRID default
+                     is used (default None)
+        """
+        self.directory = directory or definition_cache_dir
+
+    def _cache_filename(self, path, entry):
+        """
+        Return the name of a cache file of an xml file.
+
+        Arguments:
+        path -- the absolute path of the xml file
+        entry -- 'index' for the index of the simulations of the file, or the name of
+                 the entry of a simulation, see _entry
+        """
+        return os.path.join(self.directory, hashlib.sha1(path).hexdigest(), 
+                                                                    entry + '.pickle')
+
+    @staticmethod
+    def _entry(name, position = None):
+        """
+        Return the name of the entry of a simulation in the cache. A simulation hidden
+        by another one with the same name, see find_sim_element, is told by its 
+        position in the file.
+        """
+        if position is not None:
+            name = '{0}\0{1}'.format(name, position)
+        return hashlib.sha1(name).hexdigest()
+
+    def _read(self, path, entry, key):
+        """
+        Return the object pickled in a cache file of an xml file. Raise an exception if
+        the file is missing, truncated or outdated.
+        """
+        with open(self._cache_filename(path, entry), 'rb') as cache_file:
+            if pickle.load(cache_file) != key:
+                raise ValueError(entry)
+            return pickle.load(cache_file)
+
+    @profiler.profiled('DefinitionCache.load')
+    def load(self, filename, names = None):
+        """
+        Return a list of pairs holding the name of every simulation of an xml file and
+        its pyGRID object, None for the simulations that can't be built, in the order
+        they appear in the file, or in the order of the names given. The simulations
+        are read from the cache if it is up to date and built and saved to the cache 
+        otherwise. Only the simulations with the names given, and the ones they depend
+        on, are parsed from the file and built.
+
+        Arguments:
+        filename -- the name of the xml file
+
+        Keyword arguments:
+        names -- a list with the names of the simulations to return. If None all the
+                 simulations are returned (default None)
+        """
+        path = os.path.abspath(filename)
+        with open(path, 'rb') as xml_file:
+            content = xml_file.read()
+        key = dict(version = definition_cache_version, path = path,
+                   mtime = os.stat(path).st_mtime, 
+                   hash = hashlib.sha1(content).hexdigest())
+        
+        try:
+            if names is None:
+                entries = self._read(path, 'index', key)
             else:
-                root.remove(job_element)
-                for i in crashed_indices:
-                    new_job_element = self._submit_job(zip(parameters.keys(),
-                                                                parameters.values()),i)
-                    root.append(new_job_element) 
+                entries = [(name, self._entry(name)) for name in names]
+            simulations = [(name, self._read(path, entry, key)) 
+                                                        for name, entry in entries]
+            return [(name, data and pickle.loads(data)) for name, data in simulations]
+        except Exception:
+            # a missing, truncated or outdated cache file is rebuilt
+            pass
+        
+        if names is None:
+            simulations = self.build(cET.fromstring(content))
+        else:
+            with profiler.span('load_sim_elements'):
+                root = load_sim_elements(path, names)
+            simulations = self.build(root, names)
+        self.save(path, key, simulations, index = names is None)
+        return [(name, gridJob) for name, gridJob, entry in simulations]
+
+    @profiler.profiled('DefinitionCache.build')
+    def build(self, root, names = None):
+        """
+        Return a list of triples holding the name of every simulation defined in the
+        root element, its pyGRID object, None for the simulations that can't be built,
+        and its entry in the cache.
+
+        Arguments:
+        root -- the root ElementTree.Element of the xml file
+
+        Keyword arguments:
+        names -- a list with the names of the simulations to build. The names the 
+                 root element doesn't define are skipped. If None all the simulations
+                 are built (default None)
+        """
+        definitions = SimulationDefinitions(root)
+        if names is None:
+            sim_elements = root.findall(grid_file_kw['sim_element'])
+        else:
+            sim_elements = [definitions.elements[name] for name in names 
+                                                        if name in definitions.elements]
+        simulations = []
+        for position, sim_element in enumerate(sim_elements):
+            name = sim_element.get(grid_file_kw['sim_name'])
+            try:
+                gridJob = definitions.build(sim_element)
+            except Exception:
+                # the error is raised when the simulation is requested without the cache
+                gridJob = None
+            hidden = definitions.elements[name] is not sim_element
+            simulations.append((name, gridJob, 
+                                self._entry(name, position if hidden else None)))
+        return simulations
+
+    def save(self, path, key, simulations, index = True):
+        """
+        Write the simulations of an xml file to the cache, doing nothing if the cache
+        directory can't be written.
+
+        Arguments:
+        path -- the absolute path of the xml file
+        key -- a dictionary identifying the xml file the simulations were built from
+        simulations -- a list of triples holding the names of the simulations, their
+                       pyGRID objects and their entries, see build
+
+        Keyword arguments:
+        index -- if True the simulations are all the ones of the file and their index
+                 is written too (default True)
+        """
+        files = [(entry, gridJob and pickle.dumps(gridJob, pickle.HIGHEST_PROTOCOL))
+                                                for name, gridJob, entry in simulations]
+        if index:
+            files.append(('index', [(name, entry) for name, gridJob, entry 
+                                                                    in simulations]))
+        try:
+            directory = os.path.dirname(self._cache_filename(path, 'index'))
+            if not os.path.isdir(directory):
+                os.makedirs(directory)
+            for entry, data in files:
+                cache_filename = self._cache_filename(path, entry)
+                temporary_filename = '{0}.{1}.tmp'.format(cache_filename, os.getpid())
+                with open(temporary_filename, 'wb') as cache_file:
+                    pickle.dump(key, cache_file, pickle.HIGHEST_PROTOCOL)
+                    pickle.dump(data, cache_file, pickle.HIGHEST_PROTOCOL)
+                os.rename(temporary_filename, cache_filename)
+        except (IOError, OSError):
+            pass
+
+
+def cached_simulations(args):
+    """
+    Return the list of the pyGRID objects of the simulations requested from the command
+    line read from the definition cache, or None if any of them can't be built, in
+    which case the simulations are built from the xml file to report the error.
+
+    Arguments:
+    args -- the arguments parsed from the command line
+    """
+    cache = DefinitionCache(args.cache_dir)
+    if args.simulation:
+        simulations = cache.load(args.file, names = [args.simulation])
+        for name, gridJob in simulations:
+            if name == args.simulation:
+                return None if gridJob is None else [gridJob]
+        return None
+    if args.all:
+        gridJobs = [gridJob for name, gridJob in cache.load(args.file)]
+        return None if None in gridJobs else gridJobs
+    return []
+
+
+def parsed_simulations(args):
+    """
+    Generate the pyGRID objects of the simulations requested from the command line,
+    parsing the xml file.
+
+    Arguments:
+    args -- the arguments parsed from the command line
+    """
+    if args.simulation:
+        # if the user requested a particular job only its element and the ones it 
+        # depends on are loaded
+        with profiler.span('load_sim_elements'):
+            root = load_sim_elements(args.file, [args.simulation])
+        definitions = SimulationDefinitions(root)
+        matching_sim_element = definitions.elements.get(args.simulation)
+        if matching_sim_element is None:
+            raise InvalidSimulatioNameError(args.simulation)
+        yield definitions.build(matching_sim_element)
+    if args.all:
+        # read the xml file and parse it
+        with profiler.span('ET.parse'):
+            tree = cET.parse(args.file)
+        root = tree.getroot()
+        definitions = SimulationDefinitions(root)
+        # we create job objects for every simulation in the xml file, resolving every
+        # simulation inherited from only once
+        for sim_element in root.findall(grid_file_kw['sim_element']):
+            yield definitions.build(sim_element)
+
+
+def run_actions(gridJob, args, scheduler = None):
+    """
+    Perform the actions requested from the command line on a simulation.
+
+    Arguments:
+    gridJob -- the pyGRID object of the simulation
+    args -- the arguments parsed from the command line
+
+    Keyword arguments:
+    scheduler -- the SchedulerState shared by the simulations (default None)
+    """
+    gridJob.scan_tail_size = args.scan_tail
+    gridJob.job_store = args.store
+    gridJob.scheduler = scheduler
+    if args.submit:
+        gridJob.submit(array_sweep = args.array_sweep, workers = args.jobs,
+                       bundle = args.bundle, parallel = args.bundle_parallel,
+                       force = args.force)
+    if args.write:
+        gridJob.sim.write_qsub_script(gridJob.bashFilename)
+    if args.crashes:
+        gridJob.scan_crashed_jobs(workers = args.jobs, incremental = not args.full_scan)
+    if args.resubmit:
+        parameters = dict(w.split('=', 1) for w in args.where) if args.where else None
+        gridJob.resubmit_crashed(workers = args.jobs, incremental = not args.full_scan,
+                                                                parameters = parameters)
+    if args.import_grid:
+        store = gridJob._open_job_store()
+        import_grid_file(gridJob.auxilliaryFilename, store)
+        store.close()
+    if args.export_grid:
+        store = gridJob._open_job_store()
+        export_grid_file(store, gridJob.auxilliaryFilename)
+        store.close()
+    if args.status:
+        gridJob.status()
+    if args.supervise:
+        gridJob.supervise(poll_interval = args.poll_interval, 
+                          max_retries = args.max_retries, backoff = args.backoff,
+                          workers = args.jobs, incremental = not args.full_scan)
 
 
 def main():
@@ -617,6 +4126,29 @@ def main():
     action_group.add_argument("-b","--submit",action='store_true',help="If submit is specified then pyGRID will submit the job otherwise it will simply create the bash script")
     action_group.add_argument("-c","--crashes",action='store_true',help="pyGRID will scan the stream files for a job and determine the ones that crashed")
     action_group.add_argument("-r","--resubmit",action='store_true',help="pyGRID will resubmit the crashed jobs parsed from stream files")
+    action_group.add_argument("--import-grid",action='store_true',help="pyGRID will copy the jobs in the .grid file of a simulation to the job store chosen with --store")
+    action_group.add_argument("--export-grid",action='store_true',help="pyGRID will write the jobs in the job store chosen with --store to the .grid file of a simulation")
+    action_group.add_argument("--supervise",action='store_true',help="pyGRID will monitor the jobs submitted, resubmitting the crashed tasks, until they and the post processing jobs leave the queue")
+    action_group.add_argument("--status",action='store_true',help="pyGRID will print the state in the scheduler of the tasks of the jobs submitted")
+
+    parser.add_argument("-j","--jobs",type=int,default=1,help="The number of qsub processes pyGRID runs at the same time when submitting a job for every combination of the parameters, or the number of threads searching the stream files when scanning for crashed jobs")
+    parser.add_argument("--scan-tail",type=int,metavar="BYTES",help="Search only the last BYTES bytes of the stream files for errors when scanning for crashed jobs")
+    parser.add_argument("--full-scan",action='store_true',help="Search the whole stream files for errors instead of the bytes written since the last scan for crashed jobs")
+    parser.add_argument("--store",choices=sorted(job_stores.keys()),default='xml',help="The job store holding the jobs submitted: the .grid xml file or an indexed SQLite database")
+    parser.add_argument("--where",action='append',metavar="NAME=VALUE",help="Resubmit only the crashed jobs, or tasks of an array sweep, with the given value of a parameter, compared as a number if it is one. Can be repeated")
+    parser.add_argument("--query-scheduler",action='store_true',help="Ask the scheduler for the state of the jobs when scanning for crashed jobs: the tasks in the queue are skipped and the ones that failed or are in error crashed. With --submit the combinations completed or still in the queue are skipped")
+    parser.add_argument("--scheduler-ttl",type=float,default=scheduler_state_ttl,metavar="SECONDS",help="The number of seconds the state of the jobs read from the scheduler with qstat and qacct is reused")
+    parser.add_argument("--poll-interval",type=float,default=supervisor_poll_interval,metavar="SECONDS",help="The number of seconds between two polls of the jobs with --supervise")
+    parser.add_argument("--max-retries",type=int,default=supervisor_max_retries,help="The number of times --supervise resubmits the crashed tasks of a job before giving up")
+    parser.add_argument("--backoff",type=float,default=supervisor_backoff,metavar="SECONDS",help="The number of seconds --supervise waits before resubmitting again the crashed tasks of a job resubmitted once. The time doubles at every resubmission")
+    parser.add_argument("--no-cache",action='store_true',help="Build the simulations from the xml file instead of reading them from the cache of the simulations compiled")
+    parser.add_argument("--cache-dir",metavar="DIR",help="The directory holding the cache of the simulations compiled from the xml files. ~/.cache/pyGRID by default")
+    parser.add_argument("--profile",action='store_true',help="Print the count, the total and the p50/p99 duration of the phases of the run")
+    parser.add_argument("--trace",metavar="FILE",help="Write the phases of the run to FILE as a Chrome trace JSON file, see chrome://tracing")
+    parser.add_argument("--array-sweep",action='store_true',help="Submit every combination of the parameters as a single array job. Each task decodes the values of its parameters from SGE_TASK_ID")
+    parser.add_argument("--bundle",type=int,default=1,metavar="K",help="Run K combinations of the parameters, or K tasks of an array job, in every task submitted. The combinations are submitted as an array sweep and the crashes are reported per combination")
+    parser.add_argument("--bundle-parallel",action='store_true',help="Run the combinations bundled in a task at the same time on the NSLOTS slots it requested with -pe instead of one after the other")
+    parser.add_argument("--force",action='store_true',help="Submit every combination of the parameters, including the ones that already completed without errors")
 
     if len(sys.argv) < 2:
         parser.print_help()
@@ -624,35 +4156,36 @@ def main():
 
     # parse the arguments from the command line
     args = parser.parse_args()
+    
+    if args.profile or args.trace:
+        profiler.enable(trace = args.trace is not None)
+    try:
+        with profiler.span('main'):
+            run_simulations(args)
+    finally:
+        if args.profile:
+            profiler.print_summary()
+        if args.trace:
+            profiler.write_chrome_trace(args.trace)
+
+
+def run_simulations(args):
+    """
+    Perform the actions requested from the command line on the simulations.
 
-    # read the xml file, parse it and create the parent map 
-    tree = ET.parse(args.file)
-    root = tree.getroot()
-    parent_map = dict((c, p) for p in root.getiterator() for c in p)
+    Arguments:
+    args -- the arguments parsed from the command line
+    """
+    gridJobs = None
+    if not args.no_cache:
+        gridJobs = cached_simulations(args)
+    if gridJobs is None:
+        gridJobs = parsed_simulations(args)
     
-    if args.simulation:
-        # if the user requested a particular job we create it and submit it
-        matching_sim_element = find_sim_element(root,args.simulation)
-        if matching_sim_element is None:
-            raise InvalidSimulatioNameError(args.simulation)
-        gridJob = pyGRID(sim_element = matching_sim_element, parent_map = parent_map)
-        if args.submit:
-            gridJob.submit()
-        if args.write:
-            gridJob.sim.write_qsub_script(gridJob.bashFilename)
-        if args.crashes:
-            gridJob.scan_crashed_jobs()
-        if args.resubmit:
-            gridJob.resubmit_crashed()
-    if args.all:
-        # we create job objects for every simulation in the xml file
-        for sim_element in root.findall(grid_file_kw['sim_element']):
-            gridJob = pyGRID(sim_element = sim_element, parent_map = parent_map)
-            if args.submit:
-                gridJob.submit()
-            if args.write:
-                gridJob.sim.write_qsub_script(gridJob.bashFilename)
-            if args.crashes:
-                gridJob.scan_crashed_jobs()
-            if args.resubmit:
-                gridJob.resubmit_crashed()
\ No newline at end of file
+    # the state of the jobs in the scheduler is read once for all the simulations
+    scheduler = None
+    if args.status or args.query_scheduler or args.supervise:
+        scheduler = SchedulerState(ttl = args.scheduler_ttl)
+    
+    for gridJob in gridJobs:
+        run_actions(gridJob, args, scheduler)
@@ -0,0 +1,196 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""A profiler recording the time spent in the phases of a pyGRID run.
+
+The phases are named spans, opened with the profiled decorator or the span context
+manager of the shared profiler object. The profiler is disabled by default, and then
+a span costs a single test. Once enabled it records the duration of every span,
+prints a summary with the count, the total and the p50/p99 latency of every phase and
+can export the spans as a Chrome trace (see chrome://tracing).
+"""
+
+import functools
+import json
+import math
+import os
+import sys
+import threading
+import time
+
+
+def percentile(durations, fraction):
+    """
+    Return the percentile of a sorted list of durations with the nearest rank method.
+
+    Arguments:
+    durations -- a sorted list of durations
+    fraction -- the fraction of the durations below the percentile, between 0 and 1
+    """
+    if not durations:
+        return 0.
+    rank = max(int(math.ceil(fraction * len(durations))) - 1, 0)
+    return durations[min(rank, len(durations) - 1)]
+
+
+class PhaseProfiler:
+    """
+    Record the duration of named spans of a run. The profiler can be shared between
+    threads.
+    """
+
+    def __init__(self):
+        self.enabled = False
+        self.tracing = False
+        self.lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        """
+        Forget the spans recorded.
+        """
+        self.durations = dict()
+        self.events = []
+        self.origin = time.time()
+
+    def enable(self, trace = False):
+        """
+        Start recording the spans.
+
+        Keyword arguments:
+        trace -- if True every span is also kept for the Chrome trace (default False)
+        """
+        self.enabled = True
+        self.tracing = trace
+
+    def disable(self):
+        """
+        Stop recording the spans.
+        """
+        self.enabled = False
+        self.tracing = False
+
+    def record(self, name, start, end):
+        """
+        Record a span.
+
+        Arguments:
+        name -- the name of the phase
+        start -- the time the span started, as returned by time.time
+        end -- the time the span ended
+        """
+        with self.lock:
+            self.durations.setdefault(name, []).append(end - start)
+            if self.tracing:
+                self.events.append((name, start, end, threading.current_thread().ident))
+
+    def span(self, name):
+        """
+        Return a context manager recording a span of the named phase.
+
+        Arguments:
+        name -- the name of the phase
+        """
+        if not self.enabled:
+            return null_span
+        return Span(self, name)
+
+    def profiled(self, name):
+        """
+        Return a decorator recording a span of the named phase for every call of a
+        function.
+
+        Arguments:
+        name -- the name of the phase
+        """
+        def decorator(function):
+            @functools.wraps(function)
+            def wrapper(*args, **kwargs):
+                if not self.enabled:
+                    return function(*args, **kwargs)
+                start = time.time()
+                try:
+                    return function(*args, **kwargs)
+                finally:
+                    self.record(name, start, time.time())
+            return wrapper
+        return decorator
+
+    def summary(self):
+        """
+        Return a list of tuples holding the name, the count, the total, the p50 and the
+        p99 duration in seconds of every phase, sorted by decreasing total.
+        """
+        rows = []
+        with self.lock:
+            for name, durations in self.durations.items():
+                durations = sorted(durations)
+                rows.append((name, len(durations), sum(durations),
+                             percentile(durations, 0.5), percentile(durations, 0.99)))
+        return sorted(rows, key = lambda row: -row[2])
+
+    def print_summary(self, stream = None):
+        """
+        Print a table summarising the phases recorded.
+
+        Keyword arguments:
+        stream -- the file the table is printed to. If None sys.stderr (default None)
+        """
+        stream = stream or sys.stderr
+        row_format = '{0:<40} {1:>9} {2:>12} {3:>12} {4:>12}\n'
+        stream.write(row_format.format('phase', 'count', 'total (s)', 'p50 (ms)',
+                                                                        'p99 (ms)'))
+        for name, count, total, p50, p99 in self.summary():
+            stream.write(row_format.format(name, count, '{0:.4f}'.format(total),
+                            '{0:.3f}'.format(p50 * 1e3), '{0:.3f}'.format(p99 * 1e3)))
+
+    def write_chrome_trace(self, filename):
+        """
+        Write the spans recorded while tracing as a Chrome trace JSON file.
+
+        Arguments:
+        filename -- the name of the JSON file
+        """
+        pid = os.getpid()
+        with self.lock:
+            events = [dict(name = name, ph = 'X', pid = pid, tid = tid,
+                           ts = (start - self.origin) * 1e6, dur = (end - start) * 1e6)
+                                                for name, start, end, tid in self.events]
+        with open(filename, 'w') as trace_file:
+            json.dump(dict(traceEvents = events, displayTimeUnit = 'ms'), trace_file)
+
+
+class Span:
+    """
+    Context manager recording a span of a phase in a PhaseProfiler.
+    """
+
+    def __init__(self, profiler, name):
+        self.profiler = profiler
+        self.name = name
+
+    def __enter__(self):
+        self.start = time.time()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.profiler.record(self.name, self.start, time.time())
+        return False
+
+
+class NullSpan:
+    """
+    Context manager doing nothing, used while the profiler is disabled.
+    """
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        return False
+
+
+null_span = NullSpan()
+
+# the profiler shared by the pyGRID modules
+profiler = PhaseProfiler()
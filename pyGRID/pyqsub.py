@@ -9,162 +9,195 @@ to the command line or to a script file.
 """
 
 import argparse
+import copy
 from itertools import chain, combinations
+from pyprofiler import profiler
 
 def all_string_combinations(ss):
   lists = chain(*map(lambda x: combinations(ss, x), range(1, len(ss)+1)))
   return [''.join(x) for x in lists]
 
+sge_program_names = ['qsub', 'qrsh', 'qsh', 'qlogin', 'qalter', 'qresub', 'qmake']
+
+def build_parser(prog = 'qsub'):
+    """Build the parser of the options of a Grid Engine executable"""
+    assert prog in sge_program_names, 'Unsupported SGE command: '+prog+'not one of '+', '.join(sge_program_names)
+
+    #SUPPRESS = If not specified, do not generate variable in namespace
+    parser = argparse.ArgumentParser(
+       description = 'Options to pass to qsub', 
+       formatter_class=argparse.RawTextHelpFormatter, 
+       argument_default=argparse.SUPPRESS, 
+       epilog = """The following is scraped from the qsub manpage for GE 6.2u5 dated 2009/12/01 12:24:06"""
+       )
+
+    #BEGIN SGE OPTION PARSER
+    #BUG if help still begins with a line with -option, have cosmetic bug where metavar cannot be specified correctly
+    yesno = ['y', 'yes', 'n', 'no']
+    
+    if prog in ['qsub', 'qrsh', 'qsh', 'qlogin']:
+        parser.add_argument('-@', metavar = 'optionfile')
+    if prog in ['qsub', 'qalter']:
+        parser.add_argument('-a', metavar = 'date_time')
+    if prog in ['qsub', 'qsh', 'qrsh', 'qlogin', 'qalter']:
+        parser.add_argument('-ac', metavar = 'variable[=value]', action = 'append')
+    if prog in ['qsub', 'qalter', 'qrsh', 'qsh', 'qlogin']:
+        parser.add_argument('-ar', metavar = 'ar_id')
+    if prog in ['qsub', 'qsh', 'qrsh', 'qlogin', 'qalter']:
+        parser.add_argument('-A', metavar = 'account_string')
+    parser.add_argument('-binding', nargs='+', metavar=('binding_instance', 'binding_strategy'))
+    if prog in ['qsub', 'qrsh']:
+        parser.add_argument('-b', choices = yesno)
+    if prog in ['qsub', 'qalter']:
+        parser.add_argument('-c', metavar = 'occasion_specifier')
+    if prog in ['qsub', 'qalter']:
+        parser.add_argument('-ckpt', metavar = 'ckpt_name')
+    if prog in ['qsub', 'qsh', 'qrsh', 'qlogin']:
+        parser.add_argument('-clear', action = 'store_true')
+    if prog in ['qsub', 'qsh', 'qrsh', 'qalter']:
+        parser.add_argument('-cwd', action = 'store_true')
+    if prog in ['qsub', 'qrsh']:
+        parser.add_argument('-C', metavar = 'prefix_string')
+    if prog in ['qsub', 'qsh', 'qrsh', 'qlogin', 'qalter']:
+        parser.add_argument('-dc', action = 'append', metavar = 'variable')
+    if prog in ['qsh', 'qrsh']:
+        parser.add_argument('-display', metavar = 'display_specifier')
+    if prog in ['qsub', 'qsh', 'qrsh', 'qlogin', 'qalter']:
+        parser.add_argument('-dl', metavar = 'date_time')
+    if prog in ['qsub', 'qsh', 'qrsh', 'qlogin', 'qalter']:
+        parser.add_argument('-e', metavar = 'path')
+    if prog in ['qsub', 'qsh', 'qrsh', 'qlogin', 'qalter']:
+        parser.add_argument('-hard', action = 'store_true')
+    if prog in ['qsub', 'qrsh', 'qalter', 'qresub']:
+        #NOTE in SGE this is -h, here I have renamed it to -hold
+        #TODO check if multiple holds are parsed correctly
+        parser.add_argument('-hold', choices = 'usonUOS')
+    if prog in ['qsub', 'qrsh', 'qalter']:
+        parser.add_argument('-hold_jid', nargs = '+', metavar = 'wc_job_list')
+    if prog in ['qsub', 'qrsh', 'qalter']:
+        parser.add_argument('-hold_jid_ad', nargs = '+', metavar = 'wc_job_list')
+    if prog in ['qsub', 'qalter']:
+        parser.add_argument('-i', metavar = 'file')
+    if prog in ['qrsh', 'qmake']:
+        parser.add_argument('-inherit', action = 'store_true')
+    if prog in ['qsub', 'qsh', 'qrsh', 'qlogin', 'qalter']:
+        parser.add_argument('-j', choices = yesno)
+    if prog in ['qsub', 'qsh', 'qrsh', 'qlogin', 'qalter']:
+        parser.add_argument('-js', nargs='?', type = int, metavar = 'job_share')
+    if prog in ['qsub', 'qsh', 'qrsh', 'qlogin']:
+        parser.add_argument('-jsv', metavar = 'jsv_url')
+    if prog in ['qsub', 'qsh', 'qrsh', 'qlogin', 'qalter']:
+        parser.add_argument('-l', metavar = 'keywords')
+    if prog in ['qsub', 'qsh', 'qrsh', 'qlogin', 'qalter']:
+        #TODO check if multiple arguments are parsed correctly
+        choices = all_string_combinations('beasn')
+        parser.add_argument('-m', nargs='+', choices = choices)
+    if prog in ['qsub', 'qsh', 'qrsh', 'qlogin', 'qalter']:
+        parser.add_argument('-M', metavar = 'user[@host]')
+    if prog in ['qsub', 'qsh', 'qrsh', 'qlogin', 'qalter']:
+        parser.add_argument('-masterq', nargs='+', metavar='wc_queue_list')
+    if prog in ['qsub', 'qrsh', 'qalter']:
+        parser.add_argument('-notify', action = 'store_true')
+    if prog in ['qsub', 'qsh', 'qrsh', 'qlogin']:
+        parser.add_argument('-now', choices = yesno)
+    if prog in ['qsub', 'qsh', 'qrsh', 'qlogin', 'qalter']:
+        parser.add_argument('-N', metavar = 'name')
+    if prog in ['qrsh']:
+        parser.add_argument('-noshell', action = 'store_true')
+    if prog in ['qrsh']:
+        parser.add_argument('-nostdin', action = 'store_true')
+    if prog in ['qsub', 'qsh', 'qrsh', 'qlogin', 'qalter']:
+        parser.add_argument('-o', metavar = 'path')
+    if prog in ['qalter']:
+        parser.add_argument('-ot', metavar = 'override_tickets')
+    if prog in ['qsub', 'qsh', 'qrsh', 'qlogin', 'qalter']:
+        parser.add_argument('-P', metavar = 'project_name')
+    if prog in ['qsub', 'qsh', 'qrsh', 'qlogin', 'qalter']:
+        parser.add_argument('-p', metavar = 'priority')
+    if prog in ['qsub', 'qsh', 'qrsh', 'qlogin', 'qalter']:
+        parser.add_argument('-pe', nargs = 2, metavar = ('parallel_environment', 'n'))
+    if prog in ['qrsh', 'qlogin']:
+        parser.add_argument('-pty', choices = yesno)
+    if prog in ['qsub', 'qrsh', 'qsh', 'qlogin', 'qalter']:
+        parser.add_argument('-q', nargs = '+', metavar = 'wc_queue_list')
+    if prog in ['qsub', 'qrsh', 'qsh', 'qlogin', 'qalter']:
+        parser.add_argument('-R', choices = yesno)
+    if prog in ['qsub', 'qalter']:
+        parser.add_argument('-r', choices = yesno)
+    if prog in ['qsub', 'qrsh', 'qsh', 'qlogin', 'qalter']:
+        parser.add_argument('-sc', action='append', metavar = 'variable[=value]')
+    if prog in ['qsub']:
+        parser.add_argument('-shell', choices = yesno)
+    if prog in ['qsub', 'qrsh', 'qsh', 'qlogin', 'qalter']:
+        parser.add_argument('-soft', action = 'store_true')
+    if prog in ['qsub']:
+        parser.add_argument('-sync', choices = yesno)
+    if prog in ['qsub', 'qsh', 'qalter']:
+        parser.add_argument('-S', metavar = 'pathname')
+    if prog in ['qsub', 'qalter']:
+        parser.add_argument('-t', metavar = 'n[-m[:s]]')
+    if prog in ['qsub', 'qalter']:
+        parser.add_argument('-tc', type = int, metavar = 'max_running_tasks')
+    if prog in ['qsub']:
+        parser.add_argument('-terse', action = 'store_true')
+    if prog in ['qalter']:
+        parser.add_argument('-u', metavar = 'username')
+    if prog in ['qsub', 'qrsh', 'qalter']:
+        parser.add_argument('-v', metavar = 'variable[=value]')
+    if prog in ['qrsh', 'qmake']:
+        parser.add_argument('-verbose', action = 'store_true')
+    if prog in ['qsub', 'qrsh', 'qsh', 'qlogin', 'qalter']:
+        parser.add_argument('-verify', action = 'store_true')
+    if prog in ['qsub', 'qrsh', 'qsh', 'qlogin', 'qalter']:
+        #TODO parse acceptability of qrsh argument properly
+        parser.add_argument('-V', action = 'store_true')
+    if prog in ['qsub', 'qrsh', 'qsh', 'qlogin', 'qalter']:
+        parser.add_argument('-w', choices = 'ewnpv')
+    if prog in ['qsub', 'qrsh', 'qsh', 'qalter']:
+        parser.add_argument('-wd', metavar = 'working_dir')
+    if prog in ['qsub', 'qrsh']:
+        parser.add_argument('command', nargs='?', default='echo')
+    if prog in ['qsub', 'qrsh', 'qalter']:
+        parser.add_argument('command_args', nargs = '*')
+    if prog in ['qsh']:
+        parser.add_argument('xterm_args', nargs = '*')
+
+    #END SGE OPTION PARSER
+    return parser
+
+# The parsers are built only once for every Grid Engine executable together with the
+# options they produce when no option is given, and shared by all qsubOptions objects
+_parsers = dict()
+
+def get_parser(prog = 'qsub'):
+    """
+    Return the parser of the options of a Grid Engine executable and the namespace of
+    the default options, building them the first time they are requested
+    """
+    if prog not in _parsers:
+        parser = build_parser(prog)
+        _parsers[prog] = (parser, parser.parse_args(['echo']))
+    return _parsers[prog]
+
 class qsubOptions():
     "A data type meant to collect qsub options. See man qsub for information"
 
+    @profiler.profiled('qsubOptions.__init__')
     def __init__(self, optstring = '', prog = 'qsub'):
         #Which SGE command are we going to work with?
         self.prog = prog
-        sge_program_names = ['qsub', 'qrsh', 'qsh', 'qlogin', 'qalter', 'qresub', 'qmake']
-        assert self.prog in sge_program_names, 'Unsupported SGE command: '+prog+'not one of '+', '.join(sge_program_names)
-
-        #SUPPRESS = If not specified, do not generate variable in namespace
-        self.parser = argparse.ArgumentParser(
-           description = 'Options to pass to qsub', 
-           formatter_class=argparse.RawTextHelpFormatter, 
-           argument_default=argparse.SUPPRESS, 
-           epilog = """The following is scraped from the qsub manpage for GE 6.2u5 dated 2009/12/01 12:24:06"""
-           )
-
-        #BEGIN SGE OPTION PARSER
-        #BUG if help still begins with a line with -option, have cosmetic bug where metavar cannot be specified correctly
-        yesno = ['y', 'yes', 'n', 'no']
-        
-        if prog in ['qsub', 'qrsh', 'qsh', 'qlogin']:
-            self.parser.add_argument('-@', metavar = 'optionfile')
-        if prog in ['qsub', 'qalter']:
-            self.parser.add_argument('-a', metavar = 'date_time')
-        if prog in ['qsub', 'qsh', 'qrsh', 'qlogin', 'qalter']:
-            self.parser.add_argument('-ac', metavar = 'variable[=value]', action = 'append')
-        if prog in ['qsub', 'qalter', 'qrsh', 'qsh', 'qlogin']:
-            self.parser.add_argument('-ar', metavar = 'ar_id')
-        if prog in ['qsub', 'qsh', 'qrsh', 'qlogin', 'qalter']:
-            self.parser.add_argument('-A', metavar = 'account_string')
-        self.parser.add_argument('-binding', nargs='+', metavar=('binding_instance', 'binding_strategy'))
-        if prog in ['qsub', 'qrsh']:
-            self.parser.add_argument('-b', choices = yesno)
-        if prog in ['qsub', 'qalter']:
-            self.parser.add_argument('-c', metavar = 'occasion_specifier')
-        if prog in ['qsub', 'qalter']:
-            self.parser.add_argument('-ckpt', metavar = 'ckpt_name')
-        if prog in ['qsub', 'qsh', 'qrsh', 'qlogin']:
-            self.parser.add_argument('-clear', action = 'store_true')
-        if prog in ['qsub', 'qsh', 'qrsh', 'qalter']:
-            self.parser.add_argument('-cwd', action = 'store_true')
-        if prog in ['qsub', 'qrsh']:
-            self.parser.add_argument('-C', metavar = 'prefix_string')
-        if prog in ['qsub', 'qsh', 'qrsh', 'qlogin', 'qalter']:
-            self.parser.add_argument('-dc', action = 'append', metavar = 'variable')
-        if prog in ['qsh', 'qrsh']:
-            self.parser.add_argument('-display', metavar = 'display_specifier')
-        if prog in ['qsub', 'qsh', 'qrsh', 'qlogin', 'qalter']:
-            self.parser.add_argument('-dl', metavar = 'date_time')
-        if prog in ['qsub', 'qsh', 'qrsh', 'qlogin', 'qalter']:
-            self.parser.add_argument('-e', metavar = 'path')
-        if prog in ['qsub', 'qsh', 'qrsh', 'qlogin', 'qalter']:
-            self.parser.add_argument('-hard', action = 'store_true')
-        if prog in ['qsub', 'qrsh', 'qalter', 'qresub']:
-            #NOTE in SGE this is -h, here I have renamed it to -hold
-            #TODO check if multiple holds are parsed correctly
-            self.parser.add_argument('-hold', choices = 'usonUOS')
-        if prog in ['qsub', 'qrsh', 'qalter']:
-            self.parser.add_argument('-hold_jid', nargs = '+', metavar = 'wc_job_list')
-        if prog in ['qsub', 'qrsh', 'qalter']:
-            self.parser.add_argument('-hold_jid_ad', nargs = '+', metavar = 'wc_job_list')
-        if prog in ['qsub', 'qalter']:
-            self.parser.add_argument('-i', metavar = 'file')
-        if prog in ['qrsh', 'qmake']:
-            self.parser.add_argument('-inherit', action = 'store_true')
-        if prog in ['qsub', 'qsh', 'qrsh', 'qlogin', 'qalter']:
-            self.parser.add_argument('-j', choices = yesno)
-        if prog in ['qsub', 'qsh', 'qrsh', 'qlogin', 'qalter']:
-            self.parser.add_argument('-js', nargs='?', type = int, metavar = 'job_share')
-        if prog in ['qsub', 'qsh', 'qrsh', 'qlogin']:
-            self.parser.add_argument('-jsv', metavar = 'jsv_url')
-        if prog in ['qsub', 'qsh', 'qrsh', 'qlogin', 'qalter']:
-            self.parser.add_argument('-l', metavar = 'keywords')
-        if prog in ['qsub', 'qsh', 'qrsh', 'qlogin', 'qalter']:
-            #TODO check if multiple arguments are parsed correctly
-            choices = all_string_combinations('beasn')
-            self.parser.add_argument('-m', nargs='+', choices = choices)
-        if prog in ['qsub', 'qsh', 'qrsh', 'qlogin', 'qalter']:
-            self.parser.add_argument('-M', metavar = 'user[@host]')
-        if prog in ['qsub', 'qsh', 'qrsh', 'qlogin', 'qalter']:
-            self.parser.add_argument('-masterq', nargs='+', metavar='wc_queue_list')
-        if prog in ['qsub', 'qrsh', 'qalter']:
-            self.parser.add_argument('-notify', action = 'store_true')
-        if prog in ['qsub', 'qsh', 'qrsh', 'qlogin']:
-            self.parser.add_argument('-now', choices = yesno)
-        if prog in ['qsub', 'qsh', 'qrsh', 'qlogin', 'qalter']:
-            self.parser.add_argument('-N', metavar = 'name')
-        if prog in ['qrsh']:
-            self.parser.add_argument('-noshell', action = 'store_true')
-        if prog in ['qrsh']:
-            self.parser.add_argument('-nostdin', action = 'store_true')
-        if prog in ['qsub', 'qsh', 'qrsh', 'qlogin', 'qalter']:
-            self.parser.add_argument('-o', metavar = 'path')
-        if prog in ['qalter']:
-            self.parser.add_argument('-ot', metavar = 'override_tickets')
-        if prog in ['qsub', 'qsh', 'qrsh', 'qlogin', 'qalter']:
-            self.parser.add_argument('-P', metavar = 'project_name')
-        if prog in ['qsub', 'qsh', 'qrsh', 'qlogin', 'qalter']:
-            self.parser.add_argument('-p', metavar = 'priority')
-        if prog in ['qsub', 'qsh', 'qrsh', 'qlogin', 'qalter']:
-            self.parser.add_argument('-pe', nargs = 2, metavar = ('parallel_environment', 'n'))
-        if prog in ['qrsh', 'qlogin']:
-            self.parser.add_argument('-pty', choices = yesno)
-        if prog in ['qsub', 'qrsh', 'qsh', 'qlogin', 'qalter']:
-            self.parser.add_argument('-q', nargs = '+', metavar = 'wc_queue_list')
-        if prog in ['qsub', 'qrsh', 'qsh', 'qlogin', 'qalter']:
-            self.parser.add_argument('-R', choices = yesno)
-        if prog in ['qsub', 'qalter']:
-            self.parser.add_argument('-r', choices = yesno)
-        if prog in ['qsub', 'qrsh', 'qsh', 'qlogin', 'qalter']:
-            self.parser.add_argument('-sc', action='append', metavar = 'variable[=value]')
-        if prog in ['qsub']:
-            self.parser.add_argument('-shell', choices = yesno)
-        if prog in ['qsub', 'qrsh', 'qsh', 'qlogin', 'qalter']:
-            self.parser.add_argument('-soft', action = 'store_true')
-        if prog in ['qsub']:
-            self.parser.add_argument('-sync', choices = yesno)
-        if prog in ['qsub', 'qsh', 'qalter']:
-            self.parser.add_argument('-S', metavar = 'pathname')
-        if prog in ['qsub', 'qalter']:
-            self.parser.add_argument('-t', metavar = 'n[-m[:s]]')
-        if prog in ['qsub', 'qalter']:
-            self.parser.add_argument('-tc', type = int, metavar = 'max_running_tasks')
-        if prog in ['qsub']:
-            self.parser.add_argument('-terse', action = 'store_true')
-        if prog in ['qalter']:
-            self.parser.add_argument('-u', metavar = 'username')
-        if prog in ['qsub', 'qrsh', 'qalter']:
-            self.parser.add_argument('-v', metavar = 'variable[=value]')
-        if prog in ['qrsh', 'qmake']:
-            self.parser.add_argument('-verbose', action = 'store_true')
-        if prog in ['qsub', 'qrsh', 'qsh', 'qlogin', 'qalter']:
-            self.parser.add_argument('-verify', action = 'store_true')
-        if prog in ['qsub', 'qrsh', 'qsh', 'qlogin', 'qalter']:
-            #TODO parse acceptability of qrsh argument properly
-            self.parser.add_argument('-V', action = 'store_true')
-        if prog in ['qsub', 'qrsh', 'qsh', 'qlogin', 'qalter']:
-            self.parser.add_argument('-w', choices = 'ewnpv')
-        if prog in ['qsub', 'qrsh', 'qsh', 'qalter']:
-            self.parser.add_argument('-wd', metavar = 'working_dir')
-        if prog in ['qsub', 'qrsh']:
-            self.parser.add_argument('command', nargs='?', default='echo')
-        if prog in ['qsub', 'qrsh', 'qalter']:
-            self.parser.add_argument('command_args', nargs = '*')
-        if prog in ['qsh']:
-            self.parser.add_argument('xterm_args', nargs = '*')
-
-        #END SGE OPTION PARSER
-        self.parse('echo')
+        self.parser, defaults = get_parser(prog)
+        self.args = copy.deepcopy(defaults)
+    
+    def __getstate__(self):
+        """The parser is shared between the objects and isn't pickled"""
+        state = self.__dict__.copy()
+        del state['parser']
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self.parser = get_parser(self.prog)[0]
     
     def parse(self, inputstring = ''):
         """Helper method: parses a string"""
@@ -175,6 +208,53 @@ class qsubOptions():
             namespace = self.args
         return self.parse_args(inputstring.split(), namespace = namespace)
 
+    def add_option(self, option, value = None):
+        """
+        Add an option, given by its name without the leading dash, and its value to the
+        options without running the whole parser. Options and values the direct path
+        can't handle unambiguously are passed to parse_and_add so that errors are
+        reported as argparse does.
+        """
+        action = self.parser._option_string_actions.get('-' + option)
+        values = [] if value is None else value.split()
+        
+        if isinstance(action, (argparse._StoreTrueAction, argparse._StoreFalseAction)):
+            if len(values) == 0:
+                setattr(self.args, action.dest, action.const)
+                return self.args
+        elif isinstance(action, (argparse._StoreAction, argparse._AppendAction)):
+            nargs = action.nargs
+            if nargs is None and len(values) == 1:
+                converted = self._convert(action, values[0])
+            elif nargs == '?' and len(values) <= 1:
+                converted = self._convert(action, values[0]) if values else action.const
+            elif (nargs == '+' and len(values) >= 1) or nargs == len(values):
+                converted = [self._convert(action, v) for v in values]
+                if None in converted:
+                    converted = None
+            else:
+                converted = None
+            
+            if converted is not None:
+                if isinstance(action, argparse._AppendAction):
+                    previous = getattr(self.args, action.dest, None) or []
+                    converted = previous + [converted]
+                setattr(self.args, action.dest, converted)
+                return self.args
+        
+        return self.parse_and_add(' '.join(['-' + option] + values))
+    
+    def _convert(self, action, value):
+        """Helper method: converts and validates the value of an option"""
+        if action.type is not None:
+            try:
+                value = action.type(value)
+            except (TypeError, ValueError):
+                return None
+        if action.choices is not None and value not in action.choices:
+            return None
+        return value
+    
     def parse_args(self, args = None, namespace = None):
         """Helper method: parses a list"""
         if args == None:
@@ -185,6 +265,7 @@ class qsubOptions():
 
 
 
+    @profiler.profiled('qsubOptions.write_qsub_script')
     def write_qsub_script(self, filename, echo = False):
         """
         Writes the entire command line to a qsub script
@@ -193,6 +274,20 @@ class qsubOptions():
         echo    : echo contents of script to stdout. Default: False
         """
 
+        script = self.qsub_script()
+
+        if echo: print script
+        
+        if filename is not None:
+            f = open(filename, 'w')
+            f.write(script)
+            f.close()
+
+    def qsub_script(self):
+        """
+        Returns the contents of the qsub script holding the entire command line
+        """
+
         buf= ['#!/usr/bin/env qsub',
               '# Written using pyGRID module']
 
@@ -220,12 +315,7 @@ class qsubOptions():
         if hasattr(self.args,'command'):
             buf.append(' '.join([self.args.command] + args))
 
-        if echo: print '\n'.join(buf)
-        
-        if filename is not None:
-            f = open(filename, 'w')
-            f.write('\n'.join(buf))
-            f.close()
+        return '\n'.join(buf)
 
 
 